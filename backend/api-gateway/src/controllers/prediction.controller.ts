@@ -3,9 +3,32 @@
 // ============================================
 
 import { Request, Response, NextFunction } from 'express';
-import { processAudioFile } from '../services/audioService';
+import { processAudioFile, TraceHeaders } from '../services/audioService';
 import { getPrediction } from '../services/mlService';
+import { createJob, getJob, jobsEnabled, JobState } from '../services/jobService';
 import fs from 'fs/promises';
+import { randomUUID } from 'crypto';
+
+// Same characters the services accept (they replace anything else)
+const REQUEST_ID_PATTERN = /^[A-Za-z0-9._-]{1,64}$/;
+
+/**
+ * Request id for this upload (the client's X-Request-ID if valid) and the
+ * headers that carry it, plus any X-Profile-Token, to both services
+ */
+const buildTraceHeaders = (req: Request): TraceHeaders => {
+  const clientId = req.header('X-Request-ID');
+  const headers: TraceHeaders = {
+    'X-Request-ID': clientId && REQUEST_ID_PATTERN.test(clientId) ? clientId : randomUUID().replace(/-/g, ''),
+  };
+
+  const profileToken = req.header('X-Profile-Token');
+  if (profileToken) {
+    headers['X-Profile-Token'] = profileToken;
+  }
+
+  return headers;
+};
 
 /**
  * Handles the complete prediction flow:
@@ -20,6 +43,9 @@ export const predictGenre = async (
   next: NextFunction
 ): Promise<void> => {
   const startTime = Date.now();
+  const traceHeaders = buildTraceHeaders(req);
+  const requestId = traceHeaders['X-Request-ID'];
+  res.setHeader('X-Request-ID', requestId);
 
   try {
     // Validate file upload
@@ -33,15 +59,15 @@ export const predictGenre = async (
     // Extract metadata
     const { fileName, segmentStart, segmentEnd } = req.body;
 
-    console.log(`[Prediction] Processing: ${fileName} (${segmentStart}s - ${segmentEnd}s)`);
+    console.log(`[Prediction] Processing: ${fileName} (${segmentStart}s - ${segmentEnd}s), request ${requestId}`);
 
     // Step 1: Send audio to Audio Processing Service
     console.log('[Prediction] Step 1: Sending to Audio Service...');
-    const preprocessedData = await processAudioFile(req.file.path);
+    const preprocessedData = await processAudioFile(req.file.path, traceHeaders);
 
     // Step 2: Send preprocessed data to ML Service
     console.log('[Prediction] Step 2: Sending to ML Service...');
-    const probabilities = await getPrediction(preprocessedData);
+    const probabilities = await getPrediction(preprocessedData, traceHeaders);
 
     // Step 3: Clean up uploaded file
     await fs.unlink(req.file.path);
@@ -65,3 +91,85 @@ export const predictGenre = async (
     next(error);
   }
 };
+
+/**
+ * Job fields returned to the frontend
+ */
+const toJobResponse = (job: JobState) => ({
+  id: job.id,
+  status: job.status,
+  stages: job.stages,
+  probabilities: job.probabilities ?? null,
+  error: job.error ?? null,
+});
+
+/**
+ * Starts an asynchronous prediction on the Combined Service
+ * (no request has to stay open for the whole separation):
+ * 1. Receive audio file from frontend
+ * 2. Upload it to POST /jobs
+ * 3. Return 202 with the job; the frontend polls GET /api/jobs/:id
+ *
+ * Answers 501 when COMBINED_SERVICE_URL is not set, so clients can fall
+ * back to POST /api/predict
+ */
+export const createPredictionJob = async (
+  req: Request,
+  res: Response,
+  next: NextFunction
+): Promise<void> => {
+  const traceHeaders = buildTraceHeaders(req);
+  const requestId = traceHeaders['X-Request-ID'];
+  res.setHeader('X-Request-ID', requestId);
+
+  try {
+    if (!jobsEnabled()) {
+      res.status(501).json({ error: 'Asynchronous jobs are not enabled (COMBINED_SERVICE_URL)' });
+      return;
+    }
+
+    if (!req.file) {
+      res.status(400).json({
+        error: 'No audio file provided'
+      });
+      return;
+    }
+
+    const { fileName } = req.body;
+    console.log(`[Prediction] Creating job for ${fileName}, request ${requestId}`);
+
+    // The service has its own copy once the job exists
+    const job = await createJob(req.file.path, traceHeaders);
+
+    res.setHeader('Location', `/api/jobs/${job.id}`);
+    res.status(202).json(toJobResponse(job));
+  } catch (error: any) {
+    console.error('[Prediction] ❌ Job error:', error.message);
+    next(error);
+  } finally {
+    if (req.file?.path) {
+      await fs.unlink(req.file.path).catch(() => {});
+    }
+  }
+};
+
+/**
+ * Progress of a prediction job; probabilities once it succeeded
+ */
+export const getPredictionJob = async (
+  req: Request,
+  res: Response,
+  next: NextFunction
+): Promise<void> => {
+  try {
+    if (!jobsEnabled()) {
+      res.status(501).json({ error: 'Asynchronous jobs are not enabled (COMBINED_SERVICE_URL)' });
+      return;
+    }
+
+    const job = await getJob(req.params.id);
+    res.status(200).json(toJobResponse(job));
+  } catch (error: any) {
+    next(error);
+  }
+};
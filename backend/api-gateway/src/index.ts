@@ -24,7 +24,8 @@ const PORT = process.env.PORT || 5000;
 // CORS configuration
 app.use(cors({
   origin: process.env.FRONTEND_URL || 'http://localhost:5173',
-  credentials: true
+  credentials: true,
+  exposedHeaders: ['X-Request-ID']
 }));
 
 // Body parsing
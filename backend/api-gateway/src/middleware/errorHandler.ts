@@ -28,6 +28,12 @@ export const errorHandler = (
     return;
   }
 
+  // Status passed through from a microservice (e.g. 404 unknown job, 503 at capacity)
+  if (err.name === 'JobServiceError') {
+    res.status(err.status).json({ error: err.message });
+    return;
+  }
+
   // Service unavailable errors
   if (err.message.includes('Service is not available')) {
     res.status(503).json({ error: err.message });
@@ -4,7 +4,7 @@
 
 import { Router } from 'express';
 import { upload } from '../middleware/upload';
-import { predictGenre } from '../controllers/prediction.controller';
+import { predictGenre, createPredictionJob, getPredictionJob } from '../controllers/prediction.controller';
 
 const router = Router();
 
@@ -24,4 +24,23 @@ const router = Router();
  */
 router.post('/predict', upload.single('audio'), predictGenre);
 
+/**
+ * POST /api/jobs
+ * Starts the same prediction as a background job on the Combined Service
+ *
+ * Request: as POST /api/predict
+ *
+ * Response (202, Location: /api/jobs/:id):
+ *   - id, status, stages, probabilities (null until succeeded), error
+ *   - 501 when COMBINED_SERVICE_URL is not set
+ */
+router.post('/jobs', upload.single('audio'), createPredictionJob);
+
+/**
+ * GET /api/jobs/:id
+ * Job progress; probabilities once status is "succeeded"
+ * (404 once the job expired)
+ */
+router.get('/jobs/:id', getPredictionJob);
+
 export { router as predictionRouter };
@@ -10,32 +10,84 @@ import fs from 'fs';
 const AUDIO_SERVICE_URL = process.env.AUDIO_SERVICE_URL || 'http://localhost:5001';
 const TIMEOUT = parseInt(process.env.AUDIO_SERVICE_TIMEOUT || '120000'); // 2 minutes for Spleeter processing
 
+// Wire format for spectrograms: 'npy' (binary, default) or 'json' (nested lists)
+const TENSOR_WIRE_FORMAT = process.env.TENSOR_WIRE_FORMAT || 'npy';
+const TENSOR_WIRE_DTYPE = process.env.TENSOR_WIRE_DTYPE || 'float32';
+
+export const NPY_MEDIA_TYPE = 'application/x-npy';
+
+/**
+ * Headers forwarded to both services for one upload: X-Request-ID (so the
+ * profiles of the audio and ML calls can be matched) and, if the client sent
+ * one, X-Profile-Token (forces profiling)
+ */
+export type TraceHeaders = Record<string, string>;
+
+/**
+ * Preprocessed data as returned by the Audio Service.
+ * Binary payloads are passed through to the ML Service untouched.
+ */
+export type PreprocessedData =
+  | { format: 'npy'; payload: Buffer }
+  | { format: 'json'; payload: any };
+
 /**
  * Sends audio file to Audio Processing Service
  * Returns preprocessed data (spectrogram) ready for ML model
  */
-export const processAudioFile = async (audioFilePath: string): Promise<any> => {
+export const processAudioFile = async (
+  audioFilePath: string,
+  traceHeaders: TraceHeaders = {}
+): Promise<PreprocessedData> => {
   try {
     const formData = new FormData();
     formData.append('audio', fs.createReadStream(audioFilePath));
 
+    const accept = TENSOR_WIRE_FORMAT === 'npy'
+      ? `${NPY_MEDIA_TYPE}; dtype=${TENSOR_WIRE_DTYPE}, application/json;q=0.5`
+      : 'application/json';
+
     const response = await axios.post(
       `${AUDIO_SERVICE_URL}/process`,
       formData,
       {
-        headers: formData.getHeaders(),
+        headers: { ...formData.getHeaders(), ...traceHeaders, Accept: accept },
+        responseType: 'arraybuffer',
         timeout: TIMEOUT,
       }
     );
 
-    return response.data.preprocessedData;
+    const body = Buffer.from(response.data);
+    const contentType = String(response.headers['content-type'] || '');
+
+    if (contentType.startsWith(NPY_MEDIA_TYPE)) {
+      return { format: 'npy', payload: body };
+    }
+
+    return { format: 'json', payload: JSON.parse(body.toString('utf-8')).preprocessedData };
   } catch (error: any) {
     if (error.code === 'ECONNREFUSED') {
       throw new Error('Audio Processing Service is not available');
     }
 
     throw new Error(
-      `Audio processing failed: ${error.response?.data?.error || error.message}`
+      `Audio processing failed: ${parseErrorBody(error.response?.data) || error.message}`
     );
   }
 };
+
+/**
+ * Extracts the error message from an arraybuffer error response
+ */
+const parseErrorBody = (data: any): string | undefined => {
+  if (!data) {
+    return undefined;
+  }
+
+  try {
+    const parsed = JSON.parse(Buffer.from(data).toString('utf-8'));
+    return parsed.error || parsed.detail;
+  } catch {
+    return undefined;
+  }
+};
@@ -23,8 +23,9 @@ interface MicroservicesHealth {
  */
 export const checkMicroservicesHealth = async (): Promise<MicroservicesHealth> => {
   const results = await Promise.allSettled([
-    checkServiceHealth(`${AUDIO_SERVICE_URL}/health`),
-    checkServiceHealth(`${ML_SERVICE_URL}/health`)
+    // /ready answers 503 while a service is still loading its models
+    checkServiceHealth(`${AUDIO_SERVICE_URL}/ready`),
+    checkServiceHealth(`${ML_SERVICE_URL}/ready`)
   ]);
 
   return {
@@ -0,0 +1,98 @@
+// ============================================
+// JOB SERVICE CLIENT
+// ============================================
+// Communicates with the Combined Service's asynchronous jobs (POST /jobs),
+// which keep classifying after the client's HTTP request has ended
+
+import axios from 'axios';
+import FormData from 'form-data';
+import fs from 'fs';
+import { TraceHeaders } from './audioService';
+
+// Unset = asynchronous jobs are disabled (the combined service is optional)
+const COMBINED_SERVICE_URL = process.env.COMBINED_SERVICE_URL || '';
+const TIMEOUT = parseInt(process.env.COMBINED_SERVICE_TIMEOUT || '30000'); // Upload and status calls only
+
+/**
+ * Job state as returned by the Combined Service
+ */
+export interface JobState {
+  id: string;
+  status: 'queued' | 'running' | 'succeeded' | 'failed';
+  stages: Record<string, { status: string; seconds?: number | null }>;
+  created_at: number;
+  updated_at: number;
+  expires_at?: number | null;
+  probabilities?: number[] | null;
+  path?: string | null;
+  error?: string | null;
+}
+
+/**
+ * Error carrying the Combined Service's status code (404 unknown job,
+ * 413 too large, 503 at capacity), so the gateway can answer with it
+ */
+export class JobServiceError extends Error {
+  constructor(message: string, public status: number) {
+    super(message);
+    this.name = 'JobServiceError';
+  }
+}
+
+export const jobsEnabled = (): boolean => COMBINED_SERVICE_URL !== '';
+
+/**
+ * Uploads an audio file and starts a classification job
+ */
+export const createJob = async (
+  audioFilePath: string,
+  traceHeaders: TraceHeaders = {}
+): Promise<JobState> => {
+  try {
+    const formData = new FormData();
+    formData.append('audio', fs.createReadStream(audioFilePath));
+
+    const response = await axios.post<JobState>(`${COMBINED_SERVICE_URL}/jobs`, formData, {
+      headers: { ...formData.getHeaders(), ...traceHeaders },
+      timeout: TIMEOUT,
+    });
+
+    return response.data;
+  } catch (error: any) {
+    throw toJobServiceError(error, 'Job creation failed');
+  }
+};
+
+/**
+ * Reads a job's progress and, once it succeeded, its probabilities
+ */
+export const getJob = async (jobId: string): Promise<JobState> => {
+  try {
+    const response = await axios.get<JobState>(
+      `${COMBINED_SERVICE_URL}/jobs/${encodeURIComponent(jobId)}`,
+      { timeout: TIMEOUT }
+    );
+
+    const job = response.data;
+    if (job.status === 'succeeded' && (!Array.isArray(job.probabilities) || job.probabilities.length !== 9)) {
+      throw new JobServiceError('Invalid job result: expected 9 probabilities', 502);
+    }
+
+    return job;
+  } catch (error: any) {
+    if (error instanceof JobServiceError) {
+      throw error;
+    }
+    throw toJobServiceError(error, 'Job status failed');
+  }
+};
+
+const toJobServiceError = (error: any, prefix: string): Error => {
+  if (error.code === 'ECONNREFUSED') {
+    return new Error('Combined Service is not available');
+  }
+
+  const status = error.response?.status;
+  const detail = error.response?.data?.detail || error.response?.data?.error || error.message;
+  return status ? new JobServiceError(`${prefix}: ${detail}`, status) : new Error(`${prefix}: ${detail}`);
+};
@@ -4,6 +4,7 @@
 // Communicates with the ML Prediction microservice
 
 import axios from 'axios';
+import { NPY_MEDIA_TYPE, PreprocessedData, TraceHeaders } from './audioService';
 
 const ML_SERVICE_URL = process.env.ML_SERVICE_URL || 'http://localhost:5002';
 const TIMEOUT = parseInt(process.env.ML_SERVICE_TIMEOUT || '30000');
@@ -12,13 +13,18 @@ const TIMEOUT = parseInt(process.env.ML_SERVICE_TIMEOUT || '30000');
  * Sends preprocessed data to ML Service
  * Returns array of 9 genre probabilities [0-1]
  */
-export const getPrediction = async (preprocessedData: any): Promise<number[]> => {
+export const getPrediction = async (
+  preprocessedData: PreprocessedData,
+  traceHeaders: TraceHeaders = {}
+): Promise<number[]> => {
   try {
+    const isBinary = preprocessedData.format === 'npy';
+
     const response = await axios.post(
       `${ML_SERVICE_URL}/predict`,
-      { data: preprocessedData },
+      isBinary ? preprocessedData.payload : { data: preprocessedData.payload },
       {
-        headers: { 'Content-Type': 'application/json' },
+        headers: { ...traceHeaders, 'Content-Type': isBinary ? NPY_MEDIA_TYPE : 'application/json' },
         timeout: TIMEOUT,
       }
     );
@@ -0,0 +1,69 @@
+"""
+Audio Service Metrics
+Prometheus histograms and gauges for the processing pipeline
+"""
+
+# Imported first: it prepares (or drops) PROMETHEUS_MULTIPROC_DIR before
+# prometheus_client is imported
+from service_common.metrics import metrics_response
+from prometheus_client import Counter, Gauge, Histogram
+
+
+# Seconds; spans cheap stages (ms) up to Spleeter on long files
+STAGE_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Pipeline stages:
+#   upload_read   - storing the upload (copied, or already parsed to disk) and probing its duration
+#   decode        - ffmpeg decode to a waveform (memory mode)
+#   resample      - converting streamed audio to Spleeter's sample rate
+#   separation    - Spleeter
+#   stem_load     - re-reading stem WAVs (file mode)
+#   mel           - STFT + mel filterbank
+#   pad_crop      - dB conversion into the fixed 862-frame output
+#   serialization - .npy encoding or JSON conversion of the response
+STAGE_SECONDS = Histogram(
+    "audio_stage_seconds",
+    "Time spent in each audio processing stage",
+    ["stage"],
+    buckets=STAGE_BUCKETS
+)
+
+IN_FLIGHT = Gauge(
+    "audio_requests_in_flight",
+    "Requests currently being processed",
+    multiprocess_mode="livesum"
+)
+
+MODEL_LOADED = Gauge(
+    "audio_model_loaded",
+    "1 once Spleeter is loaded",
+    multiprocess_mode="max"
+)
+
+
+# Worker memory, recorded by the WorkerPool after each call (see memory.py)
+WORKER_RSS_BYTES = Gauge(
+    "audio_worker_rss_bytes",
+    "Largest current RSS among the workers",
+    multiprocess_mode="livemax"
+)
+
+WORKER_PEAK_RSS_BYTES = Gauge(
+    "audio_worker_peak_rss_bytes",
+    "Largest peak RSS among the current workers",
+    multiprocess_mode="livemax"
+)
+
+WORKER_RECYCLES = Counter(
+    "audio_worker_recycles_total",
+    "Worker process replacements, by the limit that triggered them",
+    ["reason"]
+)
+
+# Bytes; one spectrogram set is ~1.7 MB (float32), a batch or a long JSON body more
+REQUEST_ARRAY_BYTES = Histogram(
+    "audio_request_array_bytes",
+    "Bytes of the arrays a worker call received and returned",
+    buckets=(2**16, 2**18, 2**20, 2**21, 2**22, 2**23, 2**24, 2**25, 2**26, 2**27, 2**28)
+)
@@ -3,7 +3,7 @@ Data models for Audio Service
 """
 
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional
 
 
 class ProcessResponse(BaseModel):
@@ -12,3 +12,17 @@ class ProcessResponse(BaseModel):
     # [0] vocals, [1] drums, [2] bass, [3] other
     preprocessedData: List[List[List[List[float]]]]
     message: str
+
+
+class BatchProcessItem(BaseModel):
+    """Result for one file of a batch, in upload order"""
+    index: int
+    filename: Optional[str] = None
+    preprocessedData: Optional[List[List[List[List[float]]]]] = None  # As in ProcessResponse
+    error: Optional[str] = None  # Set instead of preprocessedData if this file failed
+
+
+class BatchProcessResponse(BaseModel):
+    """Response model for batch audio processing"""
+    results: List[BatchProcessItem]
+    message: str
@@ -5,12 +5,19 @@ Based on model_generation/services/formatter.py
 """
 
 import librosa
+import logging
 import numpy as np
 import os
-from spleeter.separator import Separator
 from pathlib import Path
 import tempfile
 import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from .spectrogram import MelSpectrogramEngine
+from .metrics import STAGE_SECONDS, MODEL_LOADED
+
+logger = logging.getLogger(__name__)
 
 
 class AudioProcessor:
@@ -19,7 +26,16 @@ class AudioProcessor:
     Reuses logic from model_generation/services/formatter.py
     """
 
-    def __init__(self):
+    def __init__(self, separator=None, audio_loader=None, stem_threads: int = 1):
+        """
+        Args:
+            separator: Object with Spleeter's Separator interface
+                (separate / separate_to_file); loads 'spleeter:4stems' if None
+            audio_loader: Object with Spleeter's AudioAdapter.load interface;
+                Spleeter's ffmpeg adapter if None
+            stem_threads: Threads converting the stems concurrently after
+                separation (1 = one batched pass; see ThreadBudget)
+        """
         # Audio processing parameters (same as training)
         self.sample_rate = int(os.getenv("SAMPLE_RATE", 22050))
         self.n_mels = int(os.getenv("N_MELS", 128))
@@ -29,16 +45,143 @@ class AudioProcessor:
         # Stem names (must match Spleeter output and training order)
         self.STEMS = ['vocals', 'drums', 'bass', 'other']
 
-        # Initialize Spleeter for 4-stem separation
-        print("[AudioProcessor] Initializing Spleeter (4stems)...")
-        self.separator = Separator('spleeter:4stems')
+        # Model input length in frames (crop or pad to this)
+        self.target_frames = 862
+
+        # Batched mel engine (filterbank and window cached per parameter set)
+        self.spectrogram_engine = MelSpectrogramEngine(
+            n_fft=self.n_fft,
+            hop_length=self.hop_length,
+            n_mels=self.n_mels,
+            target_frames=self.target_frames
+        )
+
+        # Separation mode:
+        #   "file"   - separate_to_file + re-read stem WAVs (original behavior)
+        #   "memory" - decode once, separate in memory, no temp files
+        self.separation_mode = os.getenv("SEPARATION_MODE", "file").lower()
+        if self.separation_mode not in ("file", "memory"):
+            raise ValueError(f"Invalid SEPARATION_MODE: {self.separation_mode}")
+
+        # Spleeter works at 44.1 kHz; the saved stems use this rate too
+        self.separation_sample_rate = 44100
+
+        # Same default window as Separator.separate_to_file
+        self.separation_max_duration = 600.0
+
+        # Audio covered by one model input (862 frames of the 44.1 kHz stems, ~10 s)
+        self.window_seconds = self.target_frames * self.hop_length / self.separation_sample_rate
+
+        # Per-stem post-processing (load -> mel -> pad) on a small thread pool;
+        # NumPy's FFT and BLAS release the GIL. Created lazily in the process
+        # that uses it, since process-mode workers are forked
+        self.stem_threads = max(1, stem_threads)
+        self._stem_pool = None
+        self._stem_pool_pid = None
+        self._stem_pool_lock = threading.Lock()
+
+        # Extra audio decoded and separated on both sides of the analysed
+        # window, then dropped, so Spleeter's output at the window edges is
+        # not affected by where the decoded audio starts and ends
+        self.segment_margin_seconds = float(os.getenv("SEGMENT_MARGIN_SECONDS", 1.0))
+
+        # Initialize Spleeter for 4-stem separation (imported here so that
+        # injected stand-ins, e.g. in benchmarks, do not need Spleeter installed)
+        if separator is None:
+            from spleeter.separator import Separator
+            self._check_local_models()
+            logger.info("Initializing Spleeter (4stems)...")
+            separator = Separator('spleeter:4stems')
+
+        if audio_loader is None:
+            from spleeter.audio.adapter import AudioAdapter
+            audio_loader = AudioAdapter.default()
+
+        self.separator = separator
+        self.audio_loader = audio_loader
+        MODEL_LOADED.set(1)
+
+        logger.info(
+            "Initialized with: sample_rate=%d, n_mels=%d, hop_length=%d, n_fft=%d, "
+            "stems=%s, separation_mode=%s, stem_threads=%d",
+            self.sample_rate, self.n_mels, self.hop_length, self.n_fft,
+            self.STEMS, self.separation_mode, self.stem_threads
+        )
+
+    @staticmethod
+    def _check_local_models():
+        """
+        Look for pre-baked Spleeter weights under MODEL_PATH (Spleeter's own
+        setting), so startup does not depend on a download from GitHub
+
+        Raises:
+            RuntimeError: If the weights are missing and
+                SPLEETER_REQUIRE_LOCAL_MODELS is true
+        """
+        model_dir = Path(os.getenv("MODEL_PATH", "pretrained_models")) / "4stems"
+
+        # Spleeter writes .probe once a model download is complete
+        if (model_dir / ".probe").exists():
+            logger.info("Using local Spleeter weights from %s", model_dir)
+            return
+
+        if os.getenv("SPLEETER_REQUIRE_LOCAL_MODELS", "false").lower() == "true":
+            raise RuntimeError(f"Spleeter weights not found in {model_dir}")
+
+        logger.warning("Spleeter weights not found in %s, they will be downloaded during warm-up", model_dir)
+
+    def warmup(self):
+        """
+        Run one short separation and spectrogram conversion
+        The first separation downloads missing weights and builds
+        Spleeter's TensorFlow graph; doing it here keeps it out of the
+        first request
+        """
+        silence = np.zeros((self.separation_sample_rate, 2), dtype=np.float32)
+
+        stems = self.separator.separate(silence)
+        self.create_multi_channel_spectrogram_from_stems(stems, self.separation_sample_rate)
+
+        logger.info("Warm-up separation done")
+
+    def processing_signature(self) -> str:
+        """
+        Identify everything besides the input audio that affects the output
+        Used as part of result cache keys
+
+        Returns:
+            String of model and spectrogram parameters
+        """
+        return (
+            f"spleeter:4stems|{self.separation_mode}|sr={self.sample_rate}|n_mels={self.n_mels}"
+            f"|hop={self.hop_length}|n_fft={self.n_fft}|frames={self.target_frames}"
+            f"|margin={self.segment_margin_seconds}"
+        )
+
+    def analysis_window(self, segment_start: float = None, segment_end: float = None) -> tuple:
+        """
+        Resolve the part of a file the model will see
+
+        Args:
+            segment_start: Start second (default 0)
+            segment_end: End second (default and upper bound: one model
+                window after the start, since later audio is cropped anyway)
+
+        Returns:
+            Tuple (start, end) in seconds
 
-        print(f"[AudioProcessor] Initialized with:")
-        print(f"  Sample Rate: {self.sample_rate}")
-        print(f"  N Mels: {self.n_mels}")
-        print(f"  Hop Length: {self.hop_length}")
-        print(f"  N FFT: {self.n_fft}")
-        print(f"  Stems: {self.STEMS}")
+        Raises:
+            ValueError: If start is negative or end is not after start
+        """
+        start = 0.0 if segment_start is None else float(segment_start)
+        end = start + self.window_seconds if segment_end is None else float(segment_end)
+
+        if start < 0:
+            raise ValueError(f"segmentStart must be >= 0, got {start}")
+        if end <= start:
+            raise ValueError(f"segmentEnd must be after segmentStart, got {start} - {end}")
+
+        return start, min(end, start + self.window_seconds)
 
     def _audio_to_spectrogram(self, audio: np.ndarray, sr: int = None) -> np.ndarray:
         """
@@ -55,127 +198,460 @@ class AudioProcessor:
         if sr is None:
             sr = self.sample_rate
 
-        # Create mel spectrogram
-        mel_spectrogram = librosa.feature.melspectrogram(
-            y=audio,
-            sr=sr,
-            n_fft=self.n_fft,
-            hop_length=self.hop_length,
-            n_mels=self.n_mels
-        )
-
-        # Convert to dB scale
-        log_mel_spectrogram = librosa.power_to_db(mel_spectrogram, ref=np.max)
-
-        return log_mel_spectrogram
+        return self.spectrogram_engine.mel_db(audio[np.newaxis, :], sr)[0]
 
-    def _adjust_spectrogram_length(self, spec: np.ndarray, target_frames: int = 862) -> np.ndarray:
+    def mixture_spectrogram(self, audio_path: str, segment: tuple = None) -> np.ndarray:
         """
-        Adjust spectrogram to target length by padding or cropping
+        Mel spectrogram of the unseparated mixture over the analysis window
+        (same window, sample rate and framing as one stem of process(),
+        without Spleeter)
 
         Args:
-            spec: Spectrogram with shape (128, time)
-            target_frames: Target number of time frames (default 862)
+            audio_path: Path to audio file
+            segment: Optional (start, end) seconds, see analysis_window()
 
         Returns:
-            Adjusted spectrogram with shape (128, target_frames)
-        """
-        current_frames = spec.shape[1]
-
-        if current_frames == target_frames:
-            return spec
-        elif current_frames < target_frames:
-            # Pad with -80.0 (silence in dB scale)
-            pad_amount = target_frames - current_frames
-            padded = np.pad(spec, ((0, 0), (0, pad_amount)), mode='constant', constant_values=-80.0)
-            print(f"[AudioProcessor] Padded from {current_frames} to {target_frames} frames")
-            return padded
-        else:
-            # Crop if longer
-            cropped = spec[:, :target_frames]
-            print(f"[AudioProcessor] Cropped from {current_frames} to {target_frames} frames")
-            return cropped
-
-    def create_multi_channel_spectrogram(self, stems_dir: Path) -> list:
+            Array with shape (128, 862, 1)
+        """
+        start, end = self.analysis_window(*(segment or ()))
+        duration = end - start
+        if duration >= self.window_seconds:
+            # Audio the last centered STFT frame reaches into, as in process()
+            duration += self.n_fft / 2 / self.separation_sample_rate
+
+        waveform = self._load_waveform(audio_path, start, duration)
+        if waveform.shape[0] == 0:
+            raise ValueError(f"segmentStart {start:g} s is past the end of the audio")
+
+        mono = self._to_mono(waveform, out=np.empty(waveform.shape[0], dtype=np.float32))
+        with STAGE_SECONDS.labels("mel").time():
+            mel = self._audio_to_spectrogram(mono, self.separation_sample_rate)
+
+        spectrogram = np.full((self.n_mels, self.target_frames, 1), self.spectrogram_engine.pad_value,
+                              dtype=np.float32)
+        frames = min(mel.shape[-1], self.target_frames)
+        spectrogram[:, :frames, 0] = mel[:, :frames]
+        return spectrogram
+
+    def create_multi_channel_spectrogram(self, stems_dir: Path, offset: float = 0.0,
+                                         duration: float = None) -> np.ndarray:
         """
         Create spectrograms from separated stems
         Based on FormatterService.create_multi_channel_spectrogram()
 
         Args:
             stems_dir: Directory containing separated stem WAV files
+            offset: Second of the stems the analysed window starts at
+            duration: Seconds to read from offset (None = to the end)
 
         Returns:
-            List of 4 spectrograms, each with shape (128, 862, 1)
+            Array of 4 spectrograms with shape (4, 128, 862, 1)
             - [0] vocals
             - [1] drums
             - [2] bass
             - [3] other
         """
-        spectrograms = []
-
-        for stem in self.STEMS:
+        def load(stem):
             stem_path = stems_dir / f"{stem}.wav"
 
             if not stem_path.exists():
                 raise FileNotFoundError(f"Stem file not found: {stem_path}")
 
             # Load stem audio (sr=None preserves original sample rate from Spleeter)
-            audio, sr = librosa.load(str(stem_path), sr=None)
+            with STAGE_SECONDS.labels("stem_load").time():
+                return librosa.load(str(stem_path), sr=None, offset=offset, duration=duration)
+
+        if self.stem_threads > 1:
+            # Each stem loads and converts on its own thread
+            spectrograms = self._allocate_spectrograms()
 
-            # Convert to spectrogram (128, time)
-            spectrogram = self._audio_to_spectrogram(audio, sr=sr)
+            def convert(i, stem):
+                audio, sr = load(stem)
+                self.spectrogram_engine.compute(audio[np.newaxis, :], sr, out=spectrograms[i:i + 1])
 
-            # Adjust to exactly 862 frames (crop or pad as needed)
-            spectrogram = self._adjust_spectrogram_length(spectrogram, target_frames=862)
+            self._map_stems(convert)
+            return spectrograms
 
-            # Add channel dimension: (128, 862) -> (128, 862, 1)
-            spectrogram = spectrogram[..., np.newaxis]
+        stem_audio = []
+        for stem in self.STEMS:
+            audio, sr = load(stem)
+            stem_audio.append(audio)
 
-            spectrograms.append(spectrogram)
+        if len({len(audio) for audio in stem_audio}) == 1:
+            return self.spectrogram_engine.compute(np.stack(stem_audio), sr)
 
+        # Stems of different lengths cannot share one STFT batch
+        spectrograms = self._allocate_spectrograms()
+        for i, audio in enumerate(stem_audio):
+            self.spectrogram_engine.compute(audio[np.newaxis, :], sr, out=spectrograms[i:i + 1])
         return spectrograms
 
-    def process(self, audio_path: str) -> list:
+    def create_multi_channel_spectrogram_from_stems(self, stems: dict, sr: int) -> np.ndarray:
         """
-        Complete audio processing pipeline:
-        1. Separate audio into stems using Spleeter
-        2. Create mel spectrogram for each stem
-        3. Return as list of 4 separate spectrograms
+        Create spectrograms from in-memory stem waveforms
+        Equivalent to create_multi_channel_spectrogram() without the WAV round-trip
 
         Args:
-            audio_path: Path to audio file
+            stems: Separator.separate() output, stem name -> waveform (samples, channels)
+            sr: Sample rate of the stem waveforms
 
         Returns:
-            List of 4 spectrograms, each with shape (128, 862, 1)
+            Array of 4 spectrograms with shape (4, 128, 862, 1)
             - [0] vocals
             - [1] drums
             - [2] bass
             - [3] other
         """
-        print(f"[AudioProcessor] Processing: {audio_path}")
+        for stem in self.STEMS:
+            if stem not in stems:
+                raise KeyError(f"Stem missing from separation output: {stem}")
+
+        # Downmix straight into one (4, samples) batch, like librosa.load does
+        num_samples = stems[self.STEMS[0]].shape[0]
+        batch = np.empty((len(self.STEMS), num_samples), dtype=np.float32)
+
+        if self.stem_threads > 1:
+            # Each stem downmixes and converts on its own thread
+            spectrograms = self._allocate_spectrograms()
+
+            def convert(i, stem):
+                self._to_mono(stems[stem], out=batch[i])
+                self.spectrogram_engine.compute(batch[i:i + 1], sr, out=spectrograms[i:i + 1])
+
+            self._map_stems(convert)
+            return spectrograms
+
+        for i, stem in enumerate(self.STEMS):
+            self._to_mono(stems[stem], out=batch[i])
+
+        return self.spectrogram_engine.compute(batch, sr)
+
+    def _map_stems(self, convert):
+        """
+        Run convert(index, stem) for every stem on the stem pool and wait
+
+        Raises:
+            The first stem's exception, after all stems finished
+        """
+        with self._stem_pool_lock:
+            if self._stem_pool is None or self._stem_pool_pid != os.getpid():
+                self._stem_pool = ThreadPoolExecutor(max_workers=self.stem_threads, thread_name_prefix="stem")
+                self._stem_pool_pid = os.getpid()
+            pool = self._stem_pool
+
+        futures = [pool.submit(convert, i, stem) for i, stem in enumerate(self.STEMS)]
+        # All stems finish before the stem files may be removed
+        wait(futures)
+        for future in futures:
+            future.result()
+
+    def _allocate_spectrograms(self) -> np.ndarray:
+        """Preallocate the (4, 128, 862, 1) model input"""
+        return np.empty((len(self.STEMS), self.n_mels, self.target_frames, 1), dtype=np.float32)
+
+    @staticmethod
+    def _to_mono(waveform: np.ndarray, out: np.ndarray) -> np.ndarray:
+        """
+        Average the channels of a (samples, channels) waveform
+
+        Args:
+            waveform: Waveform as returned by Spleeter
+            out: Preallocated float32 array with shape (samples,)
+
+        Returns:
+            out, holding the mono waveform
+        """
+        if waveform.ndim == 1:
+            out[:] = waveform
+        elif waveform.shape[1] == 1:
+            out[:] = waveform[:, 0]
+        else:
+            np.mean(waveform, axis=1, dtype=np.float32, out=out)
+        return out
+
+    def _load_waveform(self, audio_path: str, offset: float = 0.0, duration: float = None) -> np.ndarray:
+        """
+        Decode (part of) an audio file once at Spleeter's sample rate
+
+        Args:
+            audio_path: Path to audio file
+            offset: Start second (ffmpeg seeks there instead of decoding the start)
+            duration: Seconds to decode (default separation_max_duration)
+
+        Returns:
+            Waveform with shape (samples, channels)
+        """
+        with STAGE_SECONDS.labels("decode").time():
+            waveform, _ = self.audio_loader.load(
+                audio_path,
+                offset=offset,
+                duration=self.separation_max_duration if duration is None else duration,
+                sample_rate=self.separation_sample_rate
+            )
+        return waveform
+
+    def _decode_span(self, start: float, end: float) -> tuple:
+        """
+        Part of the file to decode and separate for an analysis window
+
+        Returns:
+            Tuple (offset, duration, lead): decode `duration` seconds from
+            `offset`; the window starts `lead` seconds into the decoded audio
+        """
+        offset = max(0.0, start - self.segment_margin_seconds)
+        duration = end + self.segment_margin_seconds - offset
+        return offset, duration, start - offset
+
+    def iter_windows(self, audio_path: str, hop_seconds: float, max_duration: float):
+        """
+        Walk a whole track as overlapping model-sized windows
+        Each window is decoded (ffmpeg seek), separated and converted on its own,
+        so only one window of audio, stems and spectrograms is alive at a time
+
+        Args:
+            audio_path: Path to audio file
+            hop_seconds: Distance between window starts (< window_seconds overlaps)
+            max_duration: Stop after this many seconds of the track
+
+        Yields:
+            Tuple (start seconds, end seconds, spectrograms with shape (4, 128, 862, 1))
+        """
+        if hop_seconds <= 0:
+            raise ValueError(f"hop_seconds must be > 0, got {hop_seconds}")
+
+        sr = self.separation_sample_rate
+        window_samples = int(round(self.window_seconds * sr))
+        # A partial last window is only worth it if it reaches past the previous one
+        min_tail_samples = max(1, int(round((self.window_seconds - hop_seconds) * sr)))
+
+        offset = 0.0
+        while offset < max_duration:
+            duration = min(self.window_seconds, max_duration - offset)
+            with STAGE_SECONDS.labels("decode").time():
+                waveform, _ = self.audio_loader.load(
+                    audio_path,
+                    offset=offset,
+                    duration=duration,
+                    sample_rate=sr
+                )
+
+            num_samples = waveform.shape[0]
+            if num_samples == 0 or (offset > 0 and num_samples <= min_tail_samples):
+                break
+
+            with STAGE_SECONDS.labels("separation").time():
+                stems = self.separator.separate(waveform)
+            del waveform
+
+            spectrograms = self.create_multi_channel_spectrogram_from_stems(stems, sr)
+            del stems
+
+            yield offset, offset + num_samples / sr, spectrograms
+
+            if num_samples < window_samples:
+                break
+            offset += hop_seconds
+
+    def decode_window(self, audio_path: str, segment: tuple = None) -> tuple:
+        """
+        Decode the analysis window plus segment_margin_seconds on each side
+        at Spleeter's sample rate (the input of process_waveform())
+
+        Args:
+            audio_path: Path to audio file
+            segment: Optional (start, end) seconds, see analysis_window()
+
+        Returns:
+            Tuple (waveform, lead, duration): waveform with shape
+            (samples, channels); the window starts `lead` seconds into it
+            and is `duration` seconds long
+
+        Raises:
+            ValueError: If the window starts past the end of the audio
+        """
+        start, end = self.analysis_window(*(segment or ()))
+        offset, duration, lead = self._decode_span(start, end)
+
+        waveform = self._load_waveform(audio_path, offset, duration)
+        if waveform.shape[0] <= int(lead * self.separation_sample_rate):
+            raise ValueError(f"segmentStart {start:g} s is past the end of the audio")
+
+        return waveform, lead, end - start
+
+    def _separate(self, audio_path: str, segment: tuple = None):
+        """
+        First half of process(): decode and separate the analysis window
+        plus segment_margin_seconds on each side
+
+        Args:
+            audio_path: Path to audio file
+            segment: Optional (start, end) seconds, see analysis_window()
+
+        Returns:
+            Tuple (separated, window):
+            - separated: "memory" mode: stem name -> waveform, without
+              touching disk; "file" mode: directory of stem WAVs in a new
+              temp dir (original pipeline), _spectrograms_from_separation()
+              removes it
+            - window: (offset, duration) of the analysed audio within the stems
+        """
+        if self.separation_mode == "memory":
+            waveform, lead, duration = self.decode_window(audio_path, segment)
+            window = (lead, duration)
+
+            logger.debug("Separating stems with Spleeter (in memory)...")
+            with STAGE_SECONDS.labels("separation").time():
+                return self.separator.separate(waveform), window
+
+        start, end = self.analysis_window(*(segment or ()))
+        offset, duration, lead = self._decode_span(start, end)
+        window = (lead, end - start)
 
         # Create temporary directory for stems
         temp_dir = tempfile.mkdtemp()
 
         try:
-            # Step 1: Separate audio into stems using Spleeter
-            print("[AudioProcessor] Separating stems with Spleeter...")
-            self.separator.separate_to_file(audio_path, temp_dir)
+            logger.debug("Separating stems with Spleeter...")
+            with STAGE_SECONDS.labels("separation").time():
+                self.separator.separate_to_file(audio_path, temp_dir, offset=offset, duration=duration)
+        except Exception:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+            raise
 
-            # Spleeter creates a subdirectory named after the audio file
-            audio_filename = Path(audio_path).stem
-            stems_dir = Path(temp_dir) / audio_filename
+        # Spleeter creates a subdirectory named after the audio file
+        return Path(temp_dir) / Path(audio_path).stem, window
 
-            # Step 2: Create spectrograms for each stem
-            print("[AudioProcessor] Creating spectrograms for each stem...")
-            spectrograms = self.create_multi_channel_spectrogram(stems_dir)
+    def _spectrograms_from_separation(self, separated, window: tuple) -> np.ndarray:
+        """
+        Second half of process(): mel spectrograms of the analysed window
+        of the separated stems
 
-            print(f"[AudioProcessor] ✅ Created {len(spectrograms)} spectrograms")
-            for i, spec in enumerate(spectrograms):
-                print(f"  Stem {i} ({self.STEMS[i]}): {spec.shape}")
+        Args:
+            separated, window: _separate() output
 
-            return spectrograms
+        Returns:
+            Array of 4 spectrograms with shape (4, 128, 862, 1)
+        """
+        logger.debug("Creating spectrograms for each stem...")
+        lead, duration = window
+        if duration >= self.window_seconds:
+            # Keep the audio the last (centered) STFT frame reaches into, as
+            # when the whole file was converted and cropped
+            duration += self.n_fft / 2 / self.separation_sample_rate
+
+        if isinstance(separated, dict):
+            sr = self.separation_sample_rate
+            first = int(round(lead * sr))
+            last = first + int(round(duration * sr))
+            # Views, no copy: the margins are just not looked at
+            stems = {stem: waveform[first:last] for stem, waveform in separated.items()}
+            return self.create_multi_channel_spectrogram_from_stems(stems, sr)
 
+        try:
+            return self.create_multi_channel_spectrogram(separated, offset=lead, duration=duration)
         finally:
             # Clean up temporary directory
-            shutil.rmtree(temp_dir, ignore_errors=True)
+            shutil.rmtree(separated.parent, ignore_errors=True)
+
+    def process(self, audio_path: str, segment: tuple = None) -> np.ndarray:
+        """
+        Complete audio processing pipeline:
+        1. Decode only the analysed window (plus a margin) and separate it
+           into stems using Spleeter (via temp files or in memory, depending
+           on SEPARATION_MODE)
+        2. Create mel spectrograms for all stems in one batched pass
+        3. Return as one array of 4 spectrograms
+
+        Args:
+            audio_path: Path to audio file
+            segment: Optional (start, end) seconds to analyse; the first
+                window of the file if None (see analysis_window())
+
+        Returns:
+            Array of 4 spectrograms with shape (4, 128, 862, 1)
+            - [0] vocals
+            - [1] drums
+            - [2] bass
+            - [3] other
+        """
+        logger.debug("Processing: %s", audio_path)
+
+        spectrograms = self._spectrograms_from_separation(*self._separate(audio_path, segment))
+
+        logger.debug("Created %d spectrograms with shape %s", len(spectrograms), spectrograms.shape[1:])
+
+        return spectrograms
+
+    def process_waveform(self, waveform: np.ndarray, sample_rate: int, lead: float = 0.0,
+                         duration: float = None) -> np.ndarray:
+        """
+        process() for audio that is already decoded (e.g. a PCM stream or
+        decode_window() output)
+
+        Args:
+            waveform: Array with shape (samples, channels)
+            sample_rate: Its sample rate; resampled to separation_sample_rate if different
+            lead: Seconds at the start that are separated as context but not
+                analysed (like the margin process() decodes before a segment)
+            duration: Seconds analysed after the lead (default: the rest)
+
+        Returns:
+            Array of 4 spectrograms with shape (4, 128, 862, 1)
+        """
+        if sample_rate != self.separation_sample_rate:
+            with STAGE_SECONDS.labels("resample").time():
+                waveform = librosa.resample(
+                    waveform.T, orig_sr=sample_rate, target_sr=self.separation_sample_rate
+                ).T
+
+        if duration is None:
+            duration = waveform.shape[0] / self.separation_sample_rate - lead
+        if duration <= 0:
+            raise ValueError("No audio after the lead")
+
+        with STAGE_SECONDS.labels("separation").time():
+            stems = self.separator.separate(waveform)
+
+        return self._spectrograms_from_separation(stems, (lead, duration))
+
+    def process_many(self, audio_paths: list) -> tuple:
+        """
+        process() for the first window of several files, pipelined: the next
+        file is decoded and separated on a helper thread while the current
+        one is converted to spectrograms, so Spleeter does not wait for the
+        mel stage
+
+        Args:
+            audio_paths: Paths to audio files; None entries are skipped
+
+        Returns:
+            Tuple (spectrograms, errors):
+            - spectrograms: array with shape (N, 4, 128, 862, 1), zeros for
+              skipped or failed files
+            - errors: index -> error message for the files that failed
+        """
+        spectrograms = np.zeros(
+            (len(audio_paths), len(self.STEMS), self.n_mels, self.target_frames, 1),
+            dtype=np.float32
+        )
+        errors = {}
+        items = [(index, path) for index, path in enumerate(audio_paths) if path is not None]
+
+        # One separation in flight at a time, so at most two files' stems are alive
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="separation") as separation:
+            pending = separation.submit(self._separate, items[0][1]) if items else None
+
+            for position, (index, path) in enumerate(items):
+                current = pending
+                if position + 1 < len(items):
+                    pending = separation.submit(self._separate, items[position + 1][1])
+
+                try:
+                    spectrograms[index] = self._spectrograms_from_separation(*current.result())
+                except Exception as e:
+                    logger.warning("Processing %s failed: %r", path, e)
+                    errors[index] = str(e) or type(e).__name__
+
+        logger.debug("Processed %d files (%d failed)", len(items), len(errors))
+
+        return spectrograms, errors
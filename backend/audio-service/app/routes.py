@@ -3,64 +3,197 @@ Audio Service Routes
 Defines all API endpoints for the audio processing service using OOP approach
 """
 
-from fastapi import APIRouter, UploadFile, File, HTTPException
-import os
+import json
+from typing import List
+import uuid
 
-from .models import ProcessResponse
+from fastapi import APIRouter, UploadFile, File, Form, Header, HTTPException, Request
+from fastapi.responses import Response
+
+from service_common.executor import WorkerPool, PoolSaturatedError
+from service_common.cache import ResultCache, content_key
+from service_common.profiling import RequestProfiler, PROFILE_TOKEN_HEADER
+from service_common.tensor_codec import NPY_MEDIA_TYPE, negotiate_wire_dtype, encode_tensor
+
+from .models import ProcessResponse, BatchProcessItem, BatchProcessResponse
 from .processor import AudioProcessor
+from .uploads import UploadSpooler, UploadTooLargeError
+from .metrics import STAGE_SECONDS, IN_FLIGHT
 
 
 class AudioProcessingRouter:
     """Router class that encapsulates audio processor using OOP"""
 
-    def __init__(self, processor: AudioProcessor):
+    def __init__(self, processor: AudioProcessor, pool: WorkerPool = None,
+                 cache: ResultCache = None, spooler: UploadSpooler = None,
+                 max_batch_files: int = 16, profiler: RequestProfiler = None):
         """
         Initialize router with audio processor dependency
 
         Args:
             processor: AudioProcessor instance for audio processing
+            pool: WorkerPool that runs processing off the event loop
+                (inline on the event loop if None)
+            cache: Optional ResultCache for spectrograms, keyed by upload content
+            spooler: UploadSpooler that stores uploads and enforces limits
+                (system temp dir, no limits if None)
+            max_batch_files: Most files accepted by POST /process/batch
+            profiler: Optional RequestProfiler selecting /process requests to profile
         """
         self.processor = processor
-        self.router = APIRouter()
+        self.pool = pool or WorkerPool(processor, mode="inline")
+        self.cache = cache
+        self.spooler = spooler or UploadSpooler()
+        self.max_batch_files = max_batch_files
+        self.profiler = profiler
+        # Multipart uploads are parsed straight into the spooler's temp files
+        self.router = APIRouter(route_class=self.spooler.route_class())
         self._setup_routes()
 
     def _setup_routes(self):
         """Define all routes for the audio service"""
 
-        @self.router.get("/health")
-        async def health_check():
-            """Health check endpoint"""
-            return {
-                "status": "healthy",
-                "service": "audio-service",
-                "version": "1.0.0"
-            }
-
         @self.router.post("/process", response_model=ProcessResponse)
-        async def process_audio(audio: UploadFile = File(...)):
+        async def process_audio(
+            request: Request,
+            audio: UploadFile = File(...),
+            segmentStart: float = Form(None),
+            segmentEnd: float = Form(None),
+            accept: str = Header(None)
+        ):
             """
             Process audio file and return preprocessed data
 
+            Only the analysed window is decoded and separated, so the cost
+            does not grow with the length of the upload
+
             Args:
                 audio: Audio file (WAV, MP3)
+                segmentStart: Optional second of the file the window starts at (default 0)
+                segmentEnd: Optional second it ends at (default and at most
+                    one model window, ~10 s, after segmentStart)
+                accept: Accept header; "application/x-npy" selects the binary format
+
+            Returns:
+                ProcessResponse with preprocessed data (spectrogram), or a
+                .npy payload with shape (4, 128, 862, 1) when binary was requested
+            """
+            try:
+                wire_dtype = negotiate_wire_dtype(accept)
+            except ValueError as e:
+                raise HTTPException(status_code=406, detail=str(e))
+
+            try:
+                segment = self.processor.analysis_window(segmentStart, segmentEnd)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+
+            # Shed load before reading the upload
+            if self.pool.is_saturated():
+                raise self._overloaded()
+
+            # Profiled requests are tagged with the id the gateway also sent
+            # to the ml-service, so both profiles of one upload can be matched
+            # Set by RequestIdMiddleware; apps built without it (e.g. benchmarks) get a fresh id
+            request_id = getattr(request.state, "request_id", None) or uuid.uuid4().hex
+            profiled = self.profiler is not None and self.profiler.should_profile(
+                request_id, request.headers.get(PROFILE_TOKEN_HEADER)
+            )
+
+            with IN_FLIGHT.track_inprogress():
+                return await self._process_upload(audio, wire_dtype, segment,
+                                                  request_id if profiled else None)
+
+        @self.router.post("/process/batch", response_model=BatchProcessResponse)
+        async def process_batch(
+            audio: List[UploadFile] = File(...),
+            accept: str = Header(None)
+        ):
+            """
+            Process several audio files in one request
+
+            Files are separated and converted in a pipeline inside one worker
+            call; a file that fails gets an error entry instead of failing
+            the batch
+
+            Args:
+                audio: Audio files (WAV, MP3), repeated "audio" form fields
+                accept: Accept header; "application/x-npy" selects the binary format
 
             Returns:
-                ProcessResponse with preprocessed data (spectrogram)
+                BatchProcessResponse with one result per file in upload order,
+                or a .npy payload with shape (N, 4, 128, 862, 1) when binary
+                was requested (zeros for failed files, listed in the
+                X-Batch-Errors header as a JSON object index -> error)
             """
-            temp_path = None
             try:
-                # Save uploaded file temporarily
-                temp_path = f"tmp_{audio.filename}"
+                wire_dtype = negotiate_wire_dtype(accept)
+            except ValueError as e:
+                raise HTTPException(status_code=406, detail=str(e))
+
+            if len(audio) > self.max_batch_files:
+                raise HTTPException(
+                    status_code=413,
+                    detail=f"Too many files: {len(audio)} (limit {self.max_batch_files})"
+                )
+
+            if self.pool.is_saturated():
+                raise self._overloaded()
+
+            with IN_FLIGHT.track_inprogress():
+                return await self._process_batch(audio, wire_dtype)
+
+        @self.router.get("/cache/stats")
+        async def cache_stats():
+            """Hit/miss/eviction counters of the spectrogram cache"""
+            if self.cache is None:
+                return {"enabled": False}
 
-                with open(temp_path, "wb") as buffer:
-                    content = await audio.read()
-                    buffer.write(content)
+            return {"enabled": True, **self.cache.stats()}
 
-                # Process audio using the injected processor
-                preprocessed_data = self.processor.process(temp_path)
+    async def _process_upload(self, audio: UploadFile, wire_dtype: str, segment: tuple,
+                              profile_request_id: str = None):
+        """
+        Store, process and serialize one upload
+
+        Args:
+            audio: Uploaded audio file
+            wire_dtype: Binary response dtype, or None for JSON
+            segment: (start, end) seconds to analyse
+            profile_request_id: Request id to profile the processing under, or None
+
+        Returns:
+            Binary Response or ProcessResponse
+        """
+        try:
+            with STAGE_SECONDS.labels("upload_read").time():
+                upload = await self.spooler.save(audio)
+        except UploadTooLargeError as e:
+            raise HTTPException(status_code=413, detail=str(e))
+
+        def process():
+            # Process audio using the injected processor (off the event loop)
+            if profile_request_id is not None:
+                return self.profiler.run(self.pool, profile_request_id, "/process",
+                                         "process", upload.path, segment)
+            return self.pool.run("process", upload.path, segment)
 
-                # Clean up temp file
-                os.remove(temp_path)
+        try:
+            if self.cache is not None:
+                # Same bytes + same window + same parameters -> same spectrograms
+                # (a cache hit is not profiled: there is no processing to see)
+                key = content_key(upload.sha256, segment, self.processor.processing_signature())
+                preprocessed_data, _ = await self.cache.get_or_compute(key, process, resource=upload)
+            else:
+                preprocessed_data = await process()
+
+            with STAGE_SECONDS.labels("serialization").time():
+                if wire_dtype is not None:
+                    # Binary mode: one contiguous buffer, no per-element objects
+                    return Response(
+                        content=encode_tensor(preprocessed_data, wire_dtype),
+                        media_type=NPY_MEDIA_TYPE
+                    )
 
                 # Convert list of numpy arrays to list of lists
                 preprocessed_data_list = [spec.tolist() for spec in preprocessed_data]
@@ -70,12 +203,116 @@ class AudioProcessingRouter:
                     message="Audio processed successfully"
                 )
 
-            except Exception as e:
-                # Clean up on error
-                if temp_path and os.path.exists(temp_path):
-                    os.remove(temp_path)
+        except PoolSaturatedError:
+            raise self._overloaded()
+        except ValueError as e:
+            # e.g. a segment starting past the end of the audio
+            raise HTTPException(status_code=400, detail=f"Error processing audio: {str(e)}")
+        except Exception as e:
+            raise HTTPException(
+                status_code=500,
+                detail=f"Error processing audio: {str(e)}"
+            )
+        finally:
+            # Clean up temp file
+            upload.cleanup()
 
-                raise HTTPException(
-                    status_code=500,
-                    detail=f"Error processing audio: {str(e)}"
+    async def _process_batch(self, files: List[UploadFile], wire_dtype: str):
+        """
+        Store all uploads, process the ones not cached in one pipelined
+        worker call and serialize the results in upload order
+
+        Args:
+            files: Uploaded audio files
+            wire_dtype: Binary response dtype, or None for JSON
+
+        Returns:
+            Binary Response or BatchProcessResponse
+        """
+        uploads = [None] * len(files)
+        errors = {}
+
+        try:
+            with STAGE_SECONDS.labels("upload_read").time():
+                for index, audio in enumerate(files):
+                    try:
+                        uploads[index] = await self.spooler.save(audio)
+                    except UploadTooLargeError as e:
+                        errors[index] = str(e)
+
+            # Cached files are copied in; the rest go to the worker
+            keys = [None] * len(files)
+            cached = {}
+            if self.cache is not None:
+                # Batches analyse each file's first window, like /process without a segment
+                segment = self.processor.analysis_window()
+                signature = self.processor.processing_signature()
+                for index, upload in enumerate(uploads):
+                    if upload is not None:
+                        keys[index] = content_key(upload.sha256, segment, signature)
+                        hit = await self.cache.get_async(keys[index])
+                        if hit is not None:
+                            cached[index] = hit
+
+            paths = [
+                upload.path if upload is not None and index not in cached else None
+                for index, upload in enumerate(uploads)
+            ]
+            spectrograms, failed = await self.pool.run("process_many", paths)
+            errors.update(failed)
+
+            for index, array in cached.items():
+                spectrograms[index] = array
+
+            if self.cache is not None:
+                for index, path in enumerate(paths):
+                    if path is not None and index not in errors:
+                        await self.cache.put_async(keys[index], spectrograms[index])
+
+            with STAGE_SECONDS.labels("serialization").time():
+                if wire_dtype is not None:
+                    headers = {}
+                    if errors:
+                        headers["X-Batch-Errors"] = json.dumps({str(index): error for index, error in errors.items()})
+
+                    return Response(
+                        content=encode_tensor(spectrograms, wire_dtype),
+                        media_type=NPY_MEDIA_TYPE,
+                        headers=headers
+                    )
+
+                results = [
+                    BatchProcessItem(
+                        index=index,
+                        filename=audio.filename,
+                        error=errors.get(index),
+                        preprocessedData=None if index in errors else [spec.tolist() for spec in spectrograms[index]]
+                    )
+                    for index, audio in enumerate(files)
+                ]
+
+                return BatchProcessResponse(
+                    results=results,
+                    message=f"Processed {len(files) - len(errors)} of {len(files)} files"
                 )
+
+        except PoolSaturatedError:
+            raise self._overloaded()
+        except Exception as e:
+            raise HTTPException(
+                status_code=500,
+                detail=f"Error processing audio: {str(e)}"
+            )
+        finally:
+            for upload in uploads:
+                if upload is not None:
+                    upload.cleanup()
+
+    @staticmethod
+    def _overloaded() -> HTTPException:
+        """503 response telling the client to retry later"""
+        return HTTPException(
+            status_code=503,
+            detail="Audio service is at capacity, retry later",
+            headers={"Retry-After": "1"}
+        )
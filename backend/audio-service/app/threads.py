@@ -0,0 +1,94 @@
+"""
+Thread Budget
+One CPU thread budget shared by Spleeter's TensorFlow runtime, BLAS and
+the per-stem pool, so several workers on one host do not oversubscribe it
+"""
+
+import logging
+import os
+
+from threadpoolctl import threadpool_limits
+
+logger = logging.getLogger(__name__)
+
+
+class ThreadBudget:
+    """
+    Splits CPU_THREAD_BUDGET threads between the pool workers and, within
+    one call, between the stems
+
+    - Per worker: budget // EXECUTOR_WORKERS (at least 1)
+    - Stem threads: STEM_THREADS, at most one per stem and the worker share
+    - BLAS/OpenMP threads: worker share // stem threads, so concurrent
+      stems do not multiply them
+    - TensorFlow (Spleeter): intra-op = worker share, inter-op = 1
+
+    Separation and the stem stage of one call run one after the other, so
+    both may use the whole worker share. A budget of 0 keeps the library
+    defaults (every library sized to all cores).
+    """
+
+    MAX_STEM_THREADS = 4  # vocals, drums, bass, other
+
+    def __init__(self, budget: int = 0, stem_threads: int = 1, workers: int = 1):
+        """
+        Args:
+            budget: CPU threads for this process (0 = no limits)
+            stem_threads: Requested threads for per-stem post-processing
+            workers: Calls run concurrently (EXECUTOR_WORKERS)
+        """
+        self.budget = max(0, budget)
+        self.workers = max(1, workers)
+
+        per_worker = max(1, self.budget // self.workers) if self.budget else None
+        self.stem_threads = max(1, min(stem_threads, self.MAX_STEM_THREADS, per_worker or self.MAX_STEM_THREADS))
+
+        self.blas_threads = max(1, per_worker // self.stem_threads) if per_worker else None
+        self.tf_intra_op_threads = per_worker
+        self.tf_inter_op_threads = 1 if per_worker else None
+
+    @classmethod
+    def from_env(cls):
+        """Build a budget from CPU_THREAD_BUDGET / STEM_THREADS / EXECUTOR_WORKERS"""
+        inline = os.getenv("EXECUTOR_MODE", "thread").lower() == "inline"
+        return cls(
+            budget=int(os.getenv("CPU_THREAD_BUDGET", 0)),
+            stem_threads=int(os.getenv("STEM_THREADS", 1)),
+            workers=1 if inline else int(os.getenv("EXECUTOR_WORKERS", 1))
+        )
+
+    def apply(self):
+        """
+        Apply the limits to this process
+
+        TensorFlow sizes its thread pools from TF_NUM_INTRAOP_THREADS /
+        TF_NUM_INTEROP_THREADS when its runtime starts, so this must run
+        before Spleeter separates anything. Values already set in the
+        environment win. Forked workers inherit both limits.
+        """
+        if self.budget == 0:
+            logger.info("No CPU thread budget (stem threads: %d)", self.stem_threads)
+            return
+
+        os.environ.setdefault("TF_NUM_INTRAOP_THREADS", str(self.tf_intra_op_threads))
+        os.environ.setdefault("TF_NUM_INTEROP_THREADS", str(self.tf_inter_op_threads))
+
+        # BLAS and OpenMP pools already loaded by NumPy/SciPy; the limit stays in place
+        threadpool_limits(limits=self.blas_threads)
+
+        logger.info(
+            "CPU thread budget %d over %d worker(s): stem threads=%d, BLAS threads=%d, TF intra_op=%s, inter_op=%s",
+            self.budget, self.workers, self.stem_threads, self.blas_threads,
+            os.environ["TF_NUM_INTRAOP_THREADS"], os.environ["TF_NUM_INTEROP_THREADS"]
+        )
+
+    def stats(self) -> dict:
+        """Resolved thread counts for /health"""
+        return {
+            "budget": self.budget,
+            "workers": self.workers,
+            "stem_threads": self.stem_threads,
+            "blas_threads": self.blas_threads,
+            "tf_intra_op_threads": self.tf_intra_op_threads,
+            "tf_inter_op_threads": self.tf_inter_op_threads,
+        }
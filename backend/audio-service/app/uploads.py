@@ -0,0 +1,356 @@
+"""
+Upload Handling
+Streams uploads to uniquely named temp files with size and duration limits
+"""
+
+import hashlib
+import os
+import tempfile
+
+import ffmpeg
+import soundfile as sf
+from fastapi import HTTPException, Request, UploadFile
+from fastapi.responses import JSONResponse
+from fastapi.routing import APIRoute
+from starlette.concurrency import run_in_threadpool
+from starlette.formparsers import MultiPartException, MultiPartParser
+
+
+# Allowance for multipart boundaries and part headers on top of the file itself
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+
+class UploadTooLargeError(Exception):
+    """Raised when an upload exceeds the size or duration limit"""
+
+
+class StoredUpload:
+    """
+    An upload spooled to disk, with its size and SHA-256
+
+    The request that saved it holds it; a computation that may outlive the
+    request (see ResultCache.get_or_compute) retain()s it. The file is
+    deleted by the last holder's cleanup().
+    """
+
+    def __init__(self, path: str, size: int, sha256: str):
+        self.path = path
+        self.size = size
+        self.sha256 = sha256
+        self._holders = 1
+
+    def retain(self):
+        """Keep the file until one more cleanup()"""
+        self._holders += 1
+
+    def cleanup(self):
+        """Release one hold; the last one deletes the temp file"""
+        self._holders -= 1
+        if self._holders > 0:
+            return
+
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+class SpoolFile:
+    """
+    File object the multipart parser writes a file part into (see
+    UploadSpooler.route_class): a uniquely named temp file, hashed and
+    size-checked as the part arrives, so the upload is written to disk once
+    """
+
+    def __init__(self, path: str, fd: int, max_bytes: int):
+        self.path = path
+        self.size = 0
+        self.too_large = False
+        self.claimed = False
+        self.max_bytes = max_bytes
+        self._file = os.fdopen(fd, "w+b")
+        self._digest = hashlib.sha256()
+
+    def write(self, data: bytes) -> int:
+        self.size += len(data)
+        if self.max_bytes and self.size > self.max_bytes:
+            # Raising inside the parser would answer 500; save() reports 413
+            self.too_large = True
+            return len(data)
+        self._digest.update(data)
+        return self._file.write(data)
+
+    def sha256(self) -> str:
+        return self._digest.hexdigest()
+
+    def discard(self):
+        """Close and delete the file (the part was never claimed by save())"""
+        self._file.close()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+    def __getattr__(self, name):
+        # read, seek, close, ... of the underlying file
+        return getattr(self._file, name)
+
+
+class _SpoolingMultiPartParser(MultiPartParser):
+    """Starlette's multipart parser, writing file parts into SpoolFiles"""
+
+    def __init__(self, *args, spooler, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.spooler = spooler
+        self.spooled = []
+
+    def on_headers_finished(self):
+        super().on_headers_finished()
+        upload = self._current_part.file
+        if upload is not None:
+            # Replace the still empty SpooledTemporaryFile
+            upload.file.close()
+            upload.file = self.spooler.open_spool(upload.filename)
+            self.spooled.append(upload.file)
+
+    async def parse(self):
+        try:
+            return await super().parse()
+        except BaseException:
+            for spool in self.spooled:
+                spool.discard()
+            raise
+
+
+class UploadSpooler:
+    """
+    Stores uploads on disk in fixed-size chunks
+    - Never holds more than one chunk of the upload in memory
+    - Unique file names (mkstemp), so concurrent uploads with the same
+      name cannot overwrite each other
+    - Content hash computed on the way, for cache keys
+    - Size limit enforced on the way, duration limit from the file header,
+      both before any decoding work starts
+
+    Routers built with route_class() have the multipart parser write each
+    file straight into its temp file, and save() adopts it. Other uploads
+    (e.g. from plain Starlette spooling) are copied.
+    """
+
+    def __init__(self, temp_dir: str = None, max_bytes: int = 0,
+                 max_duration: float = 0.0, chunk_size: int = 1024 * 1024):
+        """
+        Args:
+            temp_dir: Directory for temp files (system temp dir if None)
+            max_bytes: Largest accepted upload (0 = unlimited)
+            max_duration: Longest accepted audio in seconds (0 = unlimited)
+            chunk_size: Bytes read per chunk
+        """
+        self.temp_dir = temp_dir
+        self.max_bytes = max_bytes
+        self.max_duration = max_duration
+        self.chunk_size = chunk_size
+
+        if self.temp_dir:
+            os.makedirs(self.temp_dir, exist_ok=True)
+
+    @classmethod
+    def from_env(cls):
+        """Build a spooler from UPLOAD_TEMP_DIR / MAX_UPLOAD_MB / MAX_AUDIO_DURATION"""
+        return cls(
+            temp_dir=os.getenv("UPLOAD_TEMP_DIR") or None,
+            max_bytes=int(float(os.getenv("MAX_UPLOAD_MB", 150)) * 1024 * 1024),
+            max_duration=float(os.getenv("MAX_AUDIO_DURATION", 600))
+        )
+
+    @property
+    def max_request_bytes(self) -> int:
+        """Request body limit for RequestSizeLimitMiddleware (0 = unlimited)"""
+        return self.max_bytes + MULTIPART_OVERHEAD_BYTES if self.max_bytes else 0
+
+    def open_spool(self, filename: str = None) -> SpoolFile:
+        """New uniquely named temp file for an upload"""
+        suffix = os.path.splitext(filename or "")[1]
+        fd, path = tempfile.mkstemp(prefix="upload_", suffix=suffix, dir=self.temp_dir)
+        return SpoolFile(path, fd, self.max_bytes)
+
+    def route_class(self) -> type:
+        """
+        APIRoute class for APIRouter(route_class=...): multipart file parts
+        are written once, into this spooler's temp files. Parts the endpoint
+        did not save() (e.g. after a validation error) are deleted after the
+        response
+        """
+        spooler = self
+
+        class SpoolingRequest(Request):
+            spooled = ()
+
+            async def _get_form(self, *, max_files=1000, max_fields=1000, max_part_size=1024 * 1024):
+                content_type = self.headers.get("Content-Type", "")
+                if self._form is None and content_type.split(";")[0].strip().lower() == "multipart/form-data":
+                    parser = _SpoolingMultiPartParser(
+                        self.headers, self.stream(), spooler=spooler,
+                        max_files=max_files, max_fields=max_fields, max_part_size=max_part_size
+                    )
+                    try:
+                        self._form = await parser.parse()
+                    except MultiPartException as e:
+                        raise HTTPException(status_code=400, detail=e.message)
+                    self.spooled = parser.spooled
+                return await super()._get_form(
+                    max_files=max_files, max_fields=max_fields, max_part_size=max_part_size
+                )
+
+        class SpoolingRoute(APIRoute):
+            def get_route_handler(self):
+                handler = super().get_route_handler()
+
+                async def spooling_handler(request: Request):
+                    request = SpoolingRequest(request.scope, request.receive)
+                    try:
+                        return await handler(request)
+                    finally:
+                        for spool in request.spooled:
+                            if not spool.claimed:
+                                spool.discard()
+
+                return spooling_handler
+
+        return SpoolingRoute
+
+    async def save(self, upload: UploadFile, check_duration: bool = True) -> StoredUpload:
+        """
+        Spool an upload to a temp file (or adopt the one it was parsed
+        into) and validate it
+
+        Args:
+            upload: Uploaded file
+            check_duration: Enforce max_duration (callers that cap the
+                analyzed length themselves can skip it)
+
+        Returns:
+            StoredUpload; the caller must cleanup() it
+
+        Raises:
+            UploadTooLargeError: If a limit is exceeded (temp file already removed)
+        """
+        # Starlette knows the part size once the body is parsed: reject without copying
+        if self.max_bytes and upload.size is not None and upload.size > self.max_bytes:
+            raise UploadTooLargeError(self._size_message())
+
+        # Parsed by a route_class() router: already on disk and hashed
+        spool = upload.file if isinstance(upload.file, SpoolFile) else None
+        copy = spool is None
+        if copy:
+            spool = self.open_spool(upload.filename)
+
+        # The caller owns the file from here on
+        spool.claimed = True
+        stored = StoredUpload(spool.path, 0, "")
+
+        try:
+            if copy:
+                while not spool.too_large:
+                    chunk = await upload.read(self.chunk_size)
+                    if not chunk:
+                        break
+                    spool.write(chunk)
+            spool.close()
+
+            if spool.too_large:
+                raise UploadTooLargeError(self._size_message())
+            stored.size = spool.size
+            stored.sha256 = spool.sha256()
+
+            if check_duration and self.max_duration:
+                duration = await run_in_threadpool(self.probe_duration, stored.path)
+                if duration is not None and duration > self.max_duration:
+                    raise UploadTooLargeError(
+                        f"Audio is {duration:.1f} s long, the limit is {self.max_duration:.0f} s"
+                    )
+
+            return stored
+
+        except BaseException:
+            spool.discard()
+            raise
+
+    @staticmethod
+    def probe_duration(path: str):
+        """
+        Read the duration from the file header without decoding the audio
+
+        Returns:
+            Duration in seconds, or None if it cannot be determined
+        """
+        try:
+            return sf.info(path).duration
+        except Exception:
+            pass
+
+        # Formats libsndfile cannot read (e.g. MP3 on older versions, AAC)
+        try:
+            return float(ffmpeg.probe(path)["format"]["duration"])
+        except (ffmpeg.Error, KeyError, ValueError, OSError):
+            return None
+
+    def _size_message(self) -> str:
+        return f"Upload exceeds the {self.max_bytes // (1024 * 1024)} MB limit"
+
+
+class RequestSizeLimitMiddleware:
+    """
+    ASGI middleware that answers 413 for oversized request bodies
+    before the multipart parser spools them
+
+    Rejects on Content-Length up front, and counts the bytes of chunked
+    bodies as they arrive.
+    """
+
+    def __init__(self, app, max_bytes: int, path_limits: dict = None):
+        """
+        Args:
+            app: Wrapped ASGI application
+            max_bytes: Largest accepted request body (0 = unlimited)
+            path_limits: Optional path -> limit overrides, e.g. for
+                endpoints taking several files
+        """
+        self.app = app
+        self.max_bytes = max_bytes
+        self.path_limits = path_limits or {}
+
+    async def __call__(self, scope, receive, send):
+        max_bytes = self.path_limits.get(scope.get("path"), self.max_bytes)
+
+        if scope["type"] != "http" or not max_bytes:
+            await self.app(scope, receive, send)
+            return
+
+        content_length = dict(scope["headers"]).get(b"content-length")
+        if content_length is not None:
+            try:
+                declared = int(content_length)
+            except ValueError:
+                response = JSONResponse({"detail": "Invalid Content-Length header"}, status_code=400)
+                await response(scope, receive, send)
+                return
+
+            if declared > max_bytes:
+                response = JSONResponse({"detail": "Request body too large"}, status_code=413)
+                await response(scope, receive, send)
+                return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > max_bytes:
+                    # Raised inside body parsing; FastAPI passes HTTPException through
+                    raise HTTPException(status_code=413, detail="Request body too large")
+            return message
+
+        await self.app(scope, limited_receive, send)
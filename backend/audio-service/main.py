@@ -8,15 +8,31 @@ Converts audio files to spectrograms for ML model
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+import logging
 import uvicorn
 import os
 from dotenv import load_dotenv
 
+# Load environment variables (before app modules read them)
+load_dotenv()
+
+# Log level switch: DEBUG adds per-request details
+logging.basicConfig(
+    level=os.getenv("LOG_LEVEL", "INFO").upper(),
+    format="%(asctime)s %(levelname)s [%(name)s] %(message)s"
+)
+logger = logging.getLogger("audio-service")
+
 from app.processor import AudioProcessor
+from app.threads import ThreadBudget
+from app.uploads import UploadSpooler, RequestSizeLimitMiddleware
+from app import metrics
 from app.routes import AudioProcessingRouter
-
-# Load environment variables
-load_dotenv()
+# service_common is importable once the app package is (see app/__init__.py)
+from service_common.executor import WorkerPool
+from service_common.cache import ResultCache
+from service_common.lifecycle import ModelLoader, LifecycleRouter, NotReadyMiddleware
+from service_common.profiling import RequestProfiler, RequestIdMiddleware, ProfilesRouter
 
 app = FastAPI(
     title="Audio Processing Service",
@@ -24,45 +40,126 @@ app = FastAPI(
     version="1.0.0"
 )
 
-# CORS middleware
+# Upload storage and limits; oversized bodies get 413 before they are parsed
+# (POST /process/batch may carry up to MAX_BATCH_FILES uploads)
+upload_spooler = UploadSpooler.from_env()
+max_batch_files = int(os.getenv("MAX_BATCH_FILES", 16))
+app.add_middleware(
+    RequestSizeLimitMiddleware,
+    max_bytes=upload_spooler.max_request_bytes,
+    path_limits={"/process/batch": upload_spooler.max_request_bytes * max_batch_files}
+)
+
+# Models load in the background; until then other routes answer 503
+model_loader = ModelLoader()
+app.add_middleware(NotReadyMiddleware, loader=model_loader)
+
+# Request ids (X-Request-ID, set by the gateway) and opt-in profiling
+# (None unless PROFILE_DIR is set)
+app.add_middleware(RequestIdMiddleware)
+request_profiler = RequestProfiler.from_env("audio-service")
+if request_profiler is not None:
+    app.include_router(ProfilesRouter(request_profiler).router)
+
+# CORS middleware, added last so it is the outermost one: the 400/413/503
+# answers of the middlewares above reach browsers with CORS headers too
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # In production, specify exact origins
     allow_credentials=True,
     allow_methods=["GET", "POST"],  # Only methods used by this service
-    allow_headers=["Content-Type", "Accept", "Authorization"],  # Only necessary headers
+    allow_headers=["Content-Type", "Accept", "Authorization", "X-Request-ID", "X-Profile-Token"],
+    expose_headers=["X-Request-ID"],
 )
 
+# CPU threads shared by Spleeter, BLAS and the stem pool (CPU_THREAD_BUDGET)
+thread_budget = ThreadBudget.from_env()
+
 # Global processor instance
 audio_processor = None
+audio_pool = None
 audio_router = None
 
 
-@app.on_event("startup")
-async def startup_event():
-    """Initialize AudioProcessor and download Spleeter models at startup"""
-    global audio_processor, audio_router
+def health_details() -> dict:
+    """Thread budget and executor state (once the pool exists) for /health"""
+    details = {"threads": thread_budget.stats()}
+    if audio_pool is not None:
+        details["executor"] = audio_pool.stats()
+    if request_profiler is not None:
+        details["profiling"] = request_profiler.stats()
+    return details
+
+
+# /health, /ready and /metrics answer from the first second
+app.include_router(LifecycleRouter(
+    "audio-service", model_loader, details=health_details, metrics=metrics.metrics_response
+).router)
 
-    print("🎵 Initializing Audio Processor...")
-    print("⏳ This may take 1-3 minutes on first run (downloading Spleeter models)...")
 
-    # Initialize processor (this downloads and loads Spleeter models)
-    audio_processor = AudioProcessor()
+def load_models(progress) -> AudioProcessingRouter:
+    """
+    Load Spleeter and create the worker pool (background thread)
 
-    print("✅ Audio Processor initialized successfully!")
+    Args:
+        progress: ModelLoader.progress callback
 
-    # Initialize router with processor
-    audio_router = AudioProcessingRouter(audio_processor)
+    Returns:
+        Router for the processing endpoints
+    """
+    global audio_processor, audio_pool
 
-    # Include routes
+    # Before Spleeter starts TensorFlow, which sizes its thread pools once
+    thread_budget.apply()
+
+    progress("loading", "Spleeter 4stems")
+    audio_processor = AudioProcessor(stem_threads=thread_budget.stem_threads)
+
+    # Worker pool, started by include_routes() on the event loop thread
+    audio_pool = WorkerPool.from_env(audio_processor, warmup_method="warmup", metrics=metrics)
+
+    # Initialize router with processor (cache is None unless CACHE_ENABLED=true)
+    return AudioProcessingRouter(
+        audio_processor, audio_pool, ResultCache.from_env(reduced_precision=True), upload_spooler, max_batch_files,
+        request_profiler
+    )
+
+
+async def include_routes(router: AudioProcessingRouter):
+    """
+    Start the worker pool and add the processing endpoints (event loop)
+
+    In process mode the workers fork here, on the event loop thread, after
+    Spleeter is loaded; each runs one short separation before it takes requests
+    """
+    global audio_router
+
+    model_loader.progress("warming_up", "first separation")
+    await audio_pool.start_async()
+
+    audio_router = router
     app.include_router(audio_router.router)
 
 
+@app.on_event("startup")
+async def startup_event():
+    """Start loading Spleeter without blocking the server"""
+    logger.info("🎵 Loading Audio Processor in the background (GET /ready turns 200 when done)...")
+    model_loader.start(load_models, on_loaded=include_routes)
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Let in-flight processing finish and stop the worker pool"""
+    if audio_pool is not None:
+        audio_pool.shutdown()
+
+
 if __name__ == "__main__":
     port = int(os.getenv("PORT", 5001))
     host = os.getenv("HOST", "0.0.0.0")
 
-    print(f"🎵 Audio Service starting on {host}:{port}")
+    logger.info(f"🎵 Audio Service starting on {host}:{port}")
 
     # Note: reload=False on Windows to avoid multiprocessing issues with Spleeter
     uvicorn.run(
@@ -0,0 +1,100 @@
+"""
+ResultCache single-flight with uploads that outlive the request that saved them
+"""
+
+import asyncio
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from app.uploads import StoredUpload
+from service_common.cache import ResultCache
+
+KEY = "a" * 64
+
+
+def stored_upload(tmp_path, name: str, content: bytes) -> StoredUpload:
+    path = tmp_path / name
+    path.write_bytes(content)
+    return StoredUpload(str(path), len(content), name)
+
+
+async def request(cache: ResultCache, upload: StoredUpload, compute):
+    """What a route does: compute through the cache, clean up its upload when it ends"""
+    try:
+        return await cache.get_or_compute(KEY, compute, resource=upload)
+    finally:
+        upload.cleanup()
+
+
+def test_cancelled_leader_keeps_its_upload_for_waiters(tmp_path):
+    async def scenario():
+        cache = ResultCache(memory_max_bytes=2**20)
+        leader_upload = stored_upload(tmp_path, "leader.wav", b"leader audio")
+        waiter_upload = stored_upload(tmp_path, "waiter.wav", b"waiter audio")
+        proceed = asyncio.Event()
+
+        async def leader_compute():
+            await proceed.wait()
+            # Reads the leader's file after the leader went away
+            return np.frombuffer(Path(leader_upload.path).read_bytes(), dtype=np.uint8)
+
+        async def waiter_compute():
+            raise AssertionError("the waiter must share the leader's computation")
+
+        leader = asyncio.create_task(request(cache, leader_upload, leader_compute))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(request(cache, waiter_upload, waiter_compute))
+        await asyncio.sleep(0)
+
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        assert Path(leader_upload.path).exists()
+
+        proceed.set()
+        result, cache_hit = await waiter
+
+        assert cache_hit
+        assert result.tobytes() == b"leader audio"
+        assert not Path(leader_upload.path).exists()
+        assert not Path(waiter_upload.path).exists()
+        assert cache.stats()["coalesced"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_failed_computation_releases_the_upload(tmp_path):
+    async def scenario():
+        cache = ResultCache(memory_max_bytes=2**20)
+        upload = stored_upload(tmp_path, "leader.wav", b"audio")
+
+        async def compute():
+            raise ValueError("undecodable")
+
+        with pytest.raises(ValueError):
+            await request(cache, upload, compute)
+
+        assert not Path(upload.path).exists()
+        assert cache.stats()["inflight"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_cache_hit_does_not_retain_the_upload(tmp_path):
+    async def scenario():
+        cache = ResultCache(memory_max_bytes=2**20)
+        cache.put(KEY, np.arange(3, dtype=np.float32))
+        upload = stored_upload(tmp_path, "again.wav", b"audio")
+
+        async def compute():
+            raise AssertionError("cached")
+
+        result, cache_hit = await request(cache, upload, compute)
+
+        assert cache_hit
+        np.testing.assert_array_equal(result, [0, 1, 2])
+        assert not Path(upload.path).exists()
+
+    asyncio.run(scenario())
@@ -0,0 +1,68 @@
+"""
+Parity of MelSpectrogramEngine with the original per-stem librosa pipeline
+"""
+
+import librosa
+import numpy as np
+import pytest
+
+from app.spectrogram import MelSpectrogramEngine
+
+SR = 22050
+N_FFT = 2048
+HOP_LENGTH = 512
+N_MELS = 128
+TARGET_FRAMES = 862
+
+# Largest difference accepted, in dB (float32 rounding only)
+TOLERANCE_DB = 1e-3
+
+
+def reference_spectrogram(y: np.ndarray) -> np.ndarray:
+    """melspectrogram + power_to_db(ref=np.max), padded with -80 dB or cropped to 862 frames"""
+    mel = librosa.feature.melspectrogram(y=y, sr=SR, n_fft=N_FFT, hop_length=HOP_LENGTH, n_mels=N_MELS)
+    mel_db = librosa.power_to_db(mel, ref=np.max)
+
+    if mel_db.shape[1] < TARGET_FRAMES:
+        mel_db = np.pad(mel_db, ((0, 0), (0, TARGET_FRAMES - mel_db.shape[1])), constant_values=-80.0)
+    return mel_db[:, :TARGET_FRAMES]
+
+
+@pytest.mark.parametrize("samples", [
+    5 * SR,  # short: padded
+    (TARGET_FRAMES - 1) * HOP_LENGTH,  # exactly 862 frames
+    30 * SR,  # long: cropped
+], ids=["short", "exact", "long"])
+def test_compute_matches_librosa(samples):
+    rng = np.random.default_rng(samples)
+    # Four "stems" with different levels, so each needs its own reference
+    batch = np.stack([
+        (rng.standard_normal(samples) * level).astype(np.float32) for level in (0.5, 0.1, 0.01, 0.001)
+    ])
+
+    engine = MelSpectrogramEngine(N_FFT, HOP_LENGTH, N_MELS, target_frames=TARGET_FRAMES)
+    result = engine.compute(batch, SR)
+
+    assert result.shape == (4, N_MELS, TARGET_FRAMES, 1)
+    for stem, y in enumerate(batch):
+        expected = reference_spectrogram(y)
+        np.testing.assert_allclose(result[stem, :, :, 0], expected, rtol=0, atol=TOLERANCE_DB)
+
+
+def test_exact_input_needs_no_padding():
+    samples = (TARGET_FRAMES - 1) * HOP_LENGTH
+    y = np.random.default_rng(0).standard_normal((1, samples)).astype(np.float32)
+
+    result = MelSpectrogramEngine(N_FFT, HOP_LENGTH, N_MELS).compute(y, SR)
+
+    # Padding would show as exact -80 dB columns at the end
+    assert not np.all(result[0, :, -1, 0] == -80.0)
+
+
+def test_silence_is_zero_db():
+    # power_to_db(ref=np.max) of silence: amin / amin -> 0 dB everywhere
+    batch = np.zeros((1, 5 * SR), dtype=np.float32)
+
+    result = MelSpectrogramEngine(N_FFT, HOP_LENGTH, N_MELS).compute(batch, SR)
+
+    np.testing.assert_allclose(result[0, :, :, 0], reference_spectrogram(batch[0]), rtol=0, atol=TOLERANCE_DB)
@@ -0,0 +1,35 @@
+"""
+Accept header negotiation of the binary .npy format
+"""
+
+import pytest
+
+from service_common.tensor_codec import negotiate_wire_dtype
+
+
+@pytest.mark.parametrize("accept, expected", [
+    # What the gateway sends
+    ("application/x-npy; dtype=float16, application/json;q=0.5", "float16"),
+    ("application/x-npy", "float32"),
+    ("application/x-npy;q=0.5, application/*;q=0.4", "float32"),
+    # A tie with a wildcard: the explicitly named binary format
+    ("application/x-npy, */*", "float32"),
+    # JSON ranked higher, or tied while named explicitly
+    ("application/json, application/x-npy;q=0.1", None),
+    ("application/x-npy;q=0.5, */*", None),
+    ("application/json, application/x-npy", None),
+    # Binary not acceptable or not asked for
+    ("application/x-npy;q=0", None),
+    ("application/x-npy;q=0.000", None),
+    ("*/*", None),
+    ("", None),
+    (None, None),
+])
+def test_negotiate_wire_dtype(accept, expected):
+    assert negotiate_wire_dtype(accept) == expected
+
+
+@pytest.mark.parametrize("accept", ["application/x-npy;q=high", "application/x-npy; dtype=float64"])
+def test_invalid_binary_range_is_rejected(accept):
+    with pytest.raises(ValueError):
+        negotiate_wire_dtype(accept)
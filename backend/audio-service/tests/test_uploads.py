@@ -0,0 +1,144 @@
+"""
+Request size limits and upload temp files
+"""
+
+import asyncio
+import hashlib
+import os
+
+import pytest
+from fastapi import APIRouter, FastAPI, File, Form, HTTPException, UploadFile
+from fastapi.testclient import TestClient
+
+from app.uploads import RequestSizeLimitMiddleware, UploadSpooler, UploadTooLargeError
+
+MAX_UPLOAD_BYTES = 100_000
+BOUNDARY = "test-boundary"
+
+
+@pytest.fixture
+def spooler(tmp_path):
+    return UploadSpooler(temp_dir=str(tmp_path), max_bytes=MAX_UPLOAD_BYTES)
+
+
+@pytest.fixture
+def client(spooler):
+    """An upload endpoint built like the service routers, behind the size limit"""
+    router = APIRouter(route_class=spooler.route_class())
+
+    @router.post("/upload")
+    async def upload(audio: UploadFile = File(...), label: str = Form(...)):
+        try:
+            stored = await spooler.save(audio)
+        except UploadTooLargeError as e:
+            raise HTTPException(status_code=413, detail=str(e))
+
+        try:
+            with open(stored.path, "rb") as f:
+                return {"label": label, "size": stored.size, "sha256": stored.sha256,
+                        "matches": hashlib.sha256(f.read()).hexdigest() == stored.sha256}
+        finally:
+            stored.cleanup()
+
+    app = FastAPI()
+    app.include_router(router)
+    app.add_middleware(RequestSizeLimitMiddleware, max_bytes=spooler.max_request_bytes)
+    return TestClient(app)
+
+
+def temp_files(spooler) -> list:
+    return sorted(os.listdir(spooler.temp_dir))
+
+
+def multipart_body(content: bytes, label: str = "a") -> bytes:
+    return (
+        f"--{BOUNDARY}\r\n"
+        f'Content-Disposition: form-data; name="label"\r\n\r\n{label}\r\n'
+        f"--{BOUNDARY}\r\n"
+        f'Content-Disposition: form-data; name="audio"; filename="a.wav"\r\n'
+        f"Content-Type: audio/wav\r\n\r\n"
+    ).encode() + content + f"\r\n--{BOUNDARY}--\r\n".encode()
+
+
+def chunked(body: bytes, chunk_size: int = 16 * 1024):
+    """Streamed without Content-Length (Transfer-Encoding: chunked)"""
+    for start in range(0, len(body), chunk_size):
+        yield body[start:start + chunk_size]
+
+
+def test_upload_is_stored_hashed_and_removed(client, spooler):
+    content = bytes(range(256)) * 100
+
+    response = client.post("/upload", files={"audio": ("a.wav", content, "audio/wav")}, data={"label": "x"})
+
+    assert response.status_code == 200
+    assert response.json() == {
+        "label": "x", "size": len(content), "sha256": hashlib.sha256(content).hexdigest(), "matches": True
+    }
+    assert temp_files(spooler) == []
+
+
+def test_oversized_body_is_413_by_content_length(client, spooler):
+    content = b"\0" * (spooler.max_request_bytes + 1)
+
+    response = client.post("/upload", files={"audio": ("a.wav", content, "audio/wav")}, data={"label": "x"})
+
+    assert response.status_code == 413
+    assert response.json()["detail"] == "Request body too large"
+    assert temp_files(spooler) == []
+
+
+def test_chunked_body_over_the_limit_is_413(client, spooler):
+    body = multipart_body(b"\0" * (spooler.max_request_bytes + 1))
+
+    response = client.post(
+        "/upload", content=chunked(body),
+        headers={"Content-Type": f"multipart/form-data; boundary={BOUNDARY}"}
+    )
+
+    assert response.status_code == 413
+    assert temp_files(spooler) == []
+
+
+def test_file_over_the_upload_limit_is_413(client, spooler):
+    # Within the request limit (which allows for multipart overhead), over the file limit
+    content = b"\0" * (MAX_UPLOAD_BYTES + 1)
+
+    response = client.post(
+        "/upload", content=chunked(multipart_body(content)),
+        headers={"Content-Type": f"multipart/form-data; boundary={BOUNDARY}"}
+    )
+
+    assert response.status_code == 413
+    assert "limit" in response.json()["detail"]
+    assert temp_files(spooler) == []
+
+
+def test_unclaimed_upload_is_removed_after_validation_error(client, spooler):
+    # No "label" field: 422 before the endpoint saves the already spooled file
+    response = client.post("/upload", files={"audio": ("a.wav", b"audio", "audio/wav")})
+
+    assert response.status_code == 422
+    assert temp_files(spooler) == []
+
+
+@pytest.mark.parametrize("content_length", [b"12abc", b""])
+def test_malformed_content_length_is_400(content_length):
+    sent = []
+
+    async def app(scope, receive, send):
+        raise AssertionError("the request must not reach the app")
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    middleware = RequestSizeLimitMiddleware(app, max_bytes=1024)
+    scope = {"type": "http", "method": "POST", "path": "/upload",
+             "headers": [(b"content-length", content_length)]}
+    asyncio.run(middleware(scope, receive, send))
+
+    assert sent[0]["status"] == 400
+    assert b"Invalid Content-Length header" in sent[1]["body"]
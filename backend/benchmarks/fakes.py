@@ -0,0 +1,156 @@
+"""
+Offline Stand-ins
+Synthetic audio, a separator with Spleeter's output contract and a
+randomly initialized genre model, so benchmarks need no network or
+pretrained weights
+"""
+
+import os
+from pathlib import Path
+import time
+
+import numpy as np
+import soundfile as sf
+
+
+STEMS = ["vocals", "drums", "bass", "other"]
+
+
+def synthetic_audio(duration: float, sample_rate: int = 44100, seed: int = 0) -> np.ndarray:
+    """
+    Deterministic music-like stereo signal: a few harmonics, a pulse and noise
+
+    Args:
+        duration: Length in seconds
+        sample_rate: Sample rate in Hz
+        seed: Random seed for the noise component
+
+    Returns:
+        float32 waveform with shape (samples, 2)
+    """
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(duration * sample_rate)) / sample_rate
+
+    tone = sum(np.sin(2 * np.pi * f * t) / (i + 1) for i, f in enumerate((110.0, 220.0, 440.0, 880.0)))
+    pulse = (np.sin(2 * np.pi * 2.0 * t) > 0.95).astype(np.float64)
+    noise = rng.standard_normal(t.shape)
+
+    mono = 0.3 * tone + 0.3 * pulse + 0.05 * noise
+    stereo = np.stack([mono, np.roll(mono, 64)], axis=1)
+    return (0.5 * stereo / np.abs(stereo).max()).astype(np.float32)
+
+
+def write_synthetic_wav(path: str, duration: float, sample_rate: int = 44100, seed: int = 0) -> str:
+    """Write synthetic_audio() to a WAV file and return its path"""
+    sf.write(path, synthetic_audio(duration, sample_rate, seed), sample_rate)
+    return path
+
+
+class SoundfileAudioLoader:
+    """
+    AudioAdapter.load() stand-in reading files with soundfile
+    Only supports files already at the requested sample rate
+    """
+
+    def load(self, path, offset=None, duration=None, sample_rate=None, dtype=np.float32):
+        """
+        Returns:
+            Tuple (waveform with shape (samples, channels), sample_rate)
+        """
+        info = sf.info(str(path))
+        if sample_rate is not None and info.samplerate != sample_rate:
+            raise ValueError(f"Expected {sample_rate} Hz audio, got {info.samplerate} Hz")
+
+        start = int((offset or 0.0) * info.samplerate)
+        frames = int(duration * info.samplerate) if duration is not None else -1
+
+        waveform, sr = sf.read(str(path), start=start, frames=frames, dtype="float32", always_2d=True)
+        return waveform.astype(dtype, copy=False), sr
+
+
+class FakeSeparator:
+    """
+    Separator stand-in with Spleeter's 4-stem output contract
+    - separate(): {stem: float32 array with the input's (samples, channels) shape}
+    - separate_to_file(): {destination}/{file stem}/{stem}.wav at 44.1 kHz
+
+    Stems are fixed FFT band splits of the mixture, so they are cheap,
+    deterministic and spectrally different from each other.
+    """
+
+    # Frequency bands (Hz) per stem
+    BANDS = {
+        "bass": (0.0, 250.0),
+        "drums": (250.0, 2000.0),
+        "vocals": (2000.0, 6000.0),
+        "other": (6000.0, None),
+    }
+
+    def __init__(self, sample_rate: int = 44100, delay_ms: float = 0.0):
+        """
+        Args:
+            sample_rate: Sample rate of the waveforms passed to separate()
+            delay_ms: Extra sleep per call, to emulate a slower separator
+        """
+        self.sample_rate = sample_rate
+        self.delay = delay_ms / 1000.0
+        self.audio_loader = SoundfileAudioLoader()
+
+    def separate(self, waveform: np.ndarray, audio_descriptor=None) -> dict:
+        if self.delay:
+            time.sleep(self.delay)
+
+        spectrum = np.fft.rfft(waveform, axis=0)
+        freqs = np.fft.rfftfreq(waveform.shape[0], d=1.0 / self.sample_rate)
+
+        stems = {}
+        for stem in STEMS:
+            low, high = self.BANDS[stem]
+            mask = (freqs >= low) & ((freqs < high) if high is not None else True)
+            stems[stem] = np.fft.irfft(spectrum * mask[:, np.newaxis], n=waveform.shape[0], axis=0)
+            stems[stem] = stems[stem].astype(np.float32)
+
+        return stems
+
+    def separate_to_file(self, audio_descriptor, destination, offset=0, duration=600.0, **kwargs):
+        waveform, _ = self.audio_loader.load(audio_descriptor, offset=offset, duration=duration,
+                                             sample_rate=self.sample_rate)
+
+        output_dir = Path(destination) / Path(audio_descriptor).stem
+        output_dir.mkdir(parents=True, exist_ok=True)
+
+        for stem, stem_waveform in self.separate(waveform).items():
+            sf.write(str(output_dir / f"{stem}.wav"), stem_waveform, self.sample_rate)
+
+
+def build_random_model(path: str, seed: int = 0) -> str:
+    """
+    Save a small randomly initialized model with the real input/output contract:
+    4 inputs of shape (128, 862, 1) -> 9 softmax probabilities
+
+    Args:
+        path: Destination .keras file
+        seed: Weight initialization seed
+
+    Returns:
+        path
+    """
+    import tensorflow as tf
+
+    tf.keras.utils.set_random_seed(seed)
+
+    inputs = [tf.keras.Input((128, 862, 1), name=f"{stem}_input") for stem in STEMS]
+    branches = []
+    for stem_input in inputs:
+        x = tf.keras.layers.Conv2D(8, 3, strides=2, activation="relu")(stem_input)
+        x = tf.keras.layers.MaxPooling2D(2)(x)
+        x = tf.keras.layers.Conv2D(16, 3, activation="relu")(x)
+        branches.append(tf.keras.layers.GlobalAveragePooling2D()(x))
+
+    x = tf.keras.layers.Concatenate()(branches)
+    x = tf.keras.layers.Dense(32, activation="relu")(x)
+    outputs = tf.keras.layers.Dense(9, activation="softmax")(x)
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tf.keras.Model(inputs, outputs).save(path)
+    return path
@@ -0,0 +1,247 @@
+"""
+============================================
+OFFLINE BENCHMARKS
+============================================
+Times the audio and ML pipelines stage by stage and end to end through
+FastAPI's test client, without network access or pretrained models
+
+Usage:
+    python benchmarks/run.py                              # all stages
+    python benchmarks/run.py --stages audio.process ml.http --concurrency 1 4
+    python benchmarks/run.py --output after.json --compare before.json
+"""
+
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import json
+import logging
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def parse_args(argv=None):
+    from stages import STAGES
+
+    parser = argparse.ArgumentParser(description="Offline benchmarks for the audio and ML services")
+    parser.add_argument("--stages", nargs="+", default=list(STAGES), choices=list(STAGES),
+                        metavar="STAGE", help=f"Stages to run (default: all): {', '.join(STAGES)}")
+    parser.add_argument("--iterations", type=int, default=20, help="Timed calls per stage and concurrency")
+    parser.add_argument("--warmup", type=int, default=2, help="Untimed calls before measuring")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1],
+                        help="Concurrent callers; one run per value (default: 1)")
+    parser.add_argument("--duration", type=float, default=10.0, help="Synthetic audio length in seconds")
+    parser.add_argument("--batch-size", type=int, default=1,
+                        help="Samples per forward pass (ml.normalization, ml.forward, micro-batching), "
+                             "queries per search (ml.similarity) and files per call (audio.process_many)")
+    parser.add_argument("--separation-mode", choices=["memory", "file"], default="memory")
+    parser.add_argument("--stem-threads", type=int, default=1,
+                        help="Threads converting the 4 stems concurrently (audio stages)")
+    parser.add_argument("--thread-budget", type=int, default=0,
+                        help="CPU_THREAD_BUDGET for the audio stages (0 = library defaults)")
+    parser.add_argument("--separator-delay-ms", type=float, default=0.0,
+                        help="Extra time per separation, to emulate Spleeter's cost")
+    parser.add_argument("--executor-mode", choices=["inline", "thread", "process"], default="thread",
+                        help="WorkerPool mode for the HTTP stages")
+    parser.add_argument("--workers", type=int, default=1, help="WorkerPool workers for the HTTP stages")
+    parser.add_argument("--batching", action="store_true", help="Enable micro-batching in ml.http")
+    parser.add_argument("--index-size", type=int, default=100000, help="Tracks in the ml.similarity index")
+    parser.add_argument("--embedding-dim", type=int, default=128, help="Embedding size in ml.similarity")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="benchmark-results.json", help="JSON results file")
+    parser.add_argument("--compare", help="Previous results file to compare against")
+    parser.add_argument("--worker", metavar="STAGE", help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+# ---------- measurement (runs inside the per-stage process) ----------
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process (ru_maxrss is KiB on Linux, bytes on macOS)"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def measure(call, iterations: int, concurrency: int, warmup: int) -> dict:
+    """
+    Time `call` iterations times from `concurrency` threads
+
+    Returns:
+        Throughput, latency percentiles (ms) and wall time
+    """
+    for _ in range(warmup):
+        call()
+
+    latencies = []
+
+    def timed(_):
+        start = time.perf_counter()
+        call()
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    if concurrency == 1:
+        for i in range(iterations):
+            timed(i)
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            list(executor.map(timed, range(iterations)))
+    wall = time.perf_counter() - start
+
+    latencies_ms = np.array(latencies) * 1000.0
+    return {
+        "iterations": iterations,
+        "concurrency": concurrency,
+        "wall_seconds": wall,
+        "throughput_per_second": iterations / wall,
+        "latency_ms": {
+            "mean": float(latencies_ms.mean()),
+            "p50": float(np.percentile(latencies_ms, 50)),
+            "p95": float(np.percentile(latencies_ms, 95)),
+            "p99": float(np.percentile(latencies_ms, 99)),
+            "max": float(latencies_ms.max()),
+        },
+    }
+
+
+def run_stage(args) -> dict:
+    """Set up one stage, run it at every concurrency level and report"""
+    from stages import STAGES, make_workdir, use_service
+
+    suite, setup, kind = STAGES[args.worker]
+    use_service(suite)
+    workdir = make_workdir()
+
+    if kind == "check":
+        return {"check": setup(args, workdir), "peak_rss_mb": peak_rss_mb()}
+
+    setup_start = time.perf_counter()
+    if kind == "http":
+        from fastapi.testclient import TestClient
+
+        app, call_with_client = setup(args, workdir)
+        client = TestClient(app)
+        client.__enter__()
+        call = lambda: call_with_client(client)
+    else:
+        call = setup(args, workdir)
+
+    result = {
+        "setup_seconds": time.perf_counter() - setup_start,
+        "setup_peak_rss_mb": peak_rss_mb(),
+        "runs": [],
+    }
+    for concurrency in args.concurrency:
+        run = measure(call, args.iterations, concurrency, args.warmup)
+        run["peak_rss_mb"] = peak_rss_mb()
+        result["runs"].append(run)
+
+    return result
+
+
+# ---------- orchestration ----------
+
+def spawn_stage(stage: str, argv: list) -> dict:
+    """Run one stage in a fresh interpreter, so peak RSS and imports are per stage"""
+    completed = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), *argv, "--worker", stage],
+        cwd=BENCHMARK_DIR, capture_output=True, text=True
+    )
+    if completed.returncode != 0:
+        return {"error": completed.stderr.strip().splitlines()[-1] if completed.stderr else "failed"}
+
+    # The result is the last stdout line; anything before it is library noise
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def environment_info() -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=BENCHMARK_DIR,
+                                capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "git_commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+    }
+
+
+def print_summary(results: dict, baseline: dict = None):
+    """One line per stage and concurrency level, with the change against a baseline"""
+    print(f"{'stage':<20} {'conc':>4} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10} "
+          f"{'ops/s':>9} {'peak MB':>8}  vs baseline")
+
+    for stage, result in results["stages"].items():
+        if "error" in result:
+            print(f"{stage:<20} ERROR: {result['error']}")
+            continue
+        if "check" in result:
+            print(f"{stage:<20} {json.dumps(result['check'])}")
+            continue
+
+        baseline_runs = {}
+        if baseline and stage in baseline.get("stages", {}):
+            baseline_runs = {run["concurrency"]: run for run in baseline["stages"][stage].get("runs", [])}
+
+        for run in result["runs"]:
+            latency = run["latency_ms"]
+            line = (f"{stage:<20} {run['concurrency']:>4} {latency['p50']:>10.2f} {latency['p95']:>10.2f} "
+                    f"{latency['p99']:>10.2f} {run['throughput_per_second']:>9.2f} {run['peak_rss_mb']:>8.0f}")
+
+            previous = baseline_runs.get(run["concurrency"])
+            if previous:
+                p50_change = latency["p50"] / previous["latency_ms"]["p50"] - 1.0
+                throughput_change = run["throughput_per_second"] / previous["throughput_per_second"] - 1.0
+                line += f"  p50 {p50_change:+.1%}, ops/s {throughput_change:+.1%}"
+
+            print(line)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    args = parse_args(argv)
+
+    if args.worker:
+        # Keep stdout clean for the JSON result line
+        os.environ.setdefault("LOG_LEVEL", "WARNING")
+        logging.basicConfig(level=logging.WARNING)
+        print(json.dumps(run_stage(args)))
+        return
+
+    results = {
+        "environment": environment_info(),
+        "config": {key: value for key, value in vars(args).items() if key not in ("worker", "compare", "output")},
+        "stages": {},
+    }
+
+    for stage in args.stages:
+        print(f"Running {stage}...", file=sys.stderr)
+        results["stages"][stage] = spawn_stage(stage, argv)
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    print_summary(results, baseline)
+    print(f"\nResults written to {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+"""
+Benchmark Stages
+Each stage sets up its service objects and returns the callable to time
+Stages run in their own process (see run.py), so only one service's
+`app` package is ever imported at a time
+"""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+from fakes import FakeSeparator, SoundfileAudioLoader, build_random_model, write_synthetic_wav
+
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+SERVICE_DIRS = {
+    "audio": BACKEND_DIR / "audio-service",
+    "ml": BACKEND_DIR / "ml-service",
+}
+
+SEPARATION_SAMPLE_RATE = 44100
+
+
+def use_service(suite: str):
+    """Make `import app...` resolve to the suite's service package (and `service_common` importable)"""
+    sys.path.insert(0, str(SERVICE_DIRS[suite]))
+    sys.path.append(str(BACKEND_DIR))
+
+
+# ---------- audio ----------
+
+def _audio_setup(args, workdir: str):
+    """Build an AudioProcessor with offline stand-ins plus a synthetic input file"""
+    os.environ["SEPARATION_MODE"] = args.separation_mode
+
+    from app.processor import AudioProcessor
+    from app.threads import ThreadBudget
+
+    budget = ThreadBudget(args.thread_budget, args.stem_threads, workers=args.workers)
+    budget.apply()
+
+    processor = AudioProcessor(
+        separator=FakeSeparator(SEPARATION_SAMPLE_RATE, delay_ms=args.separator_delay_ms),
+        audio_loader=SoundfileAudioLoader(),
+        stem_threads=budget.stem_threads
+    )
+    audio_path = write_synthetic_wav(
+        os.path.join(workdir, "input.wav"), args.duration, SEPARATION_SAMPLE_RATE, args.seed
+    )
+    return processor, audio_path
+
+
+def audio_decode(args, workdir):
+    processor, audio_path = _audio_setup(args, workdir)
+    return lambda: processor._load_waveform(audio_path)
+
+
+def audio_separation(args, workdir):
+    processor, audio_path = _audio_setup(args, workdir)
+    waveform = processor._load_waveform(audio_path)
+    return lambda: processor.separator.separate(waveform)
+
+
+def audio_mel(args, workdir):
+    processor, audio_path = _audio_setup(args, workdir)
+    stems = processor.separator.separate(processor._load_waveform(audio_path))
+    return lambda: processor.create_multi_channel_spectrogram_from_stems(stems, SEPARATION_SAMPLE_RATE)
+
+
+def audio_process(args, workdir):
+    processor, audio_path = _audio_setup(args, workdir)
+    return lambda: processor.process(audio_path)
+
+
+def audio_process_many(args, workdir):
+    """--batch-size files through the pipelined batch path"""
+    processor, audio_path = _audio_setup(args, workdir)
+    paths = [audio_path] * args.batch_size
+    return lambda: processor.process_many(paths)
+
+
+def audio_http(args, workdir):
+    """POST /process through the real router, binary response"""
+    from fastapi import FastAPI
+
+    from service_common.executor import WorkerPool
+    from service_common.profiling import RequestIdMiddleware
+    from app.routes import AudioProcessingRouter
+    from app.uploads import UploadSpooler
+
+    processor, audio_path = _audio_setup(args, workdir)
+    pool = WorkerPool(processor, mode=args.executor_mode, workers=args.workers,
+                      max_queued=args.iterations + args.warmup)
+    pool.start()
+
+    app = FastAPI()
+    app.add_middleware(RequestIdMiddleware)
+    app.include_router(AudioProcessingRouter(processor, pool, spooler=UploadSpooler(temp_dir=workdir)).router)
+
+    with open(audio_path, "rb") as f:
+        content = f.read()
+
+    def call(client):
+        response = client.post(
+            "/process",
+            files={"audio": ("segment.wav", content, "audio/wav")},
+            headers={"Accept": "application/x-npy"}
+        )
+        response.raise_for_status()
+
+    return app, call
+
+
+def audio_mel_parity(args, workdir):
+    """
+    Compare the batched mel engine with the plain librosa pipeline
+    (melspectrogram + power_to_db(ref=np.max) + crop/pad to 862 frames)
+
+    Returns:
+        Dictionary with the maximum absolute difference in dB
+    """
+    import librosa
+
+    processor, audio_path = _audio_setup(args, workdir)
+    stems = processor.separator.separate(processor._load_waveform(audio_path))
+    engine_output = processor.create_multi_channel_spectrogram_from_stems(stems, SEPARATION_SAMPLE_RATE)
+
+    max_diff = 0.0
+    for i, stem in enumerate(processor.STEMS):
+        mono = stems[stem].mean(axis=1)
+        mel = librosa.feature.melspectrogram(
+            y=mono, sr=SEPARATION_SAMPLE_RATE, n_mels=processor.n_mels,
+            hop_length=processor.hop_length, n_fft=processor.n_fft
+        )
+        reference = librosa.power_to_db(mel, ref=np.max)
+
+        frames = min(reference.shape[1], processor.target_frames)
+        expected = np.full((processor.n_mels, processor.target_frames), -80.0, dtype=np.float32)
+        expected[:, :frames] = reference[:, :frames]
+
+        max_diff = max(max_diff, float(np.abs(engine_output[i, :, :, 0] - expected).max()))
+
+    return {"mel_parity_max_abs_db": max_diff}
+
+
+# ---------- ml ----------
+
+def _ml_setup(args, workdir: str):
+    """Build a GenrePredictor around a randomly initialized model"""
+    from app.predictor import GenrePredictor
+
+    model_path = build_random_model(os.path.join(workdir, "random.keras"), args.seed)
+    predictor = GenrePredictor(model_path)
+
+    rng = np.random.default_rng(args.seed)
+    sample = rng.uniform(-80.0, 0.0, size=(4, 128, 862, 1)).astype(np.float32)
+    return predictor, sample
+
+
+def ml_normalization(args, workdir):
+    predictor, sample = _ml_setup(args, workdir)
+    batch = np.repeat(sample[np.newaxis], args.batch_size, axis=0)
+    return lambda: predictor._normalize(batch)
+
+
+def ml_forward(args, workdir):
+    predictor, sample = _ml_setup(args, workdir)
+    inputs = predictor._normalize(np.repeat(sample[np.newaxis], args.batch_size, axis=0))
+    predictor.engine(inputs)  # trace / allocate outside the timed loop
+    return lambda: predictor.engine(inputs)
+
+
+def ml_predict(args, workdir):
+    predictor, sample = _ml_setup(args, workdir)
+    return lambda: predictor.predict(sample)
+
+
+def ml_http(args, workdir):
+    """POST /predict through the real router, binary request"""
+    from fastapi import FastAPI
+
+    from app.batching import MicroBatcher
+    from service_common.executor import WorkerPool
+    from service_common.profiling import RequestIdMiddleware
+    from app.routes import PredictionRouter
+    from service_common.tensor_codec import NPY_MEDIA_TYPE, encode_tensor
+
+    predictor, sample = _ml_setup(args, workdir)
+    pool = WorkerPool(predictor, mode=args.executor_mode, workers=args.workers,
+                      max_queued=args.iterations + args.warmup)
+    pool.start()
+
+    batcher = None
+    if args.batching:
+        batcher = MicroBatcher(predictor, max_batch_size=args.batch_size, method="forward_batch")
+        batcher.start()
+
+    app = FastAPI()
+    app.add_middleware(RequestIdMiddleware)
+    app.include_router(PredictionRouter(predictor, batcher, pool).router)
+
+    body = encode_tensor(sample, "float32")
+
+    def call(client):
+        response = client.post("/predict", content=body, headers={"Content-Type": NPY_MEDIA_TYPE})
+        response.raise_for_status()
+
+    return app, call
+
+
+def ml_similarity(args, workdir):
+    """Top-10 search in an EmbeddingIndex of --index-size random embeddings"""
+    from app.similarity import EmbeddingIndex
+
+    dim = args.embedding_dim
+    rng = np.random.default_rng(args.seed)
+    index = EmbeddingIndex(os.path.join(workdir, "index"), dim, initial_capacity=args.index_size)
+
+    # Fill the matrix directly; add() per row would dominate the setup time
+    vectors = rng.standard_normal((args.index_size, dim)).astype(np.float32)
+    index._vectors[:] = index._normalize(vectors)
+    index._ids = [f"track-{row}" for row in range(args.index_size)]
+    index._rows = {track_id: row for row, track_id in enumerate(index._ids)}
+
+    queries = rng.standard_normal((args.batch_size, dim)).astype(np.float32)
+    return lambda: index.search(queries, k=10)
+
+
+# name -> (suite, setup, kind)
+#   kind "call":  setup returns a zero-argument callable to time
+#   kind "http":  setup returns (FastAPI app, callable taking a TestClient)
+#   kind "check": setup returns a dictionary of results, nothing is timed
+STAGES = {
+    "audio.decode": ("audio", audio_decode, "call"),
+    "audio.separation": ("audio", audio_separation, "call"),
+    "audio.mel": ("audio", audio_mel, "call"),
+    "audio.process": ("audio", audio_process, "call"),
+    "audio.process_many": ("audio", audio_process_many, "call"),
+    "audio.http": ("audio", audio_http, "http"),
+    "audio.mel_parity": ("audio", audio_mel_parity, "check"),
+    "ml.normalization": ("ml", ml_normalization, "call"),
+    "ml.forward": ("ml", ml_forward, "call"),
+    "ml.predict": ("ml", ml_predict, "call"),
+    "ml.http": ("ml", ml_http, "http"),
+    "ml.similarity": ("ml", ml_similarity, "call"),
+}
+
+
+def make_workdir() -> str:
+    """Scratch directory for synthetic inputs, models and uploads"""
+    return tempfile.mkdtemp(prefix="manginassifier-bench-")
@@ -0,0 +1,11 @@
+# Combined Service App Module
+
+import os
+from pathlib import Path
+import sys
+
+# service_common (modules shared by all services) lives in backend/; the
+# images copy it elsewhere and point SHARED_DIR at its parent directory
+SHARED_DIR = os.getenv("SHARED_DIR", str(Path(__file__).resolve().parent.parent.parent))
+if SHARED_DIR not in sys.path:
+    sys.path.append(SHARED_DIR)
@@ -0,0 +1,389 @@
+"""
+Bulk Classification
+Staged pipeline for labelling large collections offline: decoding, then
+separation and mel spectrograms on the worker pool, then batched inference,
+with results appended to a CSV that doubles as the checkpoint
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import csv
+import logging
+import os
+from pathlib import Path
+import time
+
+import numpy as np
+
+from .classifier import GenreClassifier
+from .services import AudioProcessor, GenrePredictor, WorkerPool
+
+logger = logging.getLogger(__name__)
+
+
+# Extensions picked up when walking a directory (anything ffmpeg decodes works)
+AUDIO_EXTENSIONS = (".mp3", ".wav", ".flac", ".ogg", ".opus", ".m4a", ".aac", ".aif", ".aiff", ".wma")
+
+
+def find_audio_files(directory: str, extensions: tuple = AUDIO_EXTENSIONS) -> list:
+    """
+    Audio files under a directory, recursively, in a stable order
+
+    Returns:
+        Paths relative to directory, with forward slashes
+    """
+    root = Path(directory)
+    paths = []
+    for folder, subfolders, files in os.walk(root):
+        subfolders.sort()
+        for name in sorted(files):
+            if name.lower().endswith(extensions):
+                paths.append((Path(folder) / name).relative_to(root).as_posix())
+    return paths
+
+
+class StageStats:
+    """Files and busy time of one pipeline stage"""
+
+    def __init__(self, name: str, workers: int):
+        """
+        Args:
+            name: Stage name in reports
+            workers: Calls the stage runs at once (for its utilization)
+        """
+        self.name = name
+        self.workers = workers
+        self.files = 0
+        self.failed = 0
+        self.busy_seconds = 0.0
+
+    def record(self, seconds: float, files: int = 1, failed: int = 0):
+        self.files += files
+        self.failed += failed
+        self.busy_seconds += seconds
+
+    def snapshot(self, elapsed: float) -> dict:
+        """
+        Args:
+            elapsed: Seconds since the pipeline started
+
+        Returns:
+            Dictionary with files, failed, files_per_second (over elapsed),
+            seconds_per_file (busy time per file and worker) and utilization
+            (busy share of its workers; the bottleneck stage is near 1)
+        """
+        return {
+            "files": self.files,
+            "failed": self.failed,
+            "files_per_second": round(self.files / elapsed, 3) if elapsed > 0 else 0.0,
+            "seconds_per_file": round(self.busy_seconds / self.files, 4) if self.files else None,
+            "utilization": round(self.busy_seconds / (elapsed * self.workers), 3) if elapsed > 0 else 0.0,
+        }
+
+
+class CsvCheckpoint:
+    """
+    Results CSV, one row per file, appended as files finish
+
+    It is also the checkpoint: a rerun with the same output skips every
+    file that already has a row (failed ones too, unless retried). A row cut
+    short by an interruption is removed before appending.
+    """
+
+    def __init__(self, path: str, genres: list, model_version: str):
+        """
+        Args:
+            path: CSV file (created with a header if missing)
+            genres: Genre names, one probability column each
+            model_version: Processing signature stored in every row
+        """
+        self.path = Path(path)
+        self.genres = list(genres)
+        self.model_version = model_version
+        self.columns = ["path", "status", "genre", "probability", "confidence",
+                        *self.genres, "error", "model_version"]
+        self._file = None
+        self._writer = None
+
+    def load(self) -> tuple:
+        """
+        Read what earlier runs finished
+
+        Returns:
+            Tuple (succeeded, failed): sets of relative paths
+
+        Raises:
+            ValueError: If the file has different columns (another model or layout)
+        """
+        if not self.path.exists() or self.path.stat().st_size == 0:
+            return set(), set()
+
+        self._drop_partial_row()
+
+        succeeded, failed = set(), set()
+        versions = set()
+        with open(self.path, newline="", encoding="utf-8") as f:
+            reader = csv.DictReader(f)
+            if reader.fieldnames != self.columns:
+                raise ValueError(f"{self.path} has other columns than this run writes; use a new --output")
+
+            for row in reader:
+                versions.add(row["model_version"])
+                if row["status"] == "ok":
+                    succeeded.add(row["path"])
+                    failed.discard(row["path"])
+                elif row["path"] not in succeeded:
+                    failed.add(row["path"])
+
+        if versions - {self.model_version}:
+            logger.warning("%s has rows from another model or processing version; they are kept", self.path)
+
+        return succeeded, failed
+
+    def open(self):
+        """Open for appending (writing the header for a new file)"""
+        new = not self.path.exists() or self.path.stat().st_size == 0
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, "a", newline="", encoding="utf-8")
+        self._writer = csv.writer(self._file)
+        if new:
+            self._writer.writerow(self.columns)
+            self._file.flush()
+
+    def write_ok(self, paths: list, probabilities: np.ndarray):
+        """Rows for classified files, then flush (the checkpoint advances)"""
+        for path, row in zip(paths, probabilities):
+            top = int(np.argmax(row))
+            self._writer.writerow([
+                path, "ok", self.genres[top], f"{row[top]:.6f}",
+                f"{GenreClassifier._confidence(row):.6f}",
+                *(f"{value:.6f}" for value in row), "", self.model_version
+            ])
+        self._file.flush()
+
+    def write_failed(self, path: str, error: str):
+        self._writer.writerow([path, "failed", "", "", "", *([""] * len(self.genres)),
+                               error, self.model_version])
+        self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _drop_partial_row(self):
+        """Cut the file after its last complete line"""
+        with open(self.path, "rb+") as f:
+            f.seek(0, os.SEEK_END)
+            size = f.tell()
+            f.seek(max(0, size - 65536))
+            tail = f.read()
+            if tail.endswith(b"\n"):
+                return
+
+            end = size - len(tail) + tail.rfind(b"\n") + 1
+            logger.warning("Removing an incomplete last row from %s", self.path)
+            f.truncate(end)
+
+
+class BulkClassifier:
+    """
+    Classifies many files through a staged producer/consumer pipeline:
+
+    1. decode: decode_threads threads decode each file's analysis window
+       (ffmpeg) in this process
+    2. spectrograms: the WorkerPool separates the stems and computes the mel
+       spectrograms (process mode: one forked worker per file in flight)
+    3. inference: spectrograms are stacked into batches of batch_size for
+       one genre model forward pass each, and the rows are appended to the CSV
+
+    Bounded queues of queue_size files connect the stages, so a slow stage
+    holds back the ones before it instead of piling up decoded audio.
+    A file that fails in any stage gets a "failed" row with the error.
+    """
+
+    def __init__(self, processor: AudioProcessor, predictor: GenrePredictor, pool: WorkerPool,
+                 output: CsvCheckpoint, decode_threads: int = 2, batch_size: int = 8,
+                 queue_size: int = 16, segment: tuple = None, report_seconds: float = 30.0):
+        """
+        Args:
+            processor: AudioProcessor (decoding here; separation in the pool)
+            predictor: GenrePredictor with the model loaded
+            pool: Started WorkerPool whose target is the processor
+            output: CsvCheckpoint rows are appended to (opened by run())
+            decode_threads: Files decoded at once
+            batch_size: Files per model forward pass
+            queue_size: Files waiting between two stages
+            segment: Optional (start, end) seconds analysed in every file
+                (the first window if None)
+            report_seconds: Interval of progress log lines (0 = none)
+        """
+        self.processor = processor
+        self.predictor = predictor
+        self.pool = pool
+        self.output = output
+        self.decode_threads = max(1, decode_threads)
+        self.batch_size = max(1, batch_size)
+        self.queue_size = max(1, queue_size)
+        self.segment = segment
+        self.report_seconds = report_seconds
+
+        self.stages = {
+            "decode": StageStats("decode", self.decode_threads),
+            "spectrograms": StageStats("spectrograms", pool.workers),
+            "inference": StageStats("inference", 1),
+        }
+        self._started = None
+        self._total = 0
+
+    async def run(self, directory: str, paths: list) -> dict:
+        """
+        Classify files and append their rows to the output
+
+        Args:
+            directory: Directory the paths are relative to
+            paths: Files to classify (see find_audio_files())
+
+        Returns:
+            Summary, see stats()
+        """
+        self._started = time.perf_counter()
+        self._total = len(paths)
+
+        decoded = asyncio.Queue(self.queue_size)
+        converted = asyncio.Queue(self.queue_size)
+        todo = iter(paths)
+
+        self.output.open()
+        decode_executor = ThreadPoolExecutor(max_workers=self.decode_threads, thread_name_prefix="decode")
+        reporter = asyncio.get_running_loop().create_task(self._report())
+        try:
+            decoders = [self._decode_worker(directory, todo, decode_executor, decoded, converted)
+                        for _ in range(self.decode_threads)]
+            converters = [self._spectrogram_worker(decoded, converted) for _ in range(self.pool.workers)]
+            inference = asyncio.ensure_future(self._inference_worker(converted))
+
+            await asyncio.gather(*decoders)
+            for _ in converters:
+                await decoded.put(None)
+            await asyncio.gather(*converters)
+            await converted.put(None)
+            await inference
+        finally:
+            reporter.cancel()
+            decode_executor.shutdown(wait=True)
+            self.output.close()
+
+        return self.stats()
+
+    def stats(self) -> dict:
+        """Per-stage throughput and utilization, plus overall files per second"""
+        elapsed = time.perf_counter() - self._started if self._started else 0.0
+        written = self.stages["inference"].files + sum(stage.failed for stage in self.stages.values())
+        return {
+            "files": self._total,
+            "written": written,
+            "elapsed_seconds": round(elapsed, 1),
+            "files_per_second": round(written / elapsed, 3) if elapsed > 0 else 0.0,
+            "stages": {name: stage.snapshot(elapsed) for name, stage in self.stages.items()},
+        }
+
+    # ---------- stages ----------
+
+    async def _decode_worker(self, directory: str, todo, executor, decoded: asyncio.Queue,
+                             converted: asyncio.Queue):
+        loop = asyncio.get_running_loop()
+        # Shared iterator: each worker takes the next path (one event loop thread)
+        for path in todo:
+            started = time.perf_counter()
+            try:
+                window = await loop.run_in_executor(
+                    executor, self.processor.decode_window, os.path.join(directory, path), self.segment
+                )
+            except Exception as e:
+                self.stages["decode"].record(time.perf_counter() - started, files=0, failed=1)
+                await converted.put((path, None, self._error(path, e)))
+                continue
+
+            self.stages["decode"].record(time.perf_counter() - started)
+            await decoded.put((path, window))
+
+    async def _spectrogram_worker(self, decoded: asyncio.Queue, converted: asyncio.Queue):
+        sample_rate = self.processor.separation_sample_rate
+        while True:
+            item = await decoded.get()
+            if item is None:
+                return
+
+            path, (waveform, lead, duration) = item
+            started = time.perf_counter()
+            try:
+                spectrograms = await self.pool.run("process_waveform", waveform, sample_rate, lead, duration)
+            except Exception as e:
+                self.stages["spectrograms"].record(time.perf_counter() - started, files=0, failed=1)
+                await converted.put((path, None, self._error(path, e)))
+                continue
+
+            self.stages["spectrograms"].record(time.perf_counter() - started)
+            await converted.put((path, spectrograms, None))
+
+    async def _inference_worker(self, converted: asyncio.Queue):
+        loop = asyncio.get_running_loop()
+        # One reused input buffer, as in full-track mode
+        batch = np.empty(
+            (self.batch_size, len(self.processor.STEMS), self.processor.n_mels,
+             self.processor.target_frames, 1),
+            dtype=np.float32
+        )
+        paths = []
+
+        while True:
+            item = await converted.get()
+            finished = item is None
+            if not finished:
+                path, spectrograms, error = item
+                if error is not None:
+                    self.output.write_failed(path, error)
+                else:
+                    batch[len(paths)] = spectrograms
+                    paths.append(path)
+
+            if paths and (len(paths) == self.batch_size or finished):
+                started = time.perf_counter()
+                try:
+                    # Off the event loop, so the other stages keep being fed
+                    probabilities = await loop.run_in_executor(
+                        None, self.predictor.predict_batch, batch[:len(paths)]
+                    )
+                except Exception as e:
+                    self.stages["inference"].record(time.perf_counter() - started, files=0, failed=len(paths))
+                    for path in paths:
+                        self.output.write_failed(path, self._error(path, e))
+                else:
+                    self.stages["inference"].record(time.perf_counter() - started, files=len(paths))
+                    self.output.write_ok(paths, probabilities)
+                paths = []
+
+            if finished:
+                return
+
+    # ---------- reporting ----------
+
+    async def _report(self):
+        """Log progress and per-stage throughput every report_seconds"""
+        if self.report_seconds <= 0:
+            return
+
+        while True:
+            await asyncio.sleep(self.report_seconds)
+            stats = self.stats()
+            logger.info(
+                "%d/%d files (%.2f/s) | %s", stats["written"], stats["files"], stats["files_per_second"],
+                " | ".join(f"{name} {stage['files_per_second']:.2f}/s, {stage['utilization']:.0%} busy"
+                           for name, stage in stats["stages"].items())
+            )
+
+    @staticmethod
+    def _error(path: str, e: Exception) -> str:
+        logger.warning("%s failed: %r", path, e)
+        return str(e) or type(e).__name__
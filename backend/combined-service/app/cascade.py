@@ -0,0 +1,86 @@
+"""
+Cheap-First Cascade
+A small genre model on the mixture's mel spectrogram, answering on its own
+when it is confident so Spleeter only runs for ambiguous clips
+"""
+
+import logging
+import os
+
+import numpy as np
+import tensorflow as tf
+
+from .services import KerasEngine
+
+logger = logging.getLogger(__name__)
+
+
+class MixtureClassifier:
+    """
+    Genre model with a single (128, 862, 1) input: the mel spectrogram (dB)
+    of the unseparated audio, as returned by AudioProcessor.mixture_spectrogram()
+
+    The model is expected to include its own input normalization (e.g. a
+    Normalization layer); the spectrogram is passed in unchanged.
+    """
+
+    def __init__(self, model_path: str, threshold: float = 0.9):
+        """
+        Args:
+            model_path: Keras model with 1 input and 9 softmax outputs
+            threshold: Top-1 probability at or above which its answer is used
+        """
+        if not 0.0 <= threshold <= 1.0:
+            raise ValueError(f"CASCADE_THRESHOLD must be between 0 and 1, got {threshold}")
+
+        self.model_path = model_path
+        self.threshold = threshold
+
+        logger.info("Loading mixture model from: %s", model_path)
+        model = tf.keras.models.load_model(model_path)
+        if len(model.inputs) != 1 or model.output_shape[-1] != 9:
+            raise ValueError(
+                f"Mixture model must have 1 input and 9 outputs, got {len(model.inputs)} "
+                f"input(s) and output shape {model.output_shape}"
+            )
+
+        # Eager call: also safe in workers forked after loading
+        self.engine = KerasEngine(model)
+        logger.info("Mixture model loaded (threshold %.2f)", threshold)
+
+    @classmethod
+    def from_env(cls):
+        """
+        Build the cascade's first stage from CASCADE_* environment variables
+
+        Returns:
+            MixtureClassifier, or None if CASCADE_MODEL_PATH is empty
+        """
+        model_path = os.getenv("CASCADE_MODEL_PATH")
+        if not model_path:
+            return None
+
+        return cls(model_path, threshold=float(os.getenv("CASCADE_THRESHOLD", 0.9)))
+
+    def identity(self) -> str:
+        """Model file and threshold, for cache keys (they change which path answers)"""
+        stat = os.stat(self.model_path)
+        return f"{os.path.abspath(self.model_path)}|{stat.st_size}|{stat.st_mtime_ns}|t={self.threshold}"
+
+    def predict(self, spectrogram: np.ndarray) -> np.ndarray:
+        """
+        Args:
+            spectrogram: Array with shape (128, 862, 1)
+
+        Returns:
+            Array of 9 probabilities [0-1]
+        """
+        return self.engine(spectrogram[np.newaxis])[0]
+
+    def is_confident(self, probabilities: np.ndarray) -> bool:
+        """True if the full (separation) path can be skipped"""
+        return float(probabilities.max()) >= self.threshold
+
+    def warmup(self):
+        """One dummy prediction, so the first request does not pay for allocations"""
+        self.predict(np.zeros((*self.engine.model.inputs[0].shape[1:],), dtype=np.float32))
@@ -0,0 +1,271 @@
+"""
+Genre Classification Pipeline
+Runs audio -> stems -> mel -> prediction in one process
+"""
+
+import logging
+import os
+
+import numpy as np
+
+from .services import AudioProcessor, GenrePredictor
+from .cascade import MixtureClassifier
+
+logger = logging.getLogger(__name__)
+
+
+class GenreClassifier:
+    """
+    Composes the existing AudioProcessor and GenrePredictor so the
+    spectrogram tensor never leaves memory
+    """
+
+    # Cascade paths, stored as an index after the probabilities (see with_path())
+    PATHS = ("full", "mixture")
+
+    def __init__(self, processor: AudioProcessor, predictor: GenrePredictor,
+                 mixture: MixtureClassifier = None):
+        """
+        Args:
+            processor: AudioProcessor with Spleeter loaded
+            predictor: GenrePredictor with the Keras model loaded
+            mixture: Optional first cascade stage; without it every clip
+                takes the full path
+        """
+        self.processor = processor
+        self.predictor = predictor
+        self.mixture = mixture
+
+        # Full-track mode: window hop, windows per forward pass, track length cap
+        self.full_track_hop_seconds = float(
+            os.getenv("FULL_TRACK_HOP_SECONDS", processor.window_seconds / 2)
+        )
+        self.full_track_batch_size = max(1, int(os.getenv("FULL_TRACK_BATCH_SIZE", 4)))
+        self.full_track_max_duration = float(os.getenv("FULL_TRACK_MAX_DURATION", 1800))
+
+    def is_loaded(self) -> bool:
+        """Check if the genre model is loaded"""
+        return self.predictor.is_loaded()
+
+    def warmup(self):
+        """Warm up Spleeter and the genre model (see their warmup methods)"""
+        self.processor.warmup()
+        self.predictor.warmup()
+        if self.mixture is not None:
+            self.mixture.warmup()
+
+    def processing_signature(self) -> str:
+        """
+        Identify everything besides the input audio that affects the result
+        Used as part of result cache keys
+        """
+        signature = f"{self.processor.processing_signature()}|{self.predictor.model_identity()}"
+        if self.mixture is not None:
+            signature = f"{signature}|cascade={self.mixture.identity()}"
+        return signature
+
+    def full_track_signature(self) -> str:
+        """Signature of the full (non-cascade) path plus the full-track window settings"""
+        return (
+            f"{self.processor.processing_signature()}|{self.predictor.model_identity()}"
+            f"|full-track|hop={self.full_track_hop_seconds}|max={self.full_track_max_duration}"
+        )
+
+    def classify(self, audio_path: str, segment: tuple = None) -> np.ndarray:
+        """
+        Classify an audio file
+
+        Args:
+            audio_path: Path to audio file
+            segment: Optional (start, end) seconds to analyse (first window if None)
+
+        Returns:
+            Array of 9 probabilities [0-1]
+        """
+        return self.predict(self.spectrograms(audio_path, segment))
+
+    def classify_cascade(self, audio_path: str, segment: tuple = None) -> np.ndarray:
+        """
+        classify() behind the cheap first stage: the mixture model answers
+        when it is confident, otherwise separation and the genre model run
+
+        Args:
+            audio_path: Path to audio file
+            segment: Optional (start, end) seconds to analyse
+
+        Returns:
+            Array of 10 values: 9 probabilities and the path taken (see split_path())
+        """
+        probabilities = self.classify_mixture(audio_path, segment)
+        if probabilities is not None:
+            return self.with_path(probabilities, "mixture")
+
+        return self.with_path(self.classify(audio_path, segment), "full")
+
+    def classify_mixture(self, audio_path: str, segment: tuple = None):
+        """
+        First cascade stage alone: mixture spectrogram and the mixture model
+
+        Returns:
+            Array of 9 probabilities if the mixture model is confident,
+            None if the full path has to run (or there is no cascade)
+        """
+        if self.mixture is None:
+            return None
+
+        probabilities = self.mixture.predict(self.processor.mixture_spectrogram(audio_path, segment))
+        if self.mixture.is_confident(probabilities):
+            return probabilities
+
+        logger.debug("Mixture model not confident (%.2f), separating", probabilities.max())
+        return None
+
+    def with_path(self, probabilities: np.ndarray, path: str) -> np.ndarray:
+        """Pack probabilities and the cascade path into one array (for the result cache)"""
+        return np.append(probabilities, np.float32(self.PATHS.index(path))).astype(np.float32)
+
+    def split_path(self, result: np.ndarray) -> tuple:
+        """
+        Inverse of with_path()
+
+        Returns:
+            Tuple (9 probabilities, "full" or "mixture")
+        """
+        return result[:-1], self.PATHS[int(result[-1])]
+
+    def spectrograms(self, audio_path: str, segment: tuple = None) -> np.ndarray:
+        """
+        First half of classify(): separation and mel spectrograms
+        (a separate pool call, so jobs can report it as its own stage)
+
+        Returns:
+            Array with shape (4, 128, 862, 1)
+        """
+        return self.processor.process(audio_path, segment)
+
+    def predict(self, spectrograms: np.ndarray) -> np.ndarray:
+        """
+        Second half of classify(): the genre model
+
+        Returns:
+            Array of 9 probabilities [0-1]
+        """
+        return self.predictor.predict(spectrograms)
+
+    def classify_waveform(self, waveform: np.ndarray, sample_rate: int, lead: float = 0.0) -> np.ndarray:
+        """
+        classify() for decoded audio, e.g. one window of a stream (full path,
+        no cascade: the mixture model reads files)
+
+        Args:
+            waveform: Array with shape (samples, channels)
+            sample_rate: Its sample rate
+            lead: Seconds of context before the analysed window
+
+        Returns:
+            Array of 9 probabilities [0-1]
+        """
+        return self.predict(self.processor.process_waveform(waveform, sample_rate, lead))
+
+    def classify_full_track(self, audio_path: str) -> dict:
+        """
+        Classify every overlapping window of a track and aggregate the results
+        Windows are predicted in batches of full_track_batch_size through one
+        reused buffer, so peak memory does not grow with track length
+
+        Args:
+            audio_path: Path to audio file
+
+        Returns:
+            Dictionary with:
+            - windows: list of {start, end, probabilities, confidence}
+            - mean_probabilities: unweighted mean over windows
+            - probabilities: confidence-weighted mean over windows
+        """
+        batch = np.empty(
+            (self.full_track_batch_size, len(self.processor.STEMS), self.processor.n_mels,
+             self.processor.target_frames, 1),
+            dtype=np.float32
+        )
+        bounds = []
+        windows = []
+
+        def flush():
+            probabilities = self.predictor.predict_batch(batch[:len(bounds)])
+            for (start, end), row in zip(bounds, probabilities):
+                windows.append({
+                    "start": start,
+                    "end": end,
+                    "probabilities": row,
+                    "confidence": self._confidence(row),
+                })
+            bounds.clear()
+
+        windows_iter = self.processor.iter_windows(
+            audio_path, self.full_track_hop_seconds, self.full_track_max_duration
+        )
+        for start, end, spectrograms in windows_iter:
+            batch[len(bounds)] = spectrograms
+            bounds.append((start, end))
+            if len(bounds) == self.full_track_batch_size:
+                flush()
+
+        if bounds:
+            flush()
+
+        if not windows:
+            raise ValueError("No audio could be decoded from the file")
+
+        logger.debug("Classified %d windows", len(windows))
+
+        return {"windows": windows, **self.aggregate(windows)}
+
+    @staticmethod
+    def _confidence(probabilities: np.ndarray) -> float:
+        """
+        1 - normalized entropy: 1 for a one-hot prediction, 0 for a uniform one
+        """
+        p = np.clip(probabilities, 1e-12, 1.0)
+        entropy = -np.sum(p * np.log(p))
+        return float(max(0.0, 1.0 - entropy / np.log(len(p))))
+
+    @staticmethod
+    def aggregate(windows: list) -> dict:
+        """
+        Track-level distributions from per-window predictions
+
+        Returns:
+            Dictionary with mean_probabilities and confidence-weighted probabilities
+        """
+        probabilities = np.stack([window["probabilities"] for window in windows])
+        weights = np.array([window["confidence"] for window in windows])
+
+        mean = probabilities.mean(axis=0)
+        if weights.sum() > 0:
+            weighted = (weights[:, np.newaxis] * probabilities).sum(axis=0) / weights.sum()
+        else:
+            weighted = mean
+
+        return {"mean_probabilities": mean, "probabilities": weighted}
+
+    @staticmethod
+    def windows_to_array(windows: list) -> np.ndarray:
+        """
+        Pack per-window results into one array (for the result cache)
+
+        Returns:
+            Array with shape (windows, 12): start, end, confidence, 9 probabilities
+        """
+        return np.array([
+            [window["start"], window["end"], window["confidence"], *window["probabilities"]]
+            for window in windows
+        ], dtype=np.float64)
+
+    @staticmethod
+    def windows_from_array(array: np.ndarray) -> list:
+        """Inverse of windows_to_array()"""
+        return [
+            {"start": float(row[0]), "end": float(row[1]), "confidence": float(row[2]),
+             "probabilities": row[3:]}
+            for row in array
+        ]
@@ -0,0 +1,285 @@
+"""
+Prediction History
+SQLite (WAL) store of every classification served, written in batches by
+a background thread so requests never wait for the disk
+"""
+
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS history (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at REAL NOT NULL,          -- Unix timestamp
+    endpoint TEXT NOT NULL,            -- classify, job or full_track
+    source TEXT NOT NULL,              -- computed, cache or history
+    file_sha256 TEXT NOT NULL,
+    filename TEXT,
+    segment_start REAL NOT NULL,       -- Seconds analysed
+    segment_end REAL NOT NULL,
+    top_genre TEXT NOT NULL,
+    top_probability REAL NOT NULL,
+    probabilities TEXT NOT NULL,       -- JSON list of 9 floats
+    model_version TEXT NOT NULL,       -- GenreClassifier.processing_signature()
+    timings TEXT NOT NULL              -- JSON {stage: seconds}
+);
+CREATE INDEX IF NOT EXISTS idx_history_created_at ON history (created_at);
+CREATE INDEX IF NOT EXISTS idx_history_top_genre ON history (top_genre, id);
+CREATE INDEX IF NOT EXISTS idx_history_file_sha256 ON history (file_sha256, id);
+"""
+
+COLUMNS = ("created_at", "endpoint", "source", "file_sha256", "filename", "segment_start",
+           "segment_end", "top_genre", "top_probability", "probabilities", "model_version", "timings")
+
+
+class HistoryStore:
+    """
+    Prediction history in one SQLite database
+
+    - WAL journal: readers never block the writer or each other
+    - record() only queues the entry; a writer thread inserts queued entries
+      in one transaction per batch_size entries or flush_interval_ms
+    - Pages are ordered newest first by id (insertion order), with the last
+      id of a page as the cursor for the next one
+    - Entries still queued are not visible to queries yet
+    """
+
+    def __init__(self, path: str, batch_size: int = 64, flush_interval_ms: float = 500,
+                 max_pending: int = 10000):
+        """
+        Args:
+            path: SQLite database file (created if missing)
+            batch_size: Most entries per write transaction
+            flush_interval_ms: Longest time an entry waits to be written
+            max_pending: Queued entries beyond which new ones are dropped
+        """
+        self.path = path
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval_ms / 1000.0
+
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._thread = None
+        self._local = threading.local()  # read connection per thread
+        self._stats_lock = threading.Lock()
+        self._counters = {"written": 0, "batches": 0, "dropped": 0, "failed": 0}
+
+    @classmethod
+    def from_env(cls):
+        """
+        Build a store from HISTORY_* environment variables
+
+        Returns:
+            HistoryStore, or None if HISTORY_DB_PATH is empty
+        """
+        path = os.getenv("HISTORY_DB_PATH")
+        if not path:
+            return None
+
+        return cls(
+            path,
+            batch_size=int(os.getenv("HISTORY_BATCH_SIZE", 64)),
+            flush_interval_ms=float(os.getenv("HISTORY_FLUSH_MS", 500)),
+            max_pending=int(os.getenv("HISTORY_MAX_PENDING", 10000))
+        )
+
+    # ---------- lifecycle ----------
+
+    def start(self):
+        """Create the schema and start the writer thread"""
+        if self._thread is not None:
+            return
+
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+
+        connection = self._connect()
+        connection.executescript(SCHEMA)
+        connection.close()
+
+        self._thread = threading.Thread(target=self._run, name="history-writer", daemon=True)
+        self._thread.start()
+        logger.info("History store %s (batch_size=%d, flush_ms=%.0f)",
+                    self.path, self.batch_size, self.flush_interval * 1000)
+
+    def stop(self):
+        """Write the queued entries and stop the writer thread"""
+        if self._thread is None:
+            return
+
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+
+    # ---------- writes ----------
+
+    def record(self, endpoint: str, source: str, file_sha256: str, filename: str,
+               segment: tuple, probabilities: list, genres: list, model_version: str,
+               timings: dict) -> bool:
+        """
+        Queue one classification for writing (never blocks)
+
+        Args:
+            endpoint: classify, job or full_track
+            source: computed, cache (result cache) or history (hash lookup)
+            file_sha256: SHA-256 of the uploaded bytes
+            filename: Client-side file name
+            segment: (start, end) seconds analysed
+            probabilities: 9 probabilities
+            genres: Genre names in probability order
+            model_version: Processing signature the result depends on
+            timings: Seconds per stage
+
+        Returns:
+            False if the queue was full and the entry was dropped
+        """
+        top = max(range(len(probabilities)), key=probabilities.__getitem__)
+        row = (
+            time.time(), endpoint, source, file_sha256, filename,
+            float(segment[0]), float(segment[1]), genres[top], float(probabilities[top]),
+            json.dumps([float(p) for p in probabilities]), model_version,
+            json.dumps({stage: round(seconds, 4) for stage, seconds in timings.items()})
+        )
+
+        try:
+            self._queue.put_nowait(row)
+            return True
+        except queue.Full:
+            with self._stats_lock:
+                self._counters["dropped"] += 1
+            logger.warning("History queue full, dropping an entry for %s", file_sha256[:12])
+            return False
+
+    def _run(self):
+        """Writer loop: collect up to batch_size entries, insert them in one transaction"""
+        connection = self._connect()
+        stopping = False
+
+        while not stopping:
+            first = self._queue.get()
+            if first is None:
+                break
+
+            batch = [first]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    row = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if row is None:
+                    stopping = True
+                    break
+                batch.append(row)
+
+            try:
+                with connection:
+                    connection.executemany(
+                        f"INSERT INTO history ({', '.join(COLUMNS)}) "
+                        f"VALUES ({', '.join('?' * len(COLUMNS))})",
+                        batch
+                    )
+                with self._stats_lock:
+                    self._counters["written"] += len(batch)
+                    self._counters["batches"] += 1
+            except sqlite3.Error as e:
+                logger.error("Could not write %d history entries: %s", len(batch), e)
+                with self._stats_lock:
+                    self._counters["failed"] += len(batch)
+
+        connection.close()
+
+    # ---------- reads ----------
+
+    def find(self, file_sha256: str, segment: tuple, model_version: str):
+        """
+        Latest result for the same file, window and model
+
+        Returns:
+            Entry dictionary (see _entry()), or None if this clip was not seen
+        """
+        row = self._reader().execute(
+            "SELECT * FROM history WHERE file_sha256 = ? AND endpoint != 'full_track' "
+            "AND segment_start = ? AND segment_end = ? AND model_version = ? "
+            "ORDER BY id DESC LIMIT 1",
+            (file_sha256, float(segment[0]), float(segment[1]), model_version)
+        ).fetchone()
+        return self._entry(row) if row else None
+
+    def get(self, entry_id: int):
+        """
+        Returns:
+            Entry dictionary, or None if there is no such entry
+        """
+        row = self._reader().execute("SELECT * FROM history WHERE id = ?", (entry_id,)).fetchone()
+        return self._entry(row) if row else None
+
+    def query(self, limit: int = 50, before: int = None, genre: str = None,
+              file_sha256: str = None, since: float = None, until: float = None) -> list:
+        """
+        One page of entries, newest first
+
+        Args:
+            limit: Entries per page
+            before: Only entries with a smaller id (the last id of the previous page)
+            genre: Only entries with this top genre
+            file_sha256: Only entries for this file
+            since, until: Only entries created in [since, until) (Unix timestamps)
+
+        Returns:
+            List of entry dictionaries
+        """
+        conditions = []
+        params = []
+        for condition, value in (("id < ?", before), ("top_genre = ?", genre),
+                                 ("file_sha256 = ?", file_sha256),
+                                 ("created_at >= ?", since), ("created_at < ?", until)):
+            if value is not None:
+                conditions.append(condition)
+                params.append(value)
+
+        where = f"WHERE {' AND '.join(conditions)} " if conditions else ""
+        rows = self._reader().execute(
+            f"SELECT * FROM history {where}ORDER BY id DESC LIMIT ?", (*params, limit)
+        ).fetchall()
+        return [self._entry(row) for row in rows]
+
+    def stats(self) -> dict:
+        """Writer counters and queue depth for /health"""
+        with self._stats_lock:
+            return {"path": self.path, "pending": self._queue.qsize(), **self._counters}
+
+    # ---------- connections ----------
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, timeout=5.0)
+        connection.execute("PRAGMA journal_mode=WAL")
+        # WAL + NORMAL: a crash may lose the last batches, never corrupts the file
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    def _reader(self) -> sqlite3.Connection:
+        """Read connection of the calling thread (sqlite3 connections are per thread)"""
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = self._connect()
+            connection.row_factory = sqlite3.Row
+            self._local.connection = connection
+        return connection
+
+    @staticmethod
+    def _entry(row: sqlite3.Row) -> dict:
+        entry = dict(row)
+        entry["probabilities"] = json.loads(entry["probabilities"])
+        entry["timings"] = json.loads(entry["timings"])
+        return entry
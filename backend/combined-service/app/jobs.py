@@ -0,0 +1,174 @@
+"""
+Classification Jobs
+Bounded in-memory store of asynchronous classification jobs with per-stage progress
+"""
+
+from collections import OrderedDict
+import logging
+import os
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+
+class JobStoreFullError(Exception):
+    """Raised when every slot holds a job that has not finished yet"""
+
+
+class Job:
+    """
+    One classification request running in the background
+
+    Status: "queued" -> "running" -> "succeeded" or "failed"
+    Each stage goes "pending" -> "running" -> "done", or "cached" when the
+    result came from the result cache, or "skipped" when the cascade did
+    not need it (the mixture stage without a cascade, separation and the
+    genre model after a confident mixture prediction)
+    """
+
+    STAGES = ("upload", "mixture", "spectrograms", "prediction")
+
+    def __init__(self, job_id: str):
+        self.id = job_id
+        self.status = "queued"
+        self.stages = {name: {"status": "pending", "seconds": None} for name in self.STAGES}
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+        self.finished_at = None
+        self.probabilities = None
+        self.path = None
+        self.error = None
+
+        self._stage_started = {}
+
+    def is_finished(self) -> bool:
+        return self.status in ("succeeded", "failed")
+
+    def run(self):
+        """Mark the job as having left the queue"""
+        self.status = "running"
+        self.updated_at = time.time()
+
+    def start_stage(self, name: str):
+        """Mark a stage as running"""
+        self.stages[name]["status"] = "running"
+        self._stage_started[name] = time.perf_counter()
+        self.updated_at = time.time()
+
+    def finish_stage(self, name: str, status: str = "done"):
+        """Mark a stage as done (or cached / skipped) and record its duration"""
+        started = self._stage_started.pop(name, None)
+        self.stages[name]["status"] = status
+        if started is not None:
+            self.stages[name]["seconds"] = round(time.perf_counter() - started, 3)
+        self.updated_at = time.time()
+
+    def succeed(self, probabilities: list, path: str = None):
+        self.probabilities = probabilities
+        self.path = path
+        self._finish("succeeded")
+
+    def fail(self, error: str):
+        # The stage that was running is where it failed
+        for stage in self.stages.values():
+            if stage["status"] == "running":
+                stage["status"] = "failed"
+        self.error = error
+        self._finish("failed")
+
+    def _finish(self, status: str):
+        self.status = status
+        self.finished_at = self.updated_at = time.time()
+
+
+class JobStore:
+    """
+    Keeps jobs by id, in creation order
+
+    Finished jobs are kept for ttl_seconds so clients can collect the result,
+    and evicted oldest-first when max_jobs is reached; unfinished jobs are
+    never evicted, so a full store rejects new jobs instead
+    """
+
+    def __init__(self, max_jobs: int = 256, ttl_seconds: float = 3600):
+        """
+        Args:
+            max_jobs: Jobs kept at once (queued, running and finished)
+            ttl_seconds: How long finished jobs stay retrievable
+        """
+        self.max_jobs = max(1, max_jobs)
+        self.ttl_seconds = ttl_seconds
+
+        self._jobs = OrderedDict()  # id -> Job
+        self._counters = {"created": 0, "rejected": 0, "expired": 0, "evicted": 0}
+
+    @classmethod
+    def from_env(cls):
+        """Build a store from JOB_MAX_JOBS / JOB_TTL_SECONDS"""
+        return cls(
+            max_jobs=int(os.getenv("JOB_MAX_JOBS", 256)),
+            ttl_seconds=float(os.getenv("JOB_TTL_SECONDS", 3600))
+        )
+
+    def create(self) -> Job:
+        """
+        Register a new queued job
+
+        Raises:
+            JobStoreFullError: If all max_jobs slots hold unfinished jobs
+        """
+        self._expire()
+
+        if len(self._jobs) >= self.max_jobs:
+            oldest_finished = next((job_id for job_id, job in self._jobs.items() if job.is_finished()), None)
+            if oldest_finished is None:
+                self._counters["rejected"] += 1
+                raise JobStoreFullError(f"{self.max_jobs} jobs are already queued or running")
+
+            del self._jobs[oldest_finished]
+            self._counters["evicted"] += 1
+
+        job = Job(uuid.uuid4().hex)
+        self._jobs[job.id] = job
+        self._counters["created"] += 1
+        return job
+
+    def get(self, job_id: str):
+        """
+        Returns:
+            Job, or None if it is unknown or expired
+        """
+        self._expire()
+        return self._jobs.get(job_id)
+
+    def discard(self, job_id: str):
+        """Forget a job that never got started (e.g. its upload was rejected)"""
+        self._jobs.pop(job_id, None)
+
+    def expires_at(self, job: Job):
+        """Time a finished job is dropped (None while it is unfinished)"""
+        return job.finished_at + self.ttl_seconds if job.finished_at is not None else None
+
+    def stats(self) -> dict:
+        """Job counts by status plus lifetime counters"""
+        self._expire()
+        by_status = {"queued": 0, "running": 0, "succeeded": 0, "failed": 0}
+        for job in self._jobs.values():
+            by_status[job.status] += 1
+
+        return {**by_status, **self._counters, "max_jobs": self.max_jobs}
+
+    def _expire(self):
+        """Drop finished jobs older than the TTL"""
+        now = time.time()
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job.finished_at is not None and now - job.finished_at > self.ttl_seconds
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+        if expired:
+            self._counters["expired"] += len(expired)
+            logger.debug("Expired %d job(s)", len(expired))
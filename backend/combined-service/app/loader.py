@@ -0,0 +1,59 @@
+"""
+Service Package Loader
+Imports the audio-service and ml-service `app` packages side by side
+"""
+
+import importlib
+import importlib.util
+from pathlib import Path
+import sys
+
+
+def load_service_package(alias: str, service_dir: str):
+    """
+    Import <service_dir>/app under a distinct package name
+
+    Both services ship a package called `app`, so they cannot be imported
+    normally in one process. Loading each under its own alias keeps their
+    relative imports working without copying any code.
+
+    Args:
+        alias: Package name to register, e.g. "audio_app"
+        service_dir: Path to the service directory containing app/
+
+    Returns:
+        The imported package module
+    """
+    if alias in sys.modules:
+        return sys.modules[alias]
+
+    package_dir = Path(service_dir).resolve() / "app"
+    init_file = package_dir / "__init__.py"
+
+    if not init_file.exists():
+        raise FileNotFoundError(f"Service package not found: {package_dir}")
+
+    spec = importlib.util.spec_from_file_location(
+        alias, init_file, submodule_search_locations=[str(package_dir)]
+    )
+    package = importlib.util.module_from_spec(spec)
+    sys.modules[alias] = package
+    spec.loader.exec_module(package)
+
+    return package
+
+
+def import_service_module(alias: str, service_dir: str, module: str):
+    """
+    Import one module of a service package, loading the package first
+
+    Args:
+        alias: Package alias (see load_service_package)
+        service_dir: Path to the service directory containing app/
+        module: Module name inside the package, e.g. "processor"
+
+    Returns:
+        The imported module
+    """
+    load_service_package(alias, service_dir)
+    return importlib.import_module(f"{alias}.{module}")
@@ -0,0 +1,45 @@
+"""
+Combined Service Metrics
+Request-level gauges; stage histograms come from the audio and ML packages
+"""
+
+from prometheus_client import Counter, Gauge
+
+
+IN_FLIGHT = Gauge(
+    "combined_requests_in_flight",
+    "Classification requests currently being processed",
+    ["endpoint"],
+    multiprocess_mode="livesum"
+)
+
+# Share of classifications that skipped separation:
+#   combined_cascade_total{path="mixture"} / sum(combined_cascade_total)
+CASCADE_PATHS = Counter(
+    "combined_cascade_total",
+    "Computed classifications by cascade path (mixture = separation skipped)",
+    ["path"]
+)
+
+HISTORY_HITS = Counter(
+    "combined_history_hits_total",
+    "Classifications answered from the prediction history instead of being computed",
+    ["endpoint"]
+)
+
+STREAM_SESSIONS = Gauge(
+    "combined_stream_sessions",
+    "Open /stream WebSocket sessions",
+    multiprocess_mode="livesum"
+)
+
+STREAM_WINDOWS = Counter(
+    "combined_stream_windows_total",
+    "Windows classified for /stream sessions"
+)
+
+# Rising steadily: streams arrive faster than the pool classifies them
+STREAM_PAUSES = Counter(
+    "combined_stream_pauses_total",
+    "Times a /stream session stopped reading because its buffer was full"
+)
@@ -0,0 +1,76 @@
+"""
+Data models for Combined Service
+"""
+
+from pydantic import BaseModel
+from typing import Dict, List, Optional
+
+
+class ClassifyResponse(BaseModel):
+    """Response model for in-process classification"""
+    probabilities: List[float]  # 9 probabilities [0-1]
+    message: str
+    # "mixture" (cascade answered without separation) or "full";
+    # None when answered from the prediction history
+    path: Optional[str] = None
+
+
+class WindowPrediction(BaseModel):
+    """Prediction for one window of a track"""
+    start: float  # Seconds from the start of the track
+    end: float
+    probabilities: List[float]  # 9 probabilities [0-1]
+    confidence: float  # 1 - normalized entropy of the probabilities
+
+
+class FullTrackResponse(BaseModel):
+    """Response model for full-track classification"""
+    probabilities: List[float]  # Confidence-weighted mean over windows
+    mean_probabilities: List[float]  # Unweighted mean over windows
+    windows: List[WindowPrediction]
+    window_seconds: float
+    hop_seconds: float
+    message: str
+
+
+class JobStage(BaseModel):
+    """Progress of one job stage"""
+    status: str  # pending, running, done, cached, skipped or failed
+    seconds: Optional[float] = None  # Duration once finished
+
+
+class JobResponse(BaseModel):
+    """State of an asynchronous classification job"""
+    id: str
+    status: str  # queued, running, succeeded or failed
+    stages: Dict[str, JobStage]  # upload, mixture, spectrograms, prediction
+    created_at: float  # Unix timestamps
+    updated_at: float
+    expires_at: Optional[float] = None  # Set once the job has finished
+    probabilities: Optional[List[float]] = None  # 9 probabilities once succeeded
+    path: Optional[str] = None  # Cascade path once succeeded, as in ClassifyResponse
+    error: Optional[str] = None
+
+
+class HistoryEntry(BaseModel):
+    """One classification served by the service"""
+    id: int
+    created_at: float  # Unix timestamp
+    endpoint: str  # classify, job or full_track
+    source: str  # computed, cache or history
+    file_sha256: str
+    filename: Optional[str] = None
+    segment_start: float  # Seconds analysed
+    segment_end: float
+    top_genre: str
+    top_probability: float
+    probabilities: List[float]  # 9 probabilities [0-1]
+    model_version: str
+    timings: Dict[str, float]  # Seconds per stage
+
+
+class HistoryPageResponse(BaseModel):
+    """One page of the prediction history, newest first"""
+    entries: List[HistoryEntry]
+    next_before: Optional[int] = None  # Pass as ?before= for the next page; None on the last page
+    message: str
@@ -0,0 +1,556 @@
+"""
+Combined Service Routes
+Defines all API endpoints for the in-process classification service using OOP approach
+"""
+
+import asyncio
+import logging
+import sqlite3
+import time
+
+import numpy as np
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Query, Response, WebSocket
+from starlette.concurrency import run_in_threadpool
+
+from .models import (
+    ClassifyResponse, FullTrackResponse, WindowPrediction, JobResponse, JobStage,
+    HistoryEntry, HistoryPageResponse
+)
+from .classifier import GenreClassifier
+from .jobs import Job, JobStore, JobStoreFullError
+from .history import HistoryStore
+from .streaming import StreamSession, StreamSettings, PCM_FORMATS
+from .services import (
+    WorkerPool, PoolSaturatedError, ResultCache, content_key,
+    UploadSpooler, UploadTooLargeError, AUDIO_STAGE_SECONDS
+)
+from .metrics import IN_FLIGHT, HISTORY_HITS, CASCADE_PATHS
+
+logger = logging.getLogger(__name__)
+
+
+class ClassificationRouter:
+    """Router class that encapsulates the classifier using OOP"""
+
+    # Wait before retrying a job step the pool rejected as saturated
+    JOB_RETRY_SECONDS = 1.0
+
+    def __init__(self, classifier: GenreClassifier, pool: WorkerPool = None,
+                 cache: ResultCache = None, spooler: UploadSpooler = None,
+                 jobs: JobStore = None, history: HistoryStore = None,
+                 skip_seen: bool = True, streams: StreamSettings = None):
+        """
+        Initialize router with classifier dependency
+
+        Args:
+            classifier: GenreClassifier holding the loaded processor and predictor
+            pool: WorkerPool that runs classification off the event loop
+                (inline on the event loop if None)
+            cache: Optional ResultCache for probabilities, keyed by upload content
+            spooler: UploadSpooler that stores uploads and enforces limits
+                (system temp dir, no limits if None)
+            jobs: JobStore for POST /jobs (default limits if None)
+            history: Optional HistoryStore every classification is recorded in
+            skip_seen: Answer clips found in the history (same file hash,
+                window and model) without classifying them again
+            streams: StreamSettings for the /stream WebSocket (no endpoint if None)
+        """
+        self.classifier = classifier
+        self.pool = pool or WorkerPool(classifier, mode="inline")
+        self.cache = cache
+        self.spooler = spooler or UploadSpooler()
+        self.jobs = jobs or JobStore()
+        self.history = history
+        self.skip_seen = skip_seen
+        self.streams = streams
+        self._open_streams = 0
+
+        # Jobs queue here for a worker instead of filling the pool's own queue,
+        # which is left to the synchronous endpoints
+        self._job_slots = asyncio.Semaphore(self.pool.workers)
+        self._job_tasks = set()
+
+        # Multipart uploads are parsed straight into the spooler's temp files
+        self.router = APIRouter(route_class=self.spooler.route_class())
+        self._setup_routes()
+
+    def _setup_routes(self):
+        """Define all routes for the combined service"""
+
+        @self.router.post("/classify", response_model=ClassifyResponse)
+        async def classify_audio(
+            audio: UploadFile = File(...),
+            segmentStart: float = Form(None),
+            segmentEnd: float = Form(None)
+        ):
+            """
+            Separate, convert and classify an audio file in one step
+
+            Args:
+                audio: Audio file (WAV, MP3)
+                segmentStart, segmentEnd: Optional window to analyse, in
+                    seconds (see the audio service's /process)
+
+            Returns:
+                ClassifyResponse with 9 genre probabilities
+            """
+            if not self.classifier.is_loaded():
+                raise HTTPException(status_code=503, detail="Model not loaded")
+
+            segment = self._segment(segmentStart, segmentEnd)
+
+            # Shed load before reading the upload
+            if self.pool.is_saturated():
+                raise self._overloaded()
+
+            started = time.perf_counter()
+            upload = await self._save_upload(audio)
+            timings = {"upload": time.perf_counter() - started}
+            IN_FLIGHT.labels("classify").inc()
+
+            try:
+                started = time.perf_counter()
+                probabilities, path, source = await self._classify_clip(
+                    "classify", upload, segment,
+                    lambda: self.pool.run("classify_cascade", upload.path, segment)
+                )
+                timings["classification"] = time.perf_counter() - started
+
+                self._record_history("classify", source, upload, audio.filename, segment,
+                                     probabilities, timings)
+
+                return ClassifyResponse(
+                    probabilities=probabilities.tolist(),
+                    message="Classification successful",
+                    path=path
+                )
+
+            except PoolSaturatedError:
+                raise self._overloaded()
+            except ValueError as e:
+                # e.g. a segment starting past the end of the audio
+                raise HTTPException(status_code=400, detail=f"Classification error: {str(e)}")
+            except Exception as e:
+                raise HTTPException(
+                    status_code=500,
+                    detail=f"Classification error: {str(e)}"
+                )
+            finally:
+                IN_FLIGHT.labels("classify").dec()
+                upload.cleanup()
+
+        @self.router.post("/classify/full-track", response_model=FullTrackResponse)
+        async def classify_full_track(audio: UploadFile = File(...)):
+            """
+            Classify a whole track as overlapping windows
+
+            Args:
+                audio: Audio file (WAV, MP3) of any length
+
+            Returns:
+                FullTrackResponse with per-window and aggregated probabilities
+            """
+            if not self.classifier.is_loaded():
+                raise HTTPException(status_code=503, detail="Model not loaded")
+
+            if self.pool.is_saturated():
+                raise self._overloaded()
+
+            # The analyzed length is capped by FULL_TRACK_MAX_DURATION instead
+            started = time.perf_counter()
+            upload = await self._save_upload(audio, check_duration=False)
+            timings = {"upload": time.perf_counter() - started}
+            IN_FLIGHT.labels("full_track").inc()
+
+            try:
+                async def compute():
+                    result = await self.pool.run("classify_full_track", upload.path)
+                    return self.classifier.windows_to_array(result["windows"])
+
+                started = time.perf_counter()
+                if self.cache is not None:
+                    key = content_key(upload.sha256, self.classifier.full_track_signature())
+                    table, cache_hit = await self.cache.get_or_compute(key, compute, resource=upload)
+                else:
+                    table, cache_hit = await compute(), False
+                timings["classification"] = time.perf_counter() - started
+
+                windows = self.classifier.windows_from_array(table)
+                summary = self.classifier.aggregate(windows)
+
+                self._record_history(
+                    "full_track", "cache" if cache_hit else "computed", upload, audio.filename,
+                    (windows[0]["start"], windows[-1]["end"]), summary["probabilities"], timings,
+                    model_version=self.classifier.full_track_signature()
+                )
+
+                return FullTrackResponse(
+                    probabilities=summary["probabilities"].tolist(),
+                    mean_probabilities=summary["mean_probabilities"].tolist(),
+                    windows=[
+                        WindowPrediction(
+                            start=window["start"],
+                            end=window["end"],
+                            probabilities=window["probabilities"].tolist(),
+                            confidence=window["confidence"]
+                        )
+                        for window in windows
+                    ],
+                    window_seconds=self.classifier.processor.window_seconds,
+                    hop_seconds=self.classifier.full_track_hop_seconds,
+                    message=f"Classified {len(windows)} windows"
+                )
+
+            except PoolSaturatedError:
+                raise self._overloaded()
+            except Exception as e:
+                raise HTTPException(
+                    status_code=500,
+                    detail=f"Classification error: {str(e)}"
+                )
+            finally:
+                IN_FLIGHT.labels("full_track").dec()
+                upload.cleanup()
+
+        @self.router.post("/jobs", response_model=JobResponse, status_code=202)
+        async def create_job(
+            response: Response,
+            audio: UploadFile = File(...),
+            segmentStart: float = Form(None),
+            segmentEnd: float = Form(None)
+        ):
+            """
+            Start classifying an audio file in the background
+
+            The job keeps running if the client disconnects; poll
+            GET /jobs/{id} for progress and the result
+
+            Args:
+                audio: Audio file (WAV, MP3)
+                segmentStart, segmentEnd: Optional window to analyse, in seconds
+
+            Returns:
+                202 with the queued job; Location points to its status
+            """
+            if not self.classifier.is_loaded():
+                raise HTTPException(status_code=503, detail="Model not loaded")
+
+            segment = self._segment(segmentStart, segmentEnd)
+
+            # Reject before reading the upload
+            try:
+                job = self.jobs.create()
+            except JobStoreFullError as e:
+                raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+
+            job.start_stage("upload")
+            try:
+                upload = await self._save_upload(audio)
+            except Exception:
+                self.jobs.discard(job.id)
+                raise
+            job.finish_stage("upload")
+
+            task = asyncio.create_task(self._run_job(job, upload, segment, audio.filename))
+            self._job_tasks.add(task)
+            task.add_done_callback(self._job_tasks.discard)
+
+            response.headers["Location"] = f"/jobs/{job.id}"
+            return self._job_response(job)
+
+        @self.router.get("/jobs/{job_id}", response_model=JobResponse)
+        async def get_job(job_id: str):
+            """
+            Status, per-stage progress and (once succeeded) probabilities of a job
+
+            Returns:
+                JobResponse; 404 if the job is unknown or its result expired
+            """
+            job = self.jobs.get(job_id)
+            if job is None:
+                raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
+
+            return self._job_response(job)
+
+        @self.router.get("/history", response_model=HistoryPageResponse)
+        async def list_history(
+            limit: int = Query(50, ge=1, le=500),
+            before: int = Query(None, description="Only entries older than this id (next_before of the previous page)"),
+            genre: str = Query(None, description="Only entries with this top genre"),
+            file_sha256: str = Query(None, description="Only entries for this file"),
+            since: float = Query(None, description="Only entries created at or after this Unix time"),
+            until: float = Query(None, description="Only entries created before this Unix time")
+        ):
+            """
+            Past classifications, newest first
+
+            Returns:
+                HistoryPageResponse; 404 if the history is disabled
+            """
+            history = self._require_history()
+            # One extra entry tells whether another page follows
+            entries = await run_in_threadpool(
+                history.query, limit + 1, before, genre, file_sha256, since, until
+            )
+            has_more = len(entries) > limit
+            entries = entries[:limit]
+
+            return HistoryPageResponse(
+                entries=[HistoryEntry(**entry) for entry in entries],
+                next_before=entries[-1]["id"] if has_more else None,
+                message=f"Found {len(entries)} entries"
+            )
+
+        @self.router.get("/history/{entry_id}", response_model=HistoryEntry)
+        async def get_history_entry(entry_id: int):
+            """
+            One past classification
+
+            Returns:
+                HistoryEntry; 404 if unknown or the history is disabled
+            """
+            entry = await run_in_threadpool(self._require_history().get, entry_id)
+            if entry is None:
+                raise HTTPException(status_code=404, detail=f"History entry not found: {entry_id}")
+
+            return HistoryEntry(**entry)
+
+        @self.router.get("/cache/stats")
+        async def cache_stats():
+            """Hit/miss/eviction counters of the result cache"""
+            if self.cache is None:
+                return {"enabled": False}
+
+            return {"enabled": True, **self.cache.stats()}
+
+        if self.streams is not None:
+            @self.router.websocket("/stream")
+            async def stream(
+                websocket: WebSocket,
+                sample_rate: int = Query(44100, ge=8000, le=192000),
+                channels: int = Query(1, ge=1, le=2),
+                format: str = Query("f32le", pattern=f"^({'|'.join(PCM_FORMATS)})$")
+            ):
+                """
+                Rolling classification of raw PCM audio (see StreamSession)
+
+                Args:
+                    sample_rate: Sample rate of the PCM chunks
+                    channels: Interleaved channels per frame (1 or 2)
+                    format: "f32le" (float32) or "s16le" (int16), little-endian
+                """
+                await websocket.accept()
+
+                if self._open_streams >= self.streams.max_sessions:
+                    await websocket.send_json({"type": "error", "detail": "Too many open streams, retry later"})
+                    await websocket.close(code=1013)
+                    return
+
+                self._open_streams += 1
+                try:
+                    session = StreamSession(
+                        websocket, self.pool, self.classifier, self.streams,
+                        sample_rate, channels, format
+                    )
+                    await session.run()
+                finally:
+                    self._open_streams -= 1
+
+    async def _run_job(self, job: Job, upload, segment: tuple, filename: str = None):
+        """
+        Classify a job's upload as one pool call per stage (mixture,
+        spectrograms, prediction), so progress is visible per stage; the
+        result is shared with /classify through the history and the cache
+        """
+        try:
+            async with self._job_slots:
+                job.run()
+                IN_FLIGHT.labels("job").inc()
+                try:
+                    probabilities, path, source = await self._classify_clip(
+                        "job", upload, segment, lambda: self._compute_job(job, upload.path, segment)
+                    )
+
+                    if source != "computed":
+                        for stage in ("mixture", "spectrograms", "prediction"):
+                            job.finish_stage(stage, "cached")
+                finally:
+                    IN_FLIGHT.labels("job").dec()
+
+            self._record_history(
+                "job", source, upload, filename, segment, probabilities,
+                {name: stage["seconds"] for name, stage in job.stages.items() if stage["seconds"] is not None}
+            )
+            job.succeed(probabilities.tolist(), path)
+            logger.debug("Job %s succeeded in %.1f s", job.id, job.finished_at - job.created_at)
+
+        except Exception as e:
+            logger.warning("Job %s failed: %s", job.id, e)
+            job.fail(f"Classification error: {str(e)}")
+        finally:
+            upload.cleanup()
+
+    async def _compute_job(self, job: Job, audio_path: str, segment: tuple):
+        """
+        Run the mixture, spectrogram and prediction stages of a job
+
+        Returns:
+            GenreClassifier.with_path() array, like classify_cascade()
+        """
+        if self.classifier.mixture is None:
+            job.finish_stage("mixture", "skipped")
+        else:
+            job.start_stage("mixture")
+            probabilities = await self._run_job_step("classify_mixture", audio_path, segment)
+            job.finish_stage("mixture")
+
+            if probabilities is not None:
+                job.finish_stage("spectrograms", "skipped")
+                job.finish_stage("prediction", "skipped")
+                return self.classifier.with_path(probabilities, "mixture")
+
+        job.start_stage("spectrograms")
+        spectrograms = await self._run_job_step("spectrograms", audio_path, segment)
+        job.finish_stage("spectrograms")
+
+        job.start_stage("prediction")
+        probabilities = await self._run_job_step("predict", spectrograms)
+        job.finish_stage("prediction")
+
+        return self.classifier.with_path(probabilities, "full")
+
+    async def _run_job_step(self, method_name: str, *args):
+        """pool.run() that waits out saturation instead of failing the job"""
+        while True:
+            try:
+                return await self.pool.run(method_name, *args)
+            except PoolSaturatedError:
+                await asyncio.sleep(self.JOB_RETRY_SECONDS)
+
+    async def _classify_clip(self, endpoint: str, upload, segment: tuple, compute) -> tuple:
+        """
+        Answer a clip from the history, else the result cache, else compute()
+
+        Args:
+            endpoint: classify or job (metric label)
+            upload: StoredUpload of the clip
+            segment: (start, end) seconds analysed
+            compute: Zero-argument coroutine function returning a
+                GenreClassifier.with_path() array
+
+        Returns:
+            Tuple (9 probabilities, cascade path or None, source: computed, cache or history)
+        """
+        probabilities = await self._lookup_history(endpoint, upload, segment)
+        if probabilities is not None:
+            return probabilities, None, "history"
+
+        if self.cache is not None:
+            # "path": entries hold the cascade path after the probabilities
+            key = content_key(upload.sha256, segment, self.classifier.processing_signature(), "path")
+            result, cache_hit = await self.cache.get_or_compute(key, compute, resource=upload)
+        else:
+            result, cache_hit = await compute(), False
+
+        probabilities, path = self.classifier.split_path(result)
+        if not cache_hit:
+            CASCADE_PATHS.labels(path).inc()
+
+        return probabilities, path, "cache" if cache_hit else "computed"
+
+    async def _lookup_history(self, endpoint: str, upload, segment: tuple):
+        """
+        Probabilities of an earlier classification of the same clip
+
+        Returns:
+            Array of 9 probabilities, or None if the clip has to be classified
+        """
+        if self.history is None or not self.skip_seen:
+            return None
+
+        try:
+            entry = await run_in_threadpool(
+                self.history.find, upload.sha256, segment, self.classifier.processing_signature()
+            )
+        except sqlite3.Error as e:
+            # The history is an optimization here; classify instead
+            logger.warning("History lookup failed: %s", e)
+            return None
+
+        if entry is None:
+            return None
+
+        HISTORY_HITS.labels(endpoint).inc()
+        logger.debug("%s: %s seen before (history entry %d)", endpoint, upload.sha256[:12], entry["id"])
+        return np.array(entry["probabilities"], dtype=np.float32)
+
+    def _record_history(self, endpoint: str, source: str, upload, filename: str,
+                        segment: tuple, probabilities, timings: dict, model_version: str = None):
+        """Queue a served classification for the history (no-op without one)"""
+        if self.history is None:
+            return
+
+        self.history.record(
+            endpoint, source, upload.sha256, filename, segment, list(probabilities),
+            self.classifier.predictor.genres,
+            model_version or self.classifier.processing_signature(), timings
+        )
+
+    def _require_history(self) -> HistoryStore:
+        """
+        Raises:
+            HTTPException: 404 if the history is disabled
+        """
+        if self.history is None:
+            raise HTTPException(status_code=404, detail="Prediction history disabled (set HISTORY_DB_PATH)")
+        return self.history
+
+    def _job_response(self, job: Job) -> JobResponse:
+        return JobResponse(
+            id=job.id,
+            status=job.status,
+            stages={name: JobStage(**stage) for name, stage in job.stages.items()},
+            created_at=job.created_at,
+            updated_at=job.updated_at,
+            expires_at=self.jobs.expires_at(job),
+            probabilities=job.probabilities,
+            path=job.path,
+            error=job.error
+        )
+
+    def _segment(self, segment_start: float, segment_end: float) -> tuple:
+        """
+        Resolve the requested analysis window
+
+        Raises:
+            HTTPException: 400 if the window is invalid
+        """
+        try:
+            return self.classifier.processor.analysis_window(segment_start, segment_end)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    async def _save_upload(self, audio: UploadFile, check_duration: bool = True):
+        """
+        Spool an upload to a unique temp file
+
+        Returns:
+            StoredUpload; the caller must cleanup() it
+
+        Raises:
+            HTTPException: 413 if the upload exceeds a limit
+        """
+        try:
+            with AUDIO_STAGE_SECONDS.labels("upload_read").time():
+                return await self.spooler.save(audio, check_duration=check_duration)
+        except UploadTooLargeError as e:
+            raise HTTPException(status_code=413, detail=str(e))
+
+    @staticmethod
+    def _overloaded() -> HTTPException:
+        """503 response telling the client to retry later"""
+        return HTTPException(
+            status_code=503,
+            detail="Combined service is at capacity, retry later",
+            headers={"Retry-After": "1"}
+        )
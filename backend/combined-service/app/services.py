@@ -0,0 +1,40 @@
+"""
+Shared Service Classes
+Re-exports the audio-service, ml-service and service_common classes used by
+the combined service
+"""
+
+import os
+from pathlib import Path
+
+from service_common.executor import WorkerPool, PoolSaturatedError
+from service_common.memory import RecyclePolicy
+from service_common.cache import ResultCache, content_key
+from service_common.lifecycle import ModelLoader, LifecycleRouter, NotReadyMiddleware
+
+from .loader import import_service_module
+
+# Default layout: backend/{audio,ml,combined}-service side by side
+_BACKEND_DIR = Path(__file__).resolve().parent.parent.parent
+
+AUDIO_SERVICE_DIR = os.getenv("AUDIO_SERVICE_DIR", str(_BACKEND_DIR / "audio-service"))
+ML_SERVICE_DIR = os.getenv("ML_SERVICE_DIR", str(_BACKEND_DIR / "ml-service"))
+
+# Audio side
+AudioProcessor = import_service_module("audio_app", AUDIO_SERVICE_DIR, "processor").AudioProcessor
+
+ThreadBudget = import_service_module("audio_app", AUDIO_SERVICE_DIR, "threads").ThreadBudget
+
+_uploads = import_service_module("audio_app", AUDIO_SERVICE_DIR, "uploads")
+UploadSpooler = _uploads.UploadSpooler
+UploadTooLargeError = _uploads.UploadTooLargeError
+RequestSizeLimitMiddleware = _uploads.RequestSizeLimitMiddleware
+
+# The worker pool reports its memory gauges as audio_worker_*
+AUDIO_METRICS = import_service_module("audio_app", AUDIO_SERVICE_DIR, "metrics")
+metrics_response = AUDIO_METRICS.metrics_response
+AUDIO_STAGE_SECONDS = AUDIO_METRICS.STAGE_SECONDS
+
+# ML side
+GenrePredictor = import_service_module("ml_app", ML_SERVICE_DIR, "predictor").GenrePredictor
+KerasEngine = import_service_module("ml_app", ML_SERVICE_DIR, "engines").KerasEngine
@@ -0,0 +1,400 @@
+"""
+Streaming Classification
+Rolling genre predictions for PCM audio sent over a WebSocket, kept in a
+bounded ring buffer and classified one model window at a time
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+
+import numpy as np
+from starlette.websockets import WebSocket, WebSocketDisconnect
+
+from .classifier import GenreClassifier
+from .services import WorkerPool, PoolSaturatedError
+from .metrics import STREAM_SESSIONS, STREAM_WINDOWS, STREAM_PAUSES
+
+logger = logging.getLogger(__name__)
+
+
+# Little-endian PCM sample formats accepted from clients
+PCM_FORMATS = {"f32le": np.dtype("<f4"), "s16le": np.dtype("<i2")}
+
+
+class StreamError(Exception):
+    """Ends a stream with a WebSocket close code (1003 bad data, 1009 too big, 1011 failure)"""
+
+    def __init__(self, code: int, detail: str):
+        super().__init__(detail)
+        self.code = code
+        self.detail = detail
+
+
+class StreamSettings:
+    """Limits shared by all streams"""
+
+    def __init__(self, hop_seconds: float, max_backlog_seconds: float = 30.0,
+                 max_chunk_seconds: float = 2.0, max_sessions: int = 4):
+        """
+        Args:
+            hop_seconds: Distance between window starts (at most one window)
+            max_backlog_seconds: Received audio allowed to wait for
+                classification beyond one window; the stream is paused above it
+            max_chunk_seconds: Longest audio accepted in one message
+            max_sessions: Streams open at once
+        """
+        if hop_seconds <= 0:
+            raise ValueError(f"STREAM_HOP_SECONDS must be > 0, got {hop_seconds}")
+
+        self.hop_seconds = hop_seconds
+        self.max_backlog_seconds = max(0.0, max_backlog_seconds)
+        self.max_chunk_seconds = max_chunk_seconds
+        self.max_sessions = max(0, max_sessions)
+
+    @classmethod
+    def from_env(cls, window_seconds: float):
+        """
+        Build settings from STREAM_* environment variables
+
+        Args:
+            window_seconds: Audio covered by one model input (the hop is capped to it)
+
+        Returns:
+            StreamSettings, or None if STREAM_MAX_SESSIONS is 0 (streaming disabled)
+        """
+        max_sessions = int(os.getenv("STREAM_MAX_SESSIONS", 4))
+        if max_sessions <= 0:
+            return None
+
+        hop_seconds = float(os.getenv("STREAM_HOP_SECONDS", window_seconds / 2))
+        return cls(
+            hop_seconds=min(hop_seconds, window_seconds),
+            max_backlog_seconds=float(os.getenv("STREAM_MAX_BACKLOG_SECONDS", 30.0)),
+            max_chunk_seconds=float(os.getenv("STREAM_MAX_CHUNK_SECONDS", 2.0)),
+            max_sessions=max_sessions
+        )
+
+
+class RingBuffer:
+    """
+    Fixed-capacity buffer of (samples, channels) audio, addressed by the
+    absolute index of a sample in the stream
+
+    Samples [start, end) are held; release() moves start forward and
+    frees their space for write().
+    """
+
+    def __init__(self, capacity: int, channels: int):
+        """
+        Args:
+            capacity: Samples held at most
+            channels: Channels per sample
+        """
+        self._data = np.zeros((capacity, channels), dtype=np.float32)
+        self.capacity = capacity
+        self.start = 0
+        self.end = 0
+
+    @property
+    def free(self) -> int:
+        """Samples that can be written"""
+        return self.capacity - (self.end - self.start)
+
+    def write(self, samples: np.ndarray):
+        """
+        Append samples with shape (n, channels)
+
+        Raises:
+            ValueError: If there is not enough free space
+        """
+        count = len(samples)
+        if count > self.free:
+            raise ValueError(f"Ring buffer full: {count} samples, {self.free} free")
+
+        position = self.end % self.capacity
+        first = min(count, self.capacity - position)
+        self._data[position:position + first] = samples[:first]
+        self._data[:count - first] = samples[first:]
+        self.end += count
+
+    def read(self, first: int, last: int) -> np.ndarray:
+        """
+        Copy of samples [first, last), which must still be held
+
+        Returns:
+            Array with shape (last - first, channels)
+        """
+        if first < self.start or last > self.end or first > last:
+            raise ValueError(f"Samples {first}-{last} not in the buffer ({self.start}-{self.end})")
+
+        indices = np.arange(first, last) % self.capacity
+        return self._data[indices]
+
+    def release(self, up_to: int):
+        """Drop samples before up_to (at most up to end)"""
+        self.start = max(self.start, min(up_to, self.end))
+
+
+class StreamSession:
+    """
+    One WebSocket stream
+
+    A receive loop writes incoming PCM chunks into a RingBuffer; a
+    processing loop classifies each complete window (window_seconds long,
+    every hop_seconds, plus segment_margin_seconds of earlier audio as
+    separation context) through the worker pool, one window at a time, and
+    sends its probabilities as soon as they are ready.
+
+    Memory per stream is bounded by the ring buffer (margin + window +
+    max_backlog_seconds + max_chunk_seconds of audio). When it cannot take
+    another chunk, the receive loop stops reading until a window has been
+    classified: the client is told with a "pause" message, and the
+    WebSocket's flow control holds back clients that keep sending.
+    """
+
+    # Wait before retrying a window the pool rejected as saturated
+    RETRY_SECONDS = 0.25
+
+    def __init__(self, websocket: WebSocket, pool: WorkerPool, classifier: GenreClassifier,
+                 settings: StreamSettings, sample_rate: int, channels: int, pcm_format: str):
+        """
+        Args:
+            websocket: Accepted WebSocket
+            pool: WorkerPool running classify_waveform
+            classifier: GenreClassifier (window sizes, genre names, aggregation)
+            settings: Limits shared by all streams
+            sample_rate, channels, pcm_format: Layout of the client's PCM chunks
+        """
+        self.websocket = websocket
+        self.pool = pool
+        self.classifier = classifier
+        self.settings = settings
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.dtype = PCM_FORMATS[pcm_format]
+
+        processor = classifier.processor
+        self.window = int(round(processor.window_seconds * sample_rate))
+        self.hop = min(self.window, int(round(settings.hop_seconds * sample_rate)))
+        self.margin = int(round(processor.segment_margin_seconds * sample_rate))
+        self.max_chunk = max(1, int(round(settings.max_chunk_seconds * sample_rate)))
+        backlog = int(round(settings.max_backlog_seconds * sample_rate))
+        self.buffer = RingBuffer(self.margin + self.window + backlog + self.max_chunk, channels)
+
+        self.next_start = 0  # first sample of the next window
+        self.windows = []
+        self.ended = False  # client sent "end"
+        self.closed = False  # stop without classifying what is left
+
+        self._audio_arrived = asyncio.Event()
+        self._space_freed = asyncio.Event()
+        self._send_lock = asyncio.Lock()
+
+    async def run(self):
+        """Serve the stream until the client ends it, disconnects or sends invalid data"""
+        STREAM_SESSIONS.inc()
+        await self._send({
+            "type": "ready",
+            "sample_rate": self.sample_rate,
+            "channels": self.channels,
+            "window_seconds": self.window / self.sample_rate,
+            "hop_seconds": self.hop / self.sample_rate,
+            "max_chunk_bytes": self.max_chunk * self.channels * self.dtype.itemsize,
+            "buffer_seconds": self.buffer.capacity / self.sample_rate,
+        })
+
+        receiver = asyncio.create_task(self._receive_loop())
+        processor = asyncio.create_task(self._process_loop())
+        try:
+            done, _ = await asyncio.wait({receiver, processor}, return_when=asyncio.FIRST_COMPLETED)
+            if processor in done:
+                processor.result()
+            receiver.result()
+
+            # "end" received: classify what is left, then summarize
+            await processor
+            await self._send(self._summary())
+            await self.websocket.close(code=1000)
+
+        except WebSocketDisconnect:
+            logger.info("Stream closed by the client after %d windows", len(self.windows))
+        except StreamError as e:
+            await self._fail(e.code, e.detail)
+        except Exception as e:
+            logger.exception("Stream failed")
+            await self._fail(1011, f"Classification error: {e}")
+        finally:
+            # Let a window already in the pool finish (keeps the pool's
+            # accounting right) instead of cancelling its task
+            self.closed = True
+            self._audio_arrived.set()
+            receiver.cancel()
+            await asyncio.gather(processor, return_exceptions=True)
+            STREAM_SESSIONS.dec()
+
+    # ---------- receiving ----------
+
+    async def _receive_loop(self):
+        """Write PCM chunks into the buffer until "end" arrives"""
+        while True:
+            if self.buffer.free < self.max_chunk:
+                await self._wait_for_space()
+
+            message = await self.websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000))
+
+            if message.get("bytes") is not None:
+                self.buffer.write(self._decode(message["bytes"]))
+                self._audio_arrived.set()
+                continue
+
+            text = (message.get("text") or "").strip()
+            if text == "end" or self._parse_control(text) == "end":
+                self.ended = True
+                self._audio_arrived.set()
+                return
+
+            raise StreamError(1003, f"Unexpected text message: {text[:100]!r} (send PCM bytes or \"end\")")
+
+    async def _wait_for_space(self):
+        """Backpressure: stop reading until a classified window frees room for a chunk"""
+        STREAM_PAUSES.inc()
+        await self._send({"type": "pause", "backlog_seconds": self._backlog_seconds()})
+
+        while self.buffer.free < self.max_chunk:
+            self._space_freed.clear()
+            await self._space_freed.wait()
+
+        await self._send({"type": "resume", "backlog_seconds": self._backlog_seconds()})
+
+    def _decode(self, data: bytes) -> np.ndarray:
+        """
+        Returns:
+            float32 array with shape (samples, channels) in [-1, 1]
+
+        Raises:
+            StreamError: If the chunk is not whole frames or is too long
+        """
+        frame_bytes = self.dtype.itemsize * self.channels
+        if len(data) % frame_bytes:
+            raise StreamError(1003, f"Chunk of {len(data)} bytes is not a whole number of "
+                                    f"{frame_bytes}-byte frames")
+
+        samples = np.frombuffer(data, dtype=self.dtype).reshape(-1, self.channels)
+        if len(samples) > self.max_chunk:
+            raise StreamError(1009, f"Chunk of {len(samples)} samples exceeds {self.max_chunk} "
+                                    f"({self.settings.max_chunk_seconds:g} s)")
+
+        if self.dtype.kind == "i":
+            return samples.astype(np.float32) / 32768.0
+        return samples
+
+    @staticmethod
+    def _parse_control(text: str):
+        """Type of a JSON control message such as {"type": "end"}, or None"""
+        try:
+            message = json.loads(text)
+        except ValueError:
+            return None
+        return message.get("type") if isinstance(message, dict) else None
+
+    # ---------- processing ----------
+
+    async def _process_loop(self):
+        """Classify each complete window, then the tail once the stream ended"""
+        while not self.closed:
+            if self.buffer.end - self.next_start >= self.window:
+                await self._classify(self.next_start + self.window)
+                self.next_start += self.hop
+                continue
+
+            if self.ended:
+                # A last, partial window, if it reaches past the previous one
+                tail = self.buffer.end - self.next_start
+                if tail > 0 and (not self.windows or tail > self.window - self.hop):
+                    await self._classify(self.buffer.end)
+                return
+
+            self._audio_arrived.clear()
+            await self._audio_arrived.wait()
+
+    async def _classify(self, last: int):
+        """Classify samples [next_start, last) and send the prediction"""
+        first = max(self.buffer.start, self.next_start - self.margin)
+        audio = self.buffer.read(first, last)
+        lead = (self.next_start - first) / self.sample_rate
+
+        # The copy is taken: free what the next window does not need as context
+        self.buffer.release(self.next_start + self.hop - self.margin)
+        self._space_freed.set()
+
+        started = time.perf_counter()
+        while True:
+            try:
+                probabilities = await self.pool.run("classify_waveform", audio, self.sample_rate, lead)
+                break
+            except PoolSaturatedError:
+                # Busy with other requests; the buffer fills up and pauses the client meanwhile
+                await asyncio.sleep(self.RETRY_SECONDS)
+        seconds = time.perf_counter() - started
+        STREAM_WINDOWS.inc()
+
+        window = {
+            "start": self.next_start / self.sample_rate,
+            "end": last / self.sample_rate,
+            "probabilities": probabilities,
+            "confidence": GenreClassifier._confidence(probabilities),
+        }
+        self.windows.append(window)
+
+        await self._send({
+            "type": "prediction",
+            "index": len(self.windows) - 1,
+            "start": window["start"],
+            "end": window["end"],
+            "probabilities": probabilities.tolist(),
+            "genre": self._top_genre(probabilities),
+            "confidence": window["confidence"],
+            "processing_seconds": round(seconds, 4),
+            "backlog_seconds": self._backlog_seconds(),
+        })
+
+    # ---------- messages ----------
+
+    def _summary(self) -> dict:
+        """Track-level result over all windows, as in full-track mode"""
+        if not self.windows:
+            return {"type": "summary", "windows": 0}
+
+        aggregated = GenreClassifier.aggregate(self.windows)
+        return {
+            "type": "summary",
+            "windows": len(self.windows),
+            "probabilities": aggregated["probabilities"].tolist(),
+            "mean_probabilities": aggregated["mean_probabilities"].tolist(),
+            "genre": self._top_genre(aggregated["probabilities"]),
+        }
+
+    def _top_genre(self, probabilities: np.ndarray) -> str:
+        return self.classifier.predictor.genres[int(np.argmax(probabilities))]
+
+    def _backlog_seconds(self) -> float:
+        """Received audio not yet classified"""
+        return round(max(0, self.buffer.end - self.next_start) / self.sample_rate, 3)
+
+    async def _send(self, message: dict):
+        # The two loops both send; one frame at a time
+        async with self._send_lock:
+            await self.websocket.send_json(message)
+
+    async def _fail(self, code: int, detail: str):
+        """Tell the client why and close (it may already be gone)"""
+        try:
+            await self._send({"type": "error", "detail": detail})
+            await self.websocket.close(code=code, reason=detail[:120])
+        except Exception:
+            pass
@@ -0,0 +1,152 @@
+"""
+============================================
+BULK CLASSIFICATION
+============================================
+Labels every audio file under a directory without the HTTP services:
+decode -> separation + mel (worker pool) -> batched genre model.
+Results are appended to a CSV; rerunning with the same --output resumes
+
+Usage:
+    python bulk.py /data/music --output labels.csv
+    python bulk.py /data/music --output labels.csv --workers 4 --batch-size 16
+    python bulk.py /data/music --output labels.csv --retry-failed
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+from dotenv import load_dotenv
+
+# Load environment variables before the service packages read them
+load_dotenv()
+
+logging.basicConfig(
+    level=os.getenv("LOG_LEVEL", "INFO").upper(),
+    format="%(asctime)s %(levelname)s [%(name)s] %(message)s"
+)
+logger = logging.getLogger("bulk")
+
+from app.services import (
+    AudioProcessor, GenrePredictor, WorkerPool, RecyclePolicy, ThreadBudget, ML_SERVICE_DIR
+)
+from app.bulk import BulkClassifier, CsvCheckpoint, AUDIO_EXTENSIONS, find_audio_files
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Classify every audio file under a directory")
+    parser.add_argument("directory", help="Directory searched recursively for audio files")
+    parser.add_argument("--output", default="bulk-results.csv",
+                        help="Results CSV; an existing one is resumed (default: bulk-results.csv)")
+    parser.add_argument("--mode", choices=WorkerPool.MODES, default="process",
+                        help="Worker pool mode for separation and mel (default: process)")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("EXECUTOR_WORKERS", os.cpu_count() or 1)),
+                        help="Files separated at once (default: EXECUTOR_WORKERS, else the CPU count)")
+    parser.add_argument("--decode-threads", type=int, default=2, help="Files decoded at once")
+    parser.add_argument("--batch-size", type=int, default=8, help="Files per genre model forward pass")
+    parser.add_argument("--queue-size", type=int, default=16, help="Files waiting between two stages")
+    parser.add_argument("--segment-start", type=float,
+                        help="Second where the analysed window starts in every file (default: 0)")
+    parser.add_argument("--extensions", nargs="+", default=list(AUDIO_EXTENSIONS),
+                        help="File extensions to classify")
+    parser.add_argument("--retry-failed", action="store_true",
+                        help="Classify files again that failed in an earlier run")
+    parser.add_argument("--report-seconds", type=float, default=30.0,
+                        help="Interval of progress lines (0 = none)")
+    parser.add_argument("--stats-output", help="Also write the final per-stage throughput to this JSON file")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+
+    if not os.path.isdir(args.directory):
+        logger.error("Not a directory: %s", args.directory)
+        return 2
+
+    extensions = tuple(ext.lower() if ext.startswith(".") else f".{ext.lower()}" for ext in args.extensions)
+    paths = find_audio_files(args.directory, extensions)
+
+    # Before Spleeter or Keras start TensorFlow, which sizes its thread pools once.
+    # Split between the pool workers this run uses, not EXECUTOR_WORKERS
+    thread_budget = ThreadBudget(
+        budget=int(os.getenv("CPU_THREAD_BUDGET", 0)),
+        stem_threads=int(os.getenv("STEM_THREADS", 1)),
+        workers=1 if args.mode == "inline" else args.workers
+    )
+    thread_budget.apply()
+
+    processor = AudioProcessor(stem_threads=thread_budget.stem_threads)
+
+    # Forked now, before the genre model is loaded: the workers only need Spleeter.
+    # No recycling: a later fork would come from this process after it loaded
+    # the genre model and ran TensorFlow inference, which is not fork-safe
+    if RecyclePolicy.from_env() is not None:
+        logger.warning("WORKER_MAX_REQUESTS / WORKER_MAX_RSS_MB are ignored by bulk.py")
+    pool = WorkerPool(processor, mode=args.mode, workers=args.workers, max_queued=0, warmup_method="warmup")
+    pool.start()
+
+    try:
+        model_path = os.getenv(
+            "KERAS_MODEL_PATH",
+            os.path.join(ML_SERVICE_DIR, "models", "genre_classifier_v4.keras")
+        )
+        predictor = GenrePredictor(model_path)
+        if not predictor.is_loaded():
+            logger.error("Model could not be loaded from %s", model_path)
+            return 1
+        predictor.warmup()
+
+        output = CsvCheckpoint(
+            args.output, predictor.genres,
+            f"{processor.processing_signature()}|{predictor.model_identity()}"
+        )
+        try:
+            succeeded, failed = output.load()
+        except ValueError as e:
+            logger.error("%s", e)
+            return 2
+
+        done = succeeded if args.retry_failed else succeeded | failed
+        todo = [path for path in paths if path not in done]
+        logger.info("%d audio files, %d already in %s, %d to classify",
+                    len(paths), len(paths) - len(todo), args.output, len(todo))
+
+        segment = (args.segment_start, None) if args.segment_start is not None else None
+        bulk = BulkClassifier(
+            processor, predictor, pool, output,
+            decode_threads=args.decode_threads, batch_size=args.batch_size,
+            queue_size=args.queue_size, segment=segment, report_seconds=args.report_seconds
+        )
+        try:
+            stats = asyncio.run(bulk.run(args.directory, todo))
+        except KeyboardInterrupt:
+            # Finished files are in the CSV; the next run continues from there
+            logger.warning("Interrupted; rerun with the same --output to resume")
+            stats = bulk.stats()
+
+        print_summary(stats)
+        if args.stats_output:
+            with open(args.stats_output, "w") as f:
+                json.dump(stats, f, indent=2)
+    finally:
+        pool.shutdown()
+
+    return 0
+
+
+def print_summary(stats: dict):
+    """Throughput of every stage; the busiest one is the bottleneck"""
+    print(f"{stats['written']}/{stats['files']} files in {stats['elapsed_seconds']:.1f} s "
+          f"({stats['files_per_second']:.2f} files/s)")
+    print(f"{'stage':<14} {'files':>7} {'failed':>7} {'files/s':>9} {'s/file':>8} {'busy':>6}")
+    for name, stage in stats["stages"].items():
+        seconds = f"{stage['seconds_per_file']:.3f}" if stage["seconds_per_file"] is not None else "-"
+        print(f"{name:<14} {stage['files']:>7} {stage['failed']:>7} {stage['files_per_second']:>9.2f} "
+              f"{seconds:>8} {stage['utilization']:>6.0%}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
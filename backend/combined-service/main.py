@@ -0,0 +1,188 @@
+"""
+============================================
+COMBINED CLASSIFICATION SERVICE
+============================================
+FastAPI service for single-node deployments
+Hosts AudioProcessor and GenrePredictor in one process:
+audio -> stems -> mel -> prediction without leaving memory
+"""
+
+from fastapi import FastAPI
+from fastapi.middleware.cors import CORSMiddleware
+import logging
+import uvicorn
+import os
+from dotenv import load_dotenv
+
+# Load environment variables before the service packages read them
+load_dotenv()
+
+# Log level switch: DEBUG adds per-request details
+logging.basicConfig(
+    level=os.getenv("LOG_LEVEL", "INFO").upper(),
+    format="%(asctime)s %(levelname)s [%(name)s] %(message)s"
+)
+logger = logging.getLogger("combined-service")
+
+from app.services import (
+    AudioProcessor, GenrePredictor, WorkerPool, ResultCache, ThreadBudget, ML_SERVICE_DIR,
+    UploadSpooler, RequestSizeLimitMiddleware,
+    ModelLoader, LifecycleRouter, NotReadyMiddleware, metrics_response, AUDIO_METRICS
+)
+from app.classifier import GenreClassifier
+from app.cascade import MixtureClassifier
+from app.jobs import JobStore
+from app.history import HistoryStore
+from app.streaming import StreamSettings
+from app.routes import ClassificationRouter
+
+app = FastAPI(
+    title="Combined Classification Service",
+    description="Audio separation, spectrograms and genre prediction in one process",
+    version="1.0.0"
+)
+
+# Upload storage and limits; oversized bodies get 413 before they are parsed
+upload_spooler = UploadSpooler.from_env()
+app.add_middleware(RequestSizeLimitMiddleware, max_bytes=upload_spooler.max_request_bytes)
+
+# Models load in the background; until then other routes answer 503
+model_loader = ModelLoader()
+app.add_middleware(NotReadyMiddleware, loader=model_loader)
+
+# CORS middleware, added last so it is the outermost one: the 400/413/503
+# answers of the middlewares above reach browsers with CORS headers too
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],  # In production, specify exact origins
+    allow_credentials=True,
+    allow_methods=["GET", "POST"],  # Only methods used by this service
+    allow_headers=["Content-Type", "Accept", "Authorization", "X-Request-ID"],  # Only necessary headers
+)
+
+# Asynchronous jobs (POST /jobs), kept for JOB_TTL_SECONDS after finishing
+job_store = JobStore.from_env()
+
+# Prediction history (HISTORY_DB_PATH), written by a background thread
+history_store = HistoryStore.from_env()
+
+# CPU threads shared by TensorFlow, BLAS and the stem pool (CPU_THREAD_BUDGET)
+thread_budget = ThreadBudget.from_env()
+
+# Global instances
+classifier = None
+classifier_pool = None
+
+
+def health_details() -> dict:
+    """Model and executor state for /health"""
+    return {
+        "model_loaded": classifier is not None and classifier.is_loaded(),
+        "executor": classifier_pool.stats() if classifier_pool is not None else None,
+        "threads": thread_budget.stats(),
+        "jobs": job_store.stats(),
+        "history": history_store.stats() if history_store is not None else None
+    }
+
+
+# /health, /ready and /metrics answer from the first second
+app.include_router(LifecycleRouter(
+    "combined-service", model_loader, details=health_details, metrics=metrics_response
+).router)
+
+
+def load_models(progress) -> ClassificationRouter:
+    """
+    Load Spleeter and the Keras model, create the worker pool (background thread)
+
+    Args:
+        progress: ModelLoader.progress callback
+
+    Returns:
+        Router for the classification endpoints
+    """
+    global classifier, classifier_pool
+
+    # Before Spleeter or Keras start TensorFlow, which sizes its thread pools once
+    thread_budget.apply()
+
+    progress("loading", "Spleeter 4stems")
+    processor = AudioProcessor(stem_threads=thread_budget.stem_threads)
+
+    # KERAS_MODEL_PATH, not MODEL_PATH: Spleeter reads MODEL_PATH for its own models
+    model_path = os.getenv(
+        "KERAS_MODEL_PATH",
+        os.path.join(ML_SERVICE_DIR, "models", "genre_classifier_v4.keras")
+    )
+    progress("loading", model_path)
+    predictor = GenrePredictor(model_path)
+    if not predictor.is_loaded():
+        # GenrePredictor logs the cause; keep /ready at 503
+        raise RuntimeError(f"Model could not be loaded from {model_path}")
+
+    # Optional cheap first stage (CASCADE_MODEL_PATH)
+    if os.getenv("CASCADE_MODEL_PATH"):
+        progress("loading", os.getenv("CASCADE_MODEL_PATH"))
+    mixture = MixtureClassifier.from_env()
+
+    classifier = GenreClassifier(processor, predictor, mixture)
+
+    # Worker pool, started by include_routes() on the event loop thread
+    classifier_pool = WorkerPool.from_env(classifier, warmup_method="warmup", metrics=AUDIO_METRICS)
+
+    return ClassificationRouter(
+        classifier, classifier_pool, ResultCache.from_env(), upload_spooler, job_store,
+        history=history_store,
+        skip_seen=os.getenv("HISTORY_SKIP_SEEN", "true").lower() == "true",
+        streams=StreamSettings.from_env(processor.window_seconds)
+    )
+
+
+async def include_routes(router: ClassificationRouter):
+    """
+    Start the worker pool and add the classification endpoints (event loop)
+
+    In process mode the workers fork here, on the event loop thread, after
+    both models are loaded
+    """
+    model_loader.progress("warming_up", "first separation and prediction")
+    await classifier_pool.start_async()
+
+    # Writer thread starts after the pool has forked
+    if history_store is not None:
+        history_store.start()
+
+    app.include_router(router.router)
+
+
+@app.on_event("startup")
+async def startup_event():
+    """Start loading the models without blocking the server"""
+    logger.info("🎼 Loading models in the background (GET /ready turns 200 when done)...")
+    model_loader.start(load_models, on_loaded=include_routes)
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Let in-flight classifications finish and stop the worker pool"""
+    if classifier_pool is not None:
+        classifier_pool.shutdown()
+
+    # Write what is still queued
+    if history_store is not None:
+        history_store.stop()
+
+
+if __name__ == "__main__":
+    port = int(os.getenv("PORT", 5003))
+    host = os.getenv("HOST", "0.0.0.0")
+
+    logger.info(f"🎼 Combined Service starting on {host}:{port}")
+
+    # Note: reload=False because of Spleeter/TensorFlow multiprocessing
+    uvicorn.run(
+        "main:app",
+        host=host,
+        port=port,
+        reload=False
+    )
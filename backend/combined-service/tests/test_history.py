@@ -0,0 +1,129 @@
+"""
+HistoryStore paging, filters and the writer queue limit
+"""
+
+import pytest
+
+from app.history import HistoryStore
+
+GENRES = ["blues", "classical", "country", "disco", "hiphop", "jazz", "metal", "pop", "rock"]
+MODEL = "model-v1"
+
+
+def probabilities(genre: str) -> list:
+    """Probabilities with genre on top"""
+    values = [0.05] * len(GENRES)
+    values[GENRES.index(genre)] = 0.6
+    return values
+
+
+def record(store, genre: str = "jazz", sha: str = "a" * 64, endpoint: str = "classify",
+           segment: tuple = (0.0, 10.0)) -> bool:
+    return store.record(endpoint, "computed", sha, "track.wav", segment, probabilities(genre),
+                        GENRES, MODEL, {"prediction": 0.1})
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = HistoryStore(str(tmp_path / "history.db"), batch_size=4, flush_interval_ms=10)
+    store.start()
+    yield store
+    store.stop()
+
+
+def flush(store):
+    """Write everything queued (queries only see written entries)"""
+    store.stop()
+    store.start()
+
+
+def test_entries_are_written_and_read_back(store):
+    record(store, genre="metal")
+    flush(store)
+
+    [entry] = store.query()
+
+    assert entry["top_genre"] == "metal"
+    assert entry["top_probability"] == pytest.approx(0.6)
+    assert entry["probabilities"] == pytest.approx(probabilities("metal"))
+    assert entry["timings"] == {"prediction": 0.1}
+    assert store.get(entry["id"]) == entry
+    assert store.stats()["written"] == 1
+
+
+def test_pages_follow_the_before_cursor(store):
+    for _ in range(7):
+        record(store)
+    flush(store)
+
+    pages = []
+    before = None
+    while True:
+        page = store.query(limit=3, before=before)
+        if not page:
+            break
+        pages.append([entry["id"] for entry in page])
+        before = page[-1]["id"]
+
+    assert pages == [[7, 6, 5], [4, 3, 2], [1]]
+
+
+def test_query_filters(store, clock):
+    record(store, genre="jazz", sha="a" * 64)
+    clock.advance(60)
+    record(store, genre="rock", sha="b" * 64)
+    clock.advance(60)
+    record(store, genre="jazz", sha="b" * 64)
+    flush(store)
+    start = clock.now - 120
+
+    def ids(**filters):
+        return [entry["id"] for entry in store.query(**filters)]
+
+    assert ids(genre="jazz") == [3, 1]
+    assert ids(file_sha256="b" * 64) == [3, 2]
+    assert ids(genre="jazz", file_sha256="b" * 64) == [3]
+    assert ids(since=start + 60) == [3, 2]
+    assert ids(until=start + 60) == [1]
+    assert ids(since=start + 60, until=start + 120) == [2]
+    assert ids(genre="blues") == []
+
+
+def test_find_returns_the_latest_clip_result(store):
+    record(store, genre="jazz")
+    record(store, genre="rock")
+    record(store, genre="pop", segment=(10.0, 20.0))
+    flush(store)
+
+    assert store.find("a" * 64, (0.0, 10.0), MODEL)["top_genre"] == "rock"
+    assert store.find("a" * 64, (10.0, 20.0), MODEL)["top_genre"] == "pop"
+    assert store.find("a" * 64, (0.0, 10.0), "model-v2") is None
+    assert store.find("b" * 64, (0.0, 10.0), MODEL) is None
+
+
+def test_find_skips_full_track_entries(store):
+    record(store, genre="metal", endpoint="full_track")
+    flush(store)
+
+    assert store.find("a" * 64, (0.0, 10.0), MODEL) is None
+
+    record(store, genre="jazz", endpoint="job")
+    flush(store)
+
+    assert store.find("a" * 64, (0.0, 10.0), MODEL)["top_genre"] == "jazz"
+
+
+def test_entries_beyond_max_pending_are_dropped(tmp_path):
+    # Not started: nothing drains the queue
+    store = HistoryStore(str(tmp_path / "history.db"), max_pending=2)
+
+    assert record(store) and record(store)
+    assert not record(store)
+    assert store.stats()["dropped"] == 1
+    assert store.stats()["pending"] == 2
+
+    # The queued entries are still written
+    store.start()
+    store.stop()
+    assert [entry["id"] for entry in store.query()] == [2, 1]
+    assert store.stats()["written"] == 2
@@ -0,0 +1,74 @@
+"""
+JobStore retention: TTL expiry and bounded eviction
+"""
+
+import pytest
+
+from app.jobs import JobStore, JobStoreFullError
+
+
+def test_finished_job_expires_after_the_ttl(clock):
+    store = JobStore(ttl_seconds=60)
+    job = store.create()
+    job.succeed([1 / 9] * 9)
+
+    clock.advance(60)
+    assert store.get(job.id) is job
+    assert store.expires_at(job) == job.finished_at + 60
+
+    clock.advance(1)
+    assert store.get(job.id) is None
+    assert store.stats()["expired"] == 1
+
+
+def test_unfinished_job_never_expires(clock):
+    store = JobStore(ttl_seconds=60)
+    job = store.create()
+    job.run()
+
+    clock.advance(3600)
+
+    assert store.get(job.id) is job
+    assert store.expires_at(job) is None
+    assert store.stats()["running"] == 1
+
+
+def test_full_store_evicts_the_oldest_finished_job(clock):
+    store = JobStore(max_jobs=3, ttl_seconds=3600)
+    first, second, third = store.create(), store.create(), store.create()
+    third.fail("undecodable")
+    second.succeed([1 / 9] * 9)
+
+    fourth = store.create()
+
+    # third finished first but second was created first: creation order decides
+    assert store.get(second.id) is None
+    assert store.get(first.id) is first
+    assert store.get(third.id) is third
+    assert store.get(fourth.id) is fourth
+    assert store.stats()["evicted"] == 1
+
+
+def test_full_store_of_unfinished_jobs_rejects_new_ones(clock):
+    store = JobStore(max_jobs=2)
+    jobs = [store.create(), store.create()]
+
+    with pytest.raises(JobStoreFullError):
+        store.create()
+    assert store.stats()["rejected"] == 1
+    assert all(store.get(job.id) is job for job in jobs)
+
+    # A slot frees up once one of them finishes
+    jobs[0].succeed([1 / 9] * 9)
+    assert store.create() is not None
+    assert store.get(jobs[0].id) is None
+
+
+def test_discarded_job_frees_its_slot():
+    store = JobStore(max_jobs=1)
+    job = store.create()
+
+    store.discard(job.id)
+
+    assert store.get(job.id) is None
+    assert store.create() is not None
@@ -0,0 +1,225 @@
+"""
+Dynamic Micro-Batching
+Groups concurrent prediction requests into a single forward pass
+"""
+
+from collections import Counter, deque
+from concurrent.futures import Future
+import logging
+import queue
+import threading
+import time
+
+import numpy as np
+
+from .predictor import GenrePredictor
+
+logger = logging.getLogger(__name__)
+
+
+class BatcherStoppedError(Exception):
+    """Raised for samples submitted to (or left in) a stopping MicroBatcher"""
+
+
+class _PendingRequest:
+    """One queued sample and the future its caller is waiting on"""
+
+    __slots__ = ("sample", "future", "enqueued_at")
+
+    def __init__(self, sample: np.ndarray):
+        self.sample = sample
+        self.future = Future()
+        self.enqueued_at = time.perf_counter()
+
+
+class MicroBatcher:
+    """
+    Collects concurrent samples into batches for GenrePredictor.predict_batch
+    (or another batch method, e.g. forward_batch)
+
+    A batch is closed when it reaches max_batch_size or when the oldest
+    sample in it has waited max_wait_ms, whichever comes first. Inference
+    runs on a dedicated thread, so callers never block the event loop.
+    """
+
+    def __init__(self, predictor: GenrePredictor, max_batch_size: int = 8,
+                 max_wait_ms: float = 10.0, stats_window: int = 1000,
+                 method: str = "predict_batch"):
+        """
+        Args:
+            predictor: GenrePredictor used for the batched forward pass
+            max_batch_size: Upper bound on samples per forward pass
+            max_wait_ms: Longest time a sample may wait for the batch to fill
+            stats_window: Number of recent requests kept for wait-time percentiles
+            method: GenrePredictor method run on each batch ("predict_batch"
+                or "forward_batch" for probabilities plus embeddings)
+        """
+        if max_batch_size < 1:
+            raise ValueError(f"max_batch_size must be >= 1, got {max_batch_size}")
+
+        self.predictor = predictor
+        self._run_batch = getattr(predictor, method)
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+
+        self._queue = queue.Queue()
+        self._thread = None
+        self._stats_lock = threading.Lock()
+        # Guards the running state, so no sample is queued behind the stop sentinel
+        self._state_lock = threading.Lock()
+        self._stopping = False
+
+        # Tuning statistics
+        self._batch_sizes = Counter()
+        self._wait_times_ms = deque(maxlen=stats_window)
+        self._requests_total = 0
+        self._batches_total = 0
+
+    def start(self):
+        """Start the batching thread"""
+        with self._state_lock:
+            if self._thread is not None:
+                return
+
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+            self._thread.start()
+        logger.info("Started (max_batch_size=%d, max_wait_ms=%.1f)",
+                    self.max_batch_size, self.max_wait * 1000)
+
+    def stop(self):
+        """
+        Stop the batching thread after the queued requests are served
+        Later submissions raise BatcherStoppedError
+        """
+        with self._state_lock:
+            if self._thread is None or self._stopping:
+                return
+            self._stopping = True
+            self._queue.put(None)
+
+        self._thread.join()
+
+        # Nothing can be queued behind the sentinel, but never leave a caller waiting
+        while True:
+            try:
+                request = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if request is not None and request.future.set_running_or_notify_cancel():
+                request.future.set_exception(BatcherStoppedError("MicroBatcher stopped"))
+
+        with self._state_lock:
+            self._thread = None
+
+    def submit(self, data) -> Future:
+        """
+        Queue one sample for prediction
+
+        Args:
+            data: List of 4 spectrograms or an array with shape (4, 128, 862, 1)
+
+        Returns:
+            Future resolving to the sample's row of the batch method's output
+            (9 probabilities with predict_batch)
+
+        Raises:
+            BatcherStoppedError: If the batcher is not running or stopping
+        """
+        # Validate here so one malformed sample cannot fail a whole batch
+        request = _PendingRequest(self.predictor.prepare_sample(data))
+
+        with self._state_lock:
+            if self._thread is None or self._stopping:
+                raise BatcherStoppedError("MicroBatcher is not running")
+            self._queue.put(request)
+
+        return request.future
+
+    def _collect_batch(self, first: _PendingRequest) -> tuple:
+        """
+        Gather requests until the batch is full or the first one times out
+
+        Returns:
+            Tuple (batch of requests, stop flag)
+        """
+        batch = [first]
+        deadline = first.enqueued_at + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if request is None:
+                return batch, True
+            batch.append(request)
+
+        return batch, False
+
+    def _run(self):
+        """Batching loop: collect, predict, fan results back out"""
+        stopping = False
+
+        while not stopping:
+            first = self._queue.get()
+            if first is None:
+                break
+
+            batch, stopping = self._collect_batch(first)
+
+            # Drop requests whose callers went away; the rest can no longer be cancelled
+            batch = [request for request in batch if request.future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+
+            self._record(batch)
+
+            try:
+                outputs = self._run_batch(np.stack([request.sample for request in batch]))
+            except Exception as e:
+                for request in batch:
+                    request.future.set_exception(e)
+                continue
+
+            for request, row in zip(batch, outputs):
+                request.future.set_result(row)
+
+    def _record(self, batch: list):
+        """Update tuning statistics for a batch about to run"""
+        now = time.perf_counter()
+
+        with self._stats_lock:
+            self._batches_total += 1
+            self._requests_total += len(batch)
+            self._batch_sizes[len(batch)] += 1
+            self._wait_times_ms.extend((now - request.enqueued_at) * 1000.0 for request in batch)
+
+    def stats(self) -> dict:
+        """
+        Snapshot of queue depth, batch-size distribution and wait times
+
+        Returns:
+            Dictionary suitable for a JSON response
+        """
+        with self._stats_lock:
+            waits = np.array(self._wait_times_ms) if self._wait_times_ms else np.zeros(1)
+
+            return {
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000.0,
+                "queue_depth": self._queue.qsize(),
+                "requests_total": self._requests_total,
+                "batches_total": self._batches_total,
+                "mean_batch_size": self._requests_total / self._batches_total if self._batches_total else 0.0,
+                "batch_size_histogram": {str(size): count for size, count in sorted(self._batch_sizes.items())},
+                "wait_ms": {
+                    "p50": float(np.percentile(waits, 50)),
+                    "p95": float(np.percentile(waits, 95)),
+                    "p99": float(np.percentile(waits, 99)),
+                    "max": float(waits.max()),
+                },
+            }
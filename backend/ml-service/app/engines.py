@@ -0,0 +1,213 @@
+"""
+Inference Engines
+Ways of running the loaded Keras model on a normalized batch
+"""
+
+import logging
+import threading
+
+import numpy as np
+import tensorflow as tf
+
+logger = logging.getLogger(__name__)
+
+
+def configure_threads(intra_op: int, inter_op: int):
+    """
+    Limit TensorFlow's thread pools (0 keeps TensorFlow's default)
+    Must run before TensorFlow executes its first operation
+
+    Args:
+        intra_op: Threads used inside one op (e.g. a convolution)
+        inter_op: Independent ops run concurrently
+    """
+    try:
+        if intra_op > 0:
+            tf.config.threading.set_intra_op_parallelism_threads(intra_op)
+        if inter_op > 0:
+            tf.config.threading.set_inter_op_parallelism_threads(inter_op)
+    except RuntimeError as e:
+        # Another component already started the TensorFlow runtime
+        logger.warning("Thread settings not applied: %s", e)
+        return
+
+    logger.info("TF threads: intra_op=%s, inter_op=%s", intra_op or "default", inter_op or "default")
+
+
+class KerasEngine:
+    """
+    Direct eager call of the model
+    No tf.data pipeline or graph function, so it also runs in worker
+    processes forked after the model was loaded
+    """
+
+    name = "eager"
+
+    def __init__(self, model: tf.keras.Model):
+        self.model = model
+
+    def __call__(self, inputs: list) -> np.ndarray:
+        """
+        Args:
+            inputs: List of 4 arrays, each with shape (N, 128, 862, 1)
+
+        Returns:
+            Array with shape (N, 9)
+        """
+        return np.asarray(self.model(inputs, training=False))
+
+
+class CompiledEngine:
+    """
+    Graph function traced once for a fixed input signature (any batch size)
+    Optionally compiled with XLA, which specializes per batch size
+    Not usable in forked worker processes (TensorFlow's graph runtime
+    is not fork-safe)
+    """
+
+    name = "compiled"
+
+    def __init__(self, model: tf.keras.Model, jit_compile: bool = False):
+        """
+        Args:
+            model: Loaded Keras model with 4 inputs
+            jit_compile: Compile the graph with XLA
+        """
+        self.model = model
+        self.jit_compile = jit_compile
+
+        # (None, 128, 862, 1) x 4: batch dimension left open, so one trace serves all sizes
+        input_signature = [
+            tf.TensorSpec((None, *model_input.shape[1:]), tf.float32)
+            for model_input in model.inputs
+        ]
+
+        self._function = tf.function(
+            self._forward,
+            input_signature=input_signature,
+            jit_compile=jit_compile
+        )
+
+    def _forward(self, *inputs):
+        return self.model(list(inputs), training=False)
+
+    def __call__(self, inputs: list) -> np.ndarray:
+        """
+        Args:
+            inputs: List of 4 arrays, each with shape (N, 128, 862, 1)
+
+        Returns:
+            Array with shape (N, 9)
+        """
+        return self._function(*inputs).numpy()
+
+
+class TFLiteEngine:
+    """
+    TFLite interpreter running a quantized conversion of the model
+    (see quantization.py); the Keras model is not needed once it is built
+    The interpreter is resized when the batch size changes and is not
+    thread-safe, so calls are serialized
+    """
+
+    name = "tflite"
+
+    def __init__(self, tflite_path: str, input_names: list, num_threads: int = 0):
+        """
+        Args:
+            tflite_path: Converted .tflite file
+            input_names: Keras input names in model.inputs order; the
+                converted signature takes its inputs by these names
+            num_threads: Interpreter threads (0 = TFLite default)
+        """
+        self.tflite_path = tflite_path
+        self.input_names = list(input_names)
+
+        self.interpreter = tf.lite.Interpreter(model_path=tflite_path, num_threads=num_threads or None)
+        self._runner = self.interpreter.get_signature_runner()
+        self._lock = threading.Lock()
+
+        signature_inputs = set(self._runner.get_input_details())
+        if signature_inputs != set(self.input_names):
+            raise ValueError(f"TFLite model inputs {sorted(signature_inputs)} do not match {self.input_names}")
+        self._output_name = next(iter(self._runner.get_output_details()))
+
+    def __call__(self, inputs: list) -> np.ndarray:
+        """
+        Args:
+            inputs: List of 4 arrays, each with shape (N, 128, 862, 1)
+
+        Returns:
+            Array with shape (N, 9)
+        """
+        feed = {
+            name: np.ascontiguousarray(array, dtype=np.float32)
+            for name, array in zip(self.input_names, inputs)
+        }
+        with self._lock:
+            return np.array(self._runner(**feed)[self._output_name])
+
+
+ENGINES = {
+    KerasEngine.name: KerasEngine,
+    CompiledEngine.name: CompiledEngine,
+}
+
+
+def embedding_variant(layer: str = None) -> str:
+    """Serving variant name of the embedding model (used in file names and cache keys)"""
+    return f"embeddings-{layer or 'penultimate'}"
+
+
+def with_embeddings(model: tf.keras.Model, layer: str = None) -> tf.keras.Model:
+    """
+    Wrap a model so its single output is [probabilities | embedding]
+    One output tensor keeps every engine, including the TFLite
+    signature, unchanged
+
+    Args:
+        model: Loaded Keras model
+        layer: Layer whose (flattened) output is the embedding
+            (default: the input of the last layer)
+
+    Returns:
+        Keras model with output shape (N, 9 + embedding_dim)
+    """
+    if layer:
+        embedding = model.get_layer(layer).output
+    else:
+        # Penultimate layer: whatever feeds the softmax
+        embedding = model.layers[-1].input
+
+    if len(embedding.shape) > 2:
+        embedding = tf.keras.layers.Flatten()(embedding)
+
+    logger.info("Embeddings: %d values from %s", int(embedding.shape[-1]),
+                layer or f"the input of {model.layers[-1].name}")
+
+    outputs = tf.keras.layers.Concatenate(name="probabilities_embedding")([model.output, embedding])
+    return tf.keras.Model(model.inputs, outputs)
+
+
+def build_engine(model: tf.keras.Model, name: str, jit_compile: bool = False):
+    """
+    Create the inference engine for a loaded model
+
+    Args:
+        model: Loaded Keras model
+        name: "eager" or "compiled" ("tflite" is built by the predictor,
+            which converts the model first)
+        jit_compile: Use XLA (compiled engine only)
+
+    Returns:
+        Callable mapping the 4 normalized inputs to probabilities
+    """
+    if name not in ENGINES:
+        raise ValueError(
+            f"Invalid INFERENCE_ENGINE: {name} (expected one of {(*ENGINES, TFLiteEngine.name)})"
+        )
+
+    if name == CompiledEngine.name:
+        return CompiledEngine(model, jit_compile=jit_compile)
+
+    return KerasEngine(model)
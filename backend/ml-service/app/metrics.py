@@ -0,0 +1,72 @@
+"""
+ML Service Metrics
+Prometheus histograms and gauges for the prediction pipeline
+"""
+
+# Imported first: it prepares (or drops) PROMETHEUS_MULTIPROC_DIR before
+# prometheus_client is imported
+from service_common.metrics import metrics_response
+from prometheus_client import Counter, Gauge, Histogram
+
+
+# Seconds; a forward pass ranges from ms (small batch) to seconds (large batch on CPU)
+STAGE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25,
+                 0.5, 1.0, 2.5, 5.0)
+
+# Pipeline stages:
+#   deserialization - decoding the .npy or JSON request body
+#   normalization   - mean/std normalization and splitting into the 4 inputs
+#   forward         - the model forward pass (one per batch)
+#   index_add       - adding a track embedding to the similarity index
+#   index_search    - a nearest-neighbour search in the similarity index
+STAGE_SECONDS = Histogram(
+    "ml_stage_seconds",
+    "Time spent in each prediction stage",
+    ["stage"],
+    buckets=STAGE_BUCKETS
+)
+
+IN_FLIGHT = Gauge(
+    "ml_requests_in_flight",
+    "Requests currently being predicted",
+    multiprocess_mode="livesum"
+)
+
+MODEL_LOADED = Gauge(
+    "ml_model_loaded",
+    "1 if the Keras model is loaded",
+    multiprocess_mode="max"
+)
+
+PARITY_AGREEMENT = Gauge(
+    "ml_parity_top1_agreement",
+    "Top-1 agreement of the quantized model with the float model at startup",
+    multiprocess_mode="max"
+)
+
+
+# Worker memory, recorded by the WorkerPool after each call (see memory.py)
+WORKER_RSS_BYTES = Gauge(
+    "ml_worker_rss_bytes",
+    "Largest current RSS among the workers",
+    multiprocess_mode="livemax"
+)
+
+WORKER_PEAK_RSS_BYTES = Gauge(
+    "ml_worker_peak_rss_bytes",
+    "Largest peak RSS among the current workers",
+    multiprocess_mode="livemax"
+)
+
+WORKER_RECYCLES = Counter(
+    "ml_worker_recycles_total",
+    "Worker process replacements, by the limit that triggered them",
+    ["reason"]
+)
+
+# Bytes; one sample is ~1.7 MB as float32, ~3.5 MB as JSON lists (estimated as float64)
+REQUEST_ARRAY_BYTES = Histogram(
+    "ml_request_array_bytes",
+    "Bytes of the arrays a worker call received and returned",
+    buckets=(2**16, 2**18, 2**20, 2**21, 2**22, 2**23, 2**24, 2**25, 2**26, 2**27, 2**28)
+)
@@ -3,7 +3,7 @@ Data models for ML Service
 """
 
 from pydantic import BaseModel
-from typing import List, Any
+from typing import List, Any, Optional
 
 
 class PredictionRequest(BaseModel):
@@ -17,3 +17,37 @@ class PredictionResponse(BaseModel):
     """Response model for prediction"""
     probabilities: List[float]  # 9 probabilities [0-1]
     message: str
+    embedding: Optional[List[float]] = None  # Penultimate-layer embedding, if requested
+    track_id: Optional[str] = None  # Id in the similarity index, if the track was indexed
+
+
+class BatchPredictionRequest(BaseModel):
+    """Request model for batch prediction"""
+    # One entry per sample, each like PredictionRequest.data
+    samples: List[List[List[List[List[float]]]]]
+
+
+class BatchPredictionItem(BaseModel):
+    """Result for one sample of a batch, in request order"""
+    index: int
+    probabilities: Optional[List[float]] = None  # 9 probabilities [0-1]
+    error: Optional[str] = None  # Set instead of probabilities if this sample was invalid
+
+
+class BatchPredictionResponse(BaseModel):
+    """Response model for batch prediction"""
+    results: List[BatchPredictionItem]
+    message: str
+
+
+class SimilarTrack(BaseModel):
+    """One neighbour of a track"""
+    track_id: str
+    score: float  # Cosine similarity of the embeddings [-1, 1]
+
+
+class SimilarityResponse(BaseModel):
+    """Response model for similar-track lookup"""
+    track_id: str
+    neighbours: List[SimilarTrack]  # Most similar first
+    message: str
@@ -4,8 +4,21 @@ Loads and runs TensorFlow/Keras model
 """
 
 import tensorflow as tf
+import gc
+import logging
 import numpy as np
 import os
+import time
+
+from .engines import (
+    configure_threads, build_engine, embedding_variant, with_embeddings, KerasEngine, TFLiteEngine
+)
+from .quantization import (
+    QUANTIZATIONS, default_tflite_path, is_up_to_date, convert_to_tflite, reference_samples, compare
+)
+from .metrics import STAGE_SECONDS, MODEL_LOADED, PARITY_AGREEMENT
+
+logger = logging.getLogger(__name__)
 
 
 class GenrePredictor:
@@ -14,36 +27,147 @@ class GenrePredictor:
     def __init__(self, model_path: str):
         self.model_path = model_path
         self.model = None
+        self.input_shape = None  # (128, 862, 1), kept when the Keras model is released
         self.mean = None
         self.std = None
+        self.engine = None
         self.genres = [
             "Blues", "Classical", "Jazz", "Metal",
             "Pop", "Rap", "Rock", "R&B", "Techno/Electronic"
         ]
 
-        # Try to load model
-        self._load_model()
+        # Inference engine: "eager" (direct model call) or "compiled" (tf.function)
+        self.engine_name = os.getenv("INFERENCE_ENGINE", "eager").lower()
+        self.jit_compile = os.getenv("XLA_JIT", "false").lower() == "true"
+        self.warmup_batch_sizes = [
+            int(size) for size in os.getenv("WARMUP_BATCH_SIZES", "1").split(",") if size.strip()
+        ]
+
+        intra_op_threads = int(os.getenv("TF_INTRA_OP_THREADS", 0))
+        inter_op_threads = int(os.getenv("TF_INTER_OP_THREADS", 0))
+
+        # Quantized TFLite engine: conversion, interpreter threads and parity gate
+        self.tflite_quantization = os.getenv("TFLITE_QUANTIZATION", "dynamic").lower()
+        if self.tflite_quantization not in QUANTIZATIONS:
+            raise ValueError(f"Invalid TFLITE_QUANTIZATION: {self.tflite_quantization}")
+        # Penultimate-layer embeddings, returned next to the probabilities
+        # (EMBEDDING_LAYER: a layer name; default: the input of the last layer)
+        self.embeddings_enabled = os.getenv("EMBEDDINGS_ENABLED", "false").lower() == "true"
+        self.embedding_layer = os.getenv("EMBEDDING_LAYER") or None
+        self.embedding_dim = None
+
+        self.tflite_path = os.getenv("TFLITE_MODEL_PATH") or default_tflite_path(
+            model_path, self.tflite_quantization,
+            embedding_variant(self.embedding_layer) if self.embeddings_enabled else None
+        )
+        self.tflite_threads = int(os.getenv("TFLITE_THREADS", 0))
+        self.parity_reference_path = os.getenv("PARITY_REFERENCE_PATH") or None
+        self.parity_min_agreement = float(os.getenv("PARITY_MIN_AGREEMENT", 0.98))
+        # The quantized model only serves after passing the gate on real spectrograms
+        if self.engine_name == TFLiteEngine.name and not self.parity_reference_path:
+            raise ValueError("INFERENCE_ENGINE=tflite needs PARITY_REFERENCE_PATH (a .npy of real spectrograms)")
 
-        # Load normalization parameters
+        # Graph functions and custom thread pools hang in workers forked after loading
+        if os.getenv("EXECUTOR_MODE", "").lower() == "process":
+            if self.engine_name == "compiled":
+                logger.warning("Compiled engine hangs in forked workers, using eager")
+                self.engine_name = "eager"
+            if intra_op_threads or inter_op_threads:
+                logger.warning("TF thread settings ignored in process mode "
+                               "(size the pool with EXECUTOR_WORKERS)")
+                intra_op_threads = inter_op_threads = 0
+            # Same for the interpreter's thread pool once the parity check ran
+            if self.engine_name == TFLiteEngine.name and self.tflite_threads != 1:
+                logger.info("TFLite uses 1 thread per worker in process mode")
+                self.tflite_threads = 1
+
+        # Thread pools must be sized before TensorFlow runs anything
+        configure_threads(intra_op=intra_op_threads, inter_op=inter_op_threads)
+
+        # Load normalization parameters (the TFLite parity check uses them)
         self._load_normalization_params()
 
+        # Try to load model
+        self._load_model()
+
     def _load_model(self):
         """Load the Keras model"""
         try:
             if not os.path.exists(self.model_path):
-                print(f"⚠️  Model file not found: {self.model_path}")
-                print("    Service will run but predictions will fail until model is provided")
+                logger.warning("Model file not found: %s", self.model_path)
+                logger.warning("Service will run but predictions will fail until model is provided")
                 return
 
-            print(f"[GenrePredictor] Loading model from: {self.model_path}")
+            logger.info("Loading model from: %s", self.model_path)
             self.model = tf.keras.models.load_model(self.model_path)
-            print(f"[GenrePredictor] ✅ Model loaded successfully")
-            print(f"[GenrePredictor] Model input shape: {self.model.input_shape}")
-            print(f"[GenrePredictor] Model output shape: {self.model.output_shape}")
+            logger.info("✅ Model loaded successfully")
+            logger.info("Model input shape: %s", self.model.input_shape)
+            logger.info("Model output shape: %s", self.model.output_shape)
+
+            self.input_shape = tuple(self.model.inputs[0].shape[1:])
+
+            serving_model = self._embedding_model() if self.embeddings_enabled else self.model
+
+            if self.engine_name == TFLiteEngine.name:
+                self.engine = self._build_tflite_engine(serving_model)
+            else:
+                self.engine = build_engine(serving_model, self.engine_name, self.jit_compile)
+            logger.info("Inference engine: %s%s", self.engine.name,
+                        " (XLA)" if self.jit_compile and self.engine.name == "compiled" else "")
+            MODEL_LOADED.set(1)
 
         except Exception as e:
-            print(f"[GenrePredictor] ❌ Error loading model: {e}")
+            logger.error("❌ Error loading model: %s", e)
             self.model = None
+            self.engine = None
+
+    def _embedding_model(self) -> tf.keras.Model:
+        """Wrap the model so its single output is [probabilities | embedding]"""
+        serving_model = with_embeddings(self.model, self.embedding_layer)
+        self.embedding_dim = int(serving_model.output_shape[-1]) - int(self.model.output_shape[-1])
+        return serving_model
+
+    def _build_tflite_engine(self, serving_model: tf.keras.Model) -> TFLiteEngine:
+        """
+        Convert the model (unless an up-to-date .tflite exists), check it
+        against the float model and release the Keras model
+
+        Args:
+            serving_model: self.model, or its embedding wrapper
+
+        Raises:
+            RuntimeError: If top-1 agreement is below PARITY_MIN_AGREEMENT
+        """
+        if is_up_to_date(self.tflite_path, self.model_path):
+            logger.info("Using converted model %s", self.tflite_path)
+        else:
+            logger.info("Converting model to TFLite (%s quantization)...", self.tflite_quantization)
+            convert_to_tflite(serving_model, self.tflite_path, self.tflite_quantization)
+
+        engine = TFLiteEngine(
+            self.tflite_path, [model_input.name for model_input in self.model.inputs], self.tflite_threads
+        )
+
+        samples = reference_samples(self.parity_reference_path)
+        batches = (self._normalize(samples[start:start + 8]) for start in range(0, len(samples), 8))
+        num_genres = len(self.genres)
+        parity = compare(KerasEngine(self.model), lambda inputs: engine(inputs)[:, :num_genres], batches)
+        PARITY_AGREEMENT.set(parity["top1_agreement"])
+
+        logger.info("Parity vs float model on %d samples: top-1 agreement %.3f, max |Δp| %.4f",
+                    parity["samples"], parity["top1_agreement"], parity["max_abs_diff"])
+        if parity["top1_agreement"] < self.parity_min_agreement:
+            raise RuntimeError(
+                f"Quantized model top-1 agreement {parity['top1_agreement']:.3f} "
+                f"is below PARITY_MIN_AGREEMENT={self.parity_min_agreement}"
+            )
+
+        # Only the interpreter serves from here on
+        self.model = None
+        tf.keras.backend.clear_session()
+        gc.collect()
+
+        return engine
 
     def _load_normalization_params(self):
         """Load mean and std for normalization"""
@@ -56,34 +180,172 @@ class GenrePredictor:
             std_path = os.path.join(normalization_dir, "std.npy")
 
             if not os.path.exists(mean_path) or not os.path.exists(std_path):
-                print(f"⚠️  Normalization files not found:")
-                print(f"    {mean_path}")
-                print(f"    {std_path}")
-                print("    Predictions will be made without normalization (may be inaccurate)")
+                logger.warning("Normalization files not found: %s, %s", mean_path, std_path)
+                logger.warning("Predictions will be made without normalization (may be inaccurate)")
                 return
 
-            print(f"[GenrePredictor] Loading normalization parameters...")
+            logger.info("Loading normalization parameters...")
             self.mean = np.load(mean_path)
             self.std = np.load(std_path)
-            print(f"[GenrePredictor] ✅ Normalization params loaded")
-            print(f"[GenrePredictor] Mean shape: {self.mean.shape}")
-            print(f"[GenrePredictor] Std shape: {self.std.shape}")
+            logger.info("✅ Normalization params loaded (mean shape %s, std shape %s)",
+                        self.mean.shape, self.std.shape)
 
         except Exception as e:
-            print(f"[GenrePredictor] ❌ Error loading normalization params: {e}")
+            logger.error("❌ Error loading normalization params: %s", e)
             self.mean = None
             self.std = None
 
+    def model_identity(self) -> str:
+        """
+        Identify the model file and normalization in use
+        Used as part of result cache keys
+
+        Returns:
+            String of model path, size and modification time (plus the
+            quantization when the TFLite engine serves) and normalization params
+        """
+        try:
+            stat = os.stat(self.model_path)
+            model_part = f"{os.path.abspath(self.model_path)}|{stat.st_size}|{stat.st_mtime_ns}"
+        except OSError:
+            model_part = os.path.abspath(self.model_path)
+
+        # Quantized outputs differ slightly from the float model's
+        if self.engine_name == TFLiteEngine.name:
+            model_part = f"{model_part}|tflite-{self.tflite_quantization}"
+
+        # Cached rows then carry the embedding too
+        if self.embeddings_enabled:
+            model_part = f"{model_part}|{embedding_variant(self.embedding_layer)}"
+
+        if self.mean is None or self.std is None:
+            return f"{model_part}|no-normalization"
+
+        return f"{model_part}|mean={self.mean.ravel().tolist()}|std={self.std.ravel().tolist()}"
+
     def is_loaded(self) -> bool:
         """Check if model is loaded"""
-        return self.model is not None
+        return self.engine is not None
+
+    def prepare_sample(self, data) -> np.ndarray:
+        """
+        Validate one sample and convert it to a float32 array
+
+        Args:
+            data: List of 4 spectrograms, each with shape (128, 862, 1),
+                or an array with shape (4, 128, 862, 1)
+
+        Returns:
+            Array with shape (4, 128, 862, 1)
+        """
+        # Validate input
+        if len(data) != 4:
+            raise ValueError(f"Expected 4 spectrograms (stems), got {len(data)}")
+
+        # No copy if already a float32 ndarray (binary wire format)
+        sample = np.asarray(data, dtype=np.float32)
+
+        if sample.ndim != 4:
+            raise ValueError(f"Expected spectrograms with shape (4, 128, 862, 1), got {sample.shape}")
+
+        return sample
+
+    def _normalize(self, batch: np.ndarray) -> list:
+        """
+        Split a batch into the 4 model inputs and apply mean/std normalization
+
+        Args:
+            batch: Array with shape (N, 4, 128, 862, 1)
+
+        Returns:
+            List of 4 contiguous arrays, each with shape (N, 128, 862, 1)
+            - [0] vocals
+            - [1] drums
+            - [2] bass
+            - [3] other
+        """
+        if self.mean is None or self.std is None:
+            return [np.ascontiguousarray(batch[:, i]) for i in range(4)]
+
+        # Mean and std have shape (1, 4, 1, 1) or (1, 4, 128, 1)
+        # Access each stem's normalization params: [0, stem_index, ...]
+        return [(batch[:, i] - self.mean[0, i]) / self.std[0, i] for i in range(4)]
+
+    def forward_batch(self, batch: np.ndarray) -> np.ndarray:
+        """
+        Run one forward pass over a batch of samples
+
+        Args:
+            batch: Array with shape (N, 4, 128, 862, 1)
+
+        Returns:
+            Array with shape (N, 9) of probabilities [0-1], or (N, 9 + embedding_dim)
+            with the embedding after the probabilities if embeddings are enabled
+            (see split_outputs())
+        """
+        if not self.is_loaded():
+            raise ValueError("Model not loaded")
+
+        with STAGE_SECONDS.labels("normalization").time():
+            inputs = self._normalize(batch)
+
+        # Make prediction with 4 separate inputs (each with shape (N, 128, 862, 1))
+        with STAGE_SECONDS.labels("forward").time():
+            outputs = self.engine(inputs)
+
+        # Validate output
+        expected = len(self.genres) + (self.embedding_dim or 0)
+        if outputs.shape[-1] != expected:
+            raise ValueError(f"Model returned {outputs.shape[-1]} values, expected {expected}")
+
+        return outputs
+
+    def predict_batch(self, batch: np.ndarray) -> np.ndarray:
+        """
+        Run one forward pass over a batch of samples
+
+        Args:
+            batch: Array with shape (N, 4, 128, 862, 1)
+
+        Returns:
+            Array with shape (N, 9) of probabilities [0-1]
+        """
+        return self.split_outputs(self.forward_batch(batch))[0]
+
+    def split_outputs(self, outputs: np.ndarray) -> tuple:
+        """
+        Separate forward_batch() / forward() rows into probabilities and embeddings
+
+        Returns:
+            Tuple (probabilities [..., 9], embeddings [..., embedding_dim] or None)
+        """
+        num_genres = len(self.genres)
+        embeddings = outputs[..., num_genres:] if self.embedding_dim else None
+        return outputs[..., :num_genres], embeddings
+
+    def warmup(self):
+        """
+        Run dummy batches so the first real request does not pay for
+        tracing, XLA compilation or lazy allocations
+        """
+        if not self.is_loaded():
+            return
+
+        for batch_size in self.warmup_batch_sizes:
+            batch = np.zeros((batch_size, 4, *self.input_shape), dtype=np.float32)
+
+            start = time.perf_counter()
+            self.predict_batch(batch)
+            logger.info("Warm-up batch of %d: %.0f ms", batch_size,
+                        (time.perf_counter() - start) * 1000)
 
     def predict(self, data: list) -> np.ndarray:
         """
         Generate prediction from preprocessed spectrograms
 
         Args:
-            data: List of 4 preprocessed spectrograms, each with shape (128, 862, 1)
+            data: List of 4 preprocessed spectrograms, each with shape (128, 862, 1),
+                or an array with shape (4, 128, 862, 1) decoded from the binary format
                 - [0] vocals
                 - [1] drums
                 - [2] bass
@@ -95,53 +357,76 @@ class GenrePredictor:
         if not self.is_loaded():
             raise ValueError("Model not loaded")
 
-        # Validate input
-        if len(data) != 4:
-            raise ValueError(f"Expected 4 spectrograms (stems), got {len(data)}")
+        sample = self.prepare_sample(data)
 
-        # Convert each stem to numpy array
-        X1 = np.array(data[0], dtype=np.float32)  # vocals
-        X2 = np.array(data[1], dtype=np.float32)  # drums
-        X3 = np.array(data[2], dtype=np.float32)  # bass
-        X4 = np.array(data[3], dtype=np.float32)  # other
-
-        print(f"[GenrePredictor] Input shapes:")
-        print(f"  X1 (vocals): {X1.shape}")
-        print(f"  X2 (drums):  {X2.shape}")
-        print(f"  X3 (bass):   {X3.shape}")
-        print(f"  X4 (other):  {X4.shape}")
-
-        # Apply normalization if parameters are loaded
-        if self.mean is not None and self.std is not None:
-            print(f"[GenrePredictor] Applying normalization (mean/std)...")
-            # Mean and std have shape (1, 4, 1, 1) or (1, 4, 128, 1)
-            # Access each stem's normalization params: [0, stem_index, ...]
-            X1 = (X1 - self.mean[0, 0]) / self.std[0, 0]  # vocals
-            X2 = (X2 - self.mean[0, 1]) / self.std[0, 1]  # drums
-            X3 = (X3 - self.mean[0, 2]) / self.std[0, 2]  # bass
-            X4 = (X4 - self.mean[0, 3]) / self.std[0, 3]  # other
-        else:
-            print(f"⚠️  [GenrePredictor] Normalization skipped (params not loaded)")
+        if self.mean is None or self.std is None:
+            logger.debug("Normalization skipped (params not loaded)")
 
-        # Add batch dimension to each: (128, 862, 1) -> (1, 128, 862, 1)
-        X1 = np.expand_dims(X1, axis=0)
-        X2 = np.expand_dims(X2, axis=0)
-        X3 = np.expand_dims(X3, axis=0)
-        X4 = np.expand_dims(X4, axis=0)
+        # Add batch dimension: (4, 128, 862, 1) -> (1, 4, 128, 862, 1)
+        probabilities = self.predict_batch(sample[np.newaxis])[0]
 
-        print(f"[GenrePredictor] Shapes after adding batch dimension:")
-        print(f"  X1: {X1.shape}, X2: {X2.shape}, X3: {X3.shape}, X4: {X4.shape}")
+        logger.debug("Predictions: %s", probabilities)
 
-        # Make prediction with 4 separate inputs (each with shape (1, 128, 862, 1))
-        predictions = self.model.predict([X1, X2, X3, X4], verbose=0)
+        return probabilities
 
-        # Get probabilities for first (and only) sample
-        probabilities = predictions[0]
+    def forward(self, data: list) -> np.ndarray:
+        """
+        predict() returning the whole output row: the 9 probabilities,
+        followed by the embedding if embeddings are enabled
 
-        print(f"[GenrePredictor] Predictions: {probabilities}")
+        Args:
+            data: As accepted by predict()
 
-        # Validate output
-        if len(probabilities) != 9:
-            raise ValueError(f"Model returned {len(probabilities)} values, expected 9")
+        Returns:
+            Array with shape (9 + embedding_dim,), see split_outputs()
+        """
+        if not self.is_loaded():
+            raise ValueError("Model not loaded")
 
-        return probabilities
+        return self.forward_batch(self.prepare_sample(data)[np.newaxis])[0]
+
+    def predict_many(self, samples) -> tuple:
+        """
+        Predict several samples with one forward pass
+        Invalid samples are reported instead of failing the whole batch
+
+        Args:
+            samples: Array with shape (N, 4, 128, 862, 1), or a list of
+                samples as accepted by predict()
+
+        Returns:
+            Tuple (probabilities, errors):
+            - probabilities: array with shape (N, 9), zeros for invalid samples
+            - errors: index -> error message for the invalid samples
+        """
+        if not self.is_loaded():
+            raise ValueError("Model not loaded")
+
+        sample_shape = (4, *self.input_shape)
+        probabilities = np.zeros((len(samples), 9), dtype=np.float32)
+
+        # Binary batches arrive as one array already; no per-sample copies
+        if isinstance(samples, np.ndarray) and samples.shape[1:] == sample_shape:
+            if len(samples):
+                probabilities[:] = self.predict_batch(samples)
+            return probabilities, {}
+
+        errors = {}
+        valid = []
+        for index, data in enumerate(samples):
+            try:
+                sample = self.prepare_sample(data)
+                if sample.shape != sample_shape:
+                    raise ValueError(f"Expected spectrograms with shape {sample_shape}, got {sample.shape}")
+                valid.append((index, sample))
+            except (ValueError, TypeError) as e:
+                errors[index] = str(e)
+
+        if valid:
+            batch = np.stack([sample for _, sample in valid])
+            for (index, _), row in zip(valid, self.predict_batch(batch)):
+                probabilities[index] = row
+
+        logger.debug("Predicted %d samples (%d invalid)", len(valid), len(errors))
+
+        return probabilities, errors
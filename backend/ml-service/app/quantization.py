@@ -0,0 +1,165 @@
+"""
+Model Quantization
+Converts the Keras model to a quantized TFLite model and checks it against
+the float model before it is allowed to serve
+
+Build-time conversion (optional, otherwise done at startup):
+    python -m app.quantization --model ./models/genre_classifier_v4.keras --quantization dynamic
+
+With --embeddings (default: EMBEDDINGS_ENABLED) it converts the embedding
+model to the file the service looks for with embeddings enabled
+"""
+
+import argparse
+import logging
+import os
+import re
+
+import numpy as np
+import tensorflow as tf
+
+from .engines import embedding_variant, with_embeddings
+
+logger = logging.getLogger(__name__)
+
+
+# dynamic: int8 weights, float activations (~4x smaller, int8 kernels)
+# float16: float16 weights, computed in float32 on CPU (~2x smaller)
+QUANTIZATIONS = ("dynamic", "float16")
+
+
+def default_tflite_path(model_path: str, quantization: str, variant: str = None) -> str:
+    """
+    models/genre_classifier_v4.keras -> models/genre_classifier_v4.dynamic.tflite
+    (or ...v4.dynamic.embeddings-dense_1.tflite for the variant "embeddings-dense_1")
+
+    The variant names the serving signature, so changing it converts a new
+    file instead of reusing one is_up_to_date() cannot tell apart
+    """
+    suffix = "." + re.sub(r"[^\w.-]", "_", variant) if variant else ""
+    return f"{os.path.splitext(model_path)[0]}.{quantization}{suffix}.tflite"
+
+
+def is_up_to_date(tflite_path: str, model_path: str) -> bool:
+    """True if tflite_path exists and was written after the Keras model"""
+    return (os.path.exists(tflite_path)
+            and os.path.getmtime(tflite_path) >= os.path.getmtime(model_path))
+
+
+def convert_to_tflite(model: tf.keras.Model, output_path: str, quantization: str) -> str:
+    """
+    Convert a Keras model to a quantized TFLite flatbuffer
+
+    Args:
+        model: Loaded Keras model
+        output_path: Where to write the .tflite file
+        quantization: "dynamic" or "float16"
+
+    Returns:
+        output_path
+    """
+    if quantization not in QUANTIZATIONS:
+        raise ValueError(f"Invalid TFLITE_QUANTIZATION: {quantization} (expected one of {QUANTIZATIONS})")
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if quantization == "float16":
+        converter.target_spec.supported_types = [tf.float16]
+
+    flatbuffer = converter.convert()
+
+    # Write-then-rename, so concurrent starts never read a partial file
+    temp_path = f"{output_path}.{os.getpid()}.tmp"
+    with open(temp_path, "wb") as f:
+        f.write(flatbuffer)
+    os.replace(temp_path, output_path)
+
+    logger.info("Wrote %s model to %s (%.1f MB)", quantization, output_path, len(flatbuffer) / 1e6)
+    return output_path
+
+
+def reference_samples(path: str) -> np.ndarray:
+    """
+    Spectrograms the parity check runs on
+
+    Args:
+        path: .npy file with shape (N, 4, 128, 862, 1) of real spectrograms
+            (e.g. saved from the audio service's /process/batch)
+
+    Returns:
+        Array with shape (N, 4, 128, 862, 1), in dB like the audio service output
+
+    Raises:
+        ValueError: If no path is given or the set is empty or misshapen
+    """
+    # Agreement on random input says nothing about real audio, so there is
+    # no synthetic fallback: without a reference set the gate stays closed
+    if not path:
+        raise ValueError("No parity reference set given")
+
+    samples = np.load(path).astype(np.float32)
+    if samples.ndim != 5 or not len(samples):
+        raise ValueError(f"Expected a reference set with shape (N, 4, 128, 862, 1), got {samples.shape}")
+    return samples
+
+
+def compare(reference, candidate, batches) -> dict:
+    """
+    Run two engines on the same normalized batches
+
+    Args:
+        reference: Float engine (e.g. KerasEngine)
+        candidate: Engine under test (e.g. TFLiteEngine)
+        batches: Iterable of normalized model inputs (lists of 4 arrays)
+
+    Returns:
+        Dictionary with top-1 agreement, maximum absolute probability
+        difference and the number of samples
+    """
+    agreeing = 0
+    total = 0
+    max_abs_diff = 0.0
+
+    for inputs in batches:
+        expected = reference(inputs)
+        actual = candidate(inputs)
+
+        agreeing += int(np.sum(expected.argmax(axis=1) == actual.argmax(axis=1)))
+        total += len(expected)
+        max_abs_diff = max(max_abs_diff, float(np.abs(expected - actual).max()))
+
+    return {
+        "top1_agreement": agreeing / total if total else 0.0,
+        "max_abs_diff": max_abs_diff,
+        "samples": total,
+    }
+
+
+def main(argv=None):
+    """Convert a model ahead of time (e.g. in a Docker build step)"""
+    parser = argparse.ArgumentParser(description="Convert the genre model to a quantized TFLite model")
+    parser.add_argument("--model", default=os.getenv("MODEL_PATH", "./models/genre_classifier_v4.keras"))
+    parser.add_argument("--quantization", choices=QUANTIZATIONS,
+                        default=os.getenv("TFLITE_QUANTIZATION", "dynamic"))
+    parser.add_argument("--embeddings", action=argparse.BooleanOptionalAction,
+                        default=os.getenv("EMBEDDINGS_ENABLED", "false").lower() == "true",
+                        help="Convert the model that also outputs embeddings")
+    parser.add_argument("--embedding-layer", default=os.getenv("EMBEDDING_LAYER") or None)
+    parser.add_argument("--output", help="Output path (default: next to the model)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s [%(name)s] %(message)s")
+
+    model = tf.keras.models.load_model(args.model)
+    variant = None
+    # Same model and file name as the predictor's, so startup finds it up to date
+    if args.embeddings:
+        model = with_embeddings(model, args.embedding_layer)
+        variant = embedding_variant(args.embedding_layer)
+
+    output_path = args.output or default_tflite_path(args.model, args.quantization, variant)
+    convert_to_tflite(model, output_path, args.quantization)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,69 +3,408 @@ ML Service Routes
 Defines all API endpoints for the ML prediction service using OOP approach
 """
 
-from fastapi import APIRouter, HTTPException
+import asyncio
+from typing import Optional
+import uuid
 
-from .models import PredictionRequest, PredictionResponse
+import numpy as np
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.exceptions import RequestValidationError
+from pydantic import ValidationError
+from starlette.concurrency import run_in_threadpool
+
+from service_common.executor import WorkerPool, PoolSaturatedError
+from service_common.cache import ResultCache, content_key
+from service_common.tensor_codec import NPY_MEDIA_TYPE, is_npy_content, decode_tensor
+from service_common.profiling import RequestProfiler, PROFILE_TOKEN_HEADER
+
+from .models import (
+    PredictionRequest, PredictionResponse,
+    BatchPredictionRequest, BatchPredictionItem, BatchPredictionResponse,
+    SimilarTrack, SimilarityResponse
+)
 from .predictor import GenrePredictor
+from .batching import MicroBatcher, BatcherStoppedError
+from .similarity import EmbeddingIndex, TRACK_ID_PATTERN
+from .metrics import STAGE_SECONDS, IN_FLIGHT
 
 
 class PredictionRouter:
     """Router class that encapsulates predictor using OOP"""
 
-    def __init__(self, predictor: GenrePredictor):
+    def __init__(self, predictor: GenrePredictor, batcher: MicroBatcher = None,
+                 pool: WorkerPool = None, cache: ResultCache = None,
+                 max_batch_samples: int = 32, index: EmbeddingIndex = None,
+                 profiler: RequestProfiler = None):
         """
         Initialize router with predictor dependency
 
         Args:
             predictor: GenrePredictor instance with loaded model
+            batcher: Optional MicroBatcher that groups concurrent requests
+                (running forward_batch)
+            pool: WorkerPool that runs unbatched predictions off the event loop
+                (inline on the event loop if None)
+            cache: Optional ResultCache for model outputs, keyed by input content
+            max_batch_samples: Most samples accepted by POST /predict/batch
+            index: Optional EmbeddingIndex that /predict adds tracks to and
+                /similar searches (requires embeddings)
+            profiler: Optional RequestProfiler selecting /predict requests to profile
         """
         self.predictor = predictor
+        self.batcher = batcher
+        self.pool = pool or WorkerPool(predictor, mode="inline")
+        self.cache = cache
+        self.max_batch_samples = max_batch_samples
+        self.index = index
+        self.profiler = profiler
         self.router = APIRouter()
         self._setup_routes()
 
     def _setup_routes(self):
         """Define all routes for the ML service"""
 
-        @self.router.get("/health")
-        async def health_check():
-            """Health check endpoint"""
-            return {
-                "status": "healthy",
-                "service": "ml-service",
-                "version": "1.0.0",
-                "model_loaded": self.predictor.is_loaded()
+        @self.router.post(
+            "/predict",
+            response_model=PredictionResponse,
+            openapi_extra={
+                "requestBody": {
+                    "content": {
+                        "application/json": {
+                            "schema": PredictionRequest.model_json_schema()
+                        },
+                        NPY_MEDIA_TYPE: {
+                            "schema": {"type": "string", "format": "binary"}
+                        }
+                    }
+                }
             }
-
-        @self.router.post("/predict", response_model=PredictionResponse)
-        async def predict_genre(request: PredictionRequest):
+        )
+        async def predict_genre(
+            request: Request,
+            embedding: bool = Query(False, description="Also return the penultimate-layer embedding"),
+            track_id: Optional[str] = Query(
+                None, pattern=TRACK_ID_PATTERN.pattern,
+                description="Id to index the track under (default: hash of the input)"
+            )
+        ):
             """
             Predict music genre from preprocessed audio data
 
+            Accepts either a JSON PredictionRequest or a binary .npy payload
+            (Content-Type: application/x-npy) with shape (4, 128, 862, 1)
+            With a similarity index, the track's embedding is indexed
+
             Args:
-                request: PredictionRequest with preprocessed data
+                request: Raw request carrying the preprocessed data
+                embedding: Include the embedding in the response (needs EMBEDDINGS_ENABLED)
+                track_id: Id in the similarity index
 
             Returns:
-                PredictionResponse with 10 genre probabilities
+                PredictionResponse with 9 genre probabilities
+            """
+            with IN_FLIGHT.track_inprogress():
+                return await self._handle_predict(request, embedding, track_id)
+
+        @self.router.post(
+            "/predict/batch",
+            response_model=BatchPredictionResponse,
+            openapi_extra={
+                "requestBody": {
+                    "content": {
+                        "application/json": {
+                            "schema": BatchPredictionRequest.model_json_schema()
+                        },
+                        NPY_MEDIA_TYPE: {
+                            "schema": {"type": "string", "format": "binary"}
+                        }
+                    }
+                }
+            }
+        )
+        async def predict_batch(request: Request):
             """
+            Predict several samples with one forward pass
+
+            Accepts either a JSON BatchPredictionRequest or a binary .npy
+            payload with shape (N, 4, 128, 862, 1); an invalid sample gets an
+            error entry instead of failing the batch
+
+            Args:
+                request: Raw request carrying the samples
+
+            Returns:
+                BatchPredictionResponse with one result per sample in request order
+            """
+            with IN_FLIGHT.track_inprogress():
+                return await self._handle_predict_batch(request)
+
+        @self.router.get("/similar/{track_id}", response_model=SimilarityResponse)
+        async def similar_tracks(track_id: str, k: int = Query(10, ge=1, le=100)):
+            """
+            Most similar previously predicted tracks, from the similarity index
+
+            Args:
+                track_id: Id returned by /predict
+                k: Number of neighbours
+
+            Returns:
+                SimilarityResponse with neighbours by cosine similarity, best first
+            """
+            if self.index is None:
+                raise HTTPException(
+                    status_code=404,
+                    detail="Similarity index disabled (set EMBEDDINGS_ENABLED and EMBEDDING_INDEX_DIR)"
+                )
+
+            query = self.index.get(track_id)
+            if query is None:
+                raise HTTPException(status_code=404, detail=f"Unknown track: {track_id}")
+
+            with STAGE_SECONDS.labels("index_search").time():
+                neighbours = (await run_in_threadpool(self.index.search, query, k, [track_id]))[0]
+
+            return SimilarityResponse(
+                track_id=track_id,
+                neighbours=[SimilarTrack(track_id=neighbour, score=score) for neighbour, score in neighbours],
+                message=f"Found {len(neighbours)} similar tracks"
+            )
+
+        @self.router.get("/cache/stats")
+        async def cache_stats():
+            """Hit/miss/eviction counters of the prediction cache"""
+            if self.cache is None:
+                return {"enabled": False}
+
+            return {"enabled": True, **self.cache.stats()}
+
+        @self.router.get("/batching/stats")
+        async def batching_stats():
+            """Queue depth, batch-size distribution and wait times of the micro-batcher"""
+            if self.batcher is None:
+                return {"enabled": False}
+
+            return {"enabled": True, **self.batcher.stats()}
+
+    async def _handle_predict(self, request: Request, return_embedding: bool = False,
+                              track_id: str = None):
+        """
+        Decode, predict (through the cache if enabled), index and build the response
+
+        Args:
+            request: Raw request carrying the preprocessed data
+            return_embedding: Include the embedding in the response
+            track_id: Id in the similarity index (default: hash of the input)
+
+        Returns:
+            PredictionResponse with 9 genre probabilities
+        """
+        try:
+            if not self.predictor.is_loaded():
+                raise HTTPException(
+                    status_code=503,
+                    detail="Model not loaded"
+                )
+
+            if return_embedding and not self.predictor.embedding_dim:
+                raise HTTPException(
+                    status_code=400,
+                    detail="Embeddings are disabled (set EMBEDDINGS_ENABLED=true)"
+                )
+
+            data = await self._read_prediction_data(request)
             try:
-                if not self.predictor.is_loaded():
-                    raise HTTPException(
-                        status_code=503,
-                        detail="Model not loaded"
-                    )
+                # e.g. a JSON body with the wrong number of stems: the client's error
+                sample = self.predictor.prepare_sample(data)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=f"Invalid prediction data: {str(e)}")
+
+            # Same X-Request-ID as the audio-service call for this upload
+            # Set by RequestIdMiddleware; apps built without it (e.g. benchmarks) get a fresh id
+            request_id = getattr(request.state, "request_id", None) or uuid.uuid4().hex
+            if self.profiler is not None and self.profiler.should_profile(
+                    request_id, request.headers.get(PROFILE_TOKEN_HEADER)):
+                profile_request_id = request_id
+            else:
+                profile_request_id = None
+
+            if self.cache is not None or self.index is not None:
+                sample_bytes = memoryview(np.ascontiguousarray(sample))
 
-                # Get predictions
-                probabilities = self.predictor.predict(request.data)
+            if self.cache is not None:
+                # Same input tensor + same model -> same outputs
+                key = content_key(str(sample.shape), sample_bytes, self.predictor.model_identity())
+                outputs, _ = await self.cache.get_or_compute(key, lambda: self._predict(sample, profile_request_id))
+            else:
+                outputs = await self._predict(sample, profile_request_id)
 
-                return PredictionResponse(
-                    probabilities=probabilities.tolist(),
-                    message="Prediction successful"
+            probabilities, embedding = self.predictor.split_outputs(outputs)
+
+            if self.index is not None:
+                track_id = track_id or content_key(str(sample.shape), sample_bytes)
+                with STAGE_SECONDS.labels("index_add").time():
+                    await run_in_threadpool(self.index.add, track_id, embedding)
+            else:
+                track_id = None
+
+            return PredictionResponse(
+                probabilities=probabilities.tolist(),
+                message="Prediction successful",
+                embedding=embedding.tolist() if return_embedding else None,
+                track_id=track_id
+            )
+
+        except (HTTPException, RequestValidationError):
+            raise
+        except PoolSaturatedError:
+            raise HTTPException(
+                status_code=503,
+                detail="ML service is at capacity, retry later",
+                headers={"Retry-After": "1"}
+            )
+        except BatcherStoppedError:
+            raise HTTPException(
+                status_code=503,
+                detail="ML service is shutting down, retry later",
+                headers={"Retry-After": "1"}
+            )
+        except Exception as e:
+            raise HTTPException(
+                status_code=500,
+                detail=f"Prediction error: {str(e)}"
+            )
+
+    async def _handle_predict_batch(self, request: Request):
+        """
+        Decode a batch, run it as one pool call and build the per-sample results
+
+        Args:
+            request: Raw request carrying the samples
+
+        Returns:
+            BatchPredictionResponse
+        """
+        try:
+            if not self.predictor.is_loaded():
+                raise HTTPException(
+                    status_code=503,
+                    detail="Model not loaded"
                 )
 
-            except HTTPException:
-                raise
-            except Exception as e:
+            samples = await self._read_batch_data(request)
+
+            if len(samples) > self.max_batch_samples:
                 raise HTTPException(
-                    status_code=500,
-                    detail=f"Prediction error: {str(e)}"
+                    status_code=413,
+                    detail=f"Too many samples: {len(samples)} (limit {self.max_batch_samples})"
                 )
+
+            # Already one batch; the micro-batcher and the cache are bypassed
+            probabilities, errors = await self.pool.run("predict_many", samples)
+
+            return BatchPredictionResponse(
+                results=[
+                    BatchPredictionItem(
+                        index=index,
+                        error=errors.get(index),
+                        probabilities=None if index in errors else row.tolist()
+                    )
+                    for index, row in enumerate(probabilities)
+                ],
+                message=f"Predicted {len(samples) - len(errors)} of {len(samples)} samples"
+            )
+
+        except (HTTPException, RequestValidationError):
+            raise
+        except PoolSaturatedError:
+            raise HTTPException(
+                status_code=503,
+                detail="ML service is at capacity, retry later",
+                headers={"Retry-After": "1"}
+            )
+        except Exception as e:
+            raise HTTPException(
+                status_code=500,
+                detail=f"Prediction error: {str(e)}"
+            )
+
+    async def _predict(self, data, profile_request_id: str = None):
+        """
+        Get the model outputs (batched with concurrent requests if enabled)
+
+        Args:
+            data: List of 4 spectrograms or an array with shape (4, 128, 862, 1)
+            profile_request_id: Request id to profile the prediction under, or
+                None; a profiled prediction bypasses the micro-batcher, whose
+                thread serves other requests too
+
+        Returns:
+            Array of 9 probabilities [0-1], followed by the embedding if
+            embeddings are enabled (see GenrePredictor.split_outputs())
+        """
+        if profile_request_id is not None:
+            return await self.profiler.run(self.pool, profile_request_id, "/predict", "forward", data)
+
+        if self.batcher is not None:
+            return await asyncio.wrap_future(self.batcher.submit(data))
+
+        return await self.pool.run("forward", data)
+
+    @staticmethod
+    async def _read_prediction_data(request: Request):
+        """
+        Decode the request body according to its Content-Type
+
+        Args:
+            request: Incoming request
+
+        Returns:
+            Array with shape (4, 128, 862, 1) for binary payloads,
+            or the nested list from a JSON PredictionRequest
+        """
+        body = await request.body()
+
+        with STAGE_SECONDS.labels("deserialization").time():
+            if is_npy_content(request.headers.get("content-type")):
+                try:
+                    return decode_tensor(body)
+                except ValueError as e:
+                    raise HTTPException(status_code=400, detail=f"Invalid tensor payload: {str(e)}")
+
+            try:
+                return PredictionRequest.model_validate_json(body).data
+            except ValidationError as e:
+                raise RequestValidationError(e.errors())
+
+    @staticmethod
+    async def _read_batch_data(request: Request):
+        """
+        Decode a batch request body according to its Content-Type
+
+        Args:
+            request: Incoming request
+
+        Returns:
+            Array with shape (N, 4, 128, 862, 1) for binary payloads,
+            or the list of samples from a JSON BatchPredictionRequest
+        """
+        body = await request.body()
+
+        with STAGE_SECONDS.labels("deserialization").time():
+            if is_npy_content(request.headers.get("content-type")):
+                try:
+                    samples = decode_tensor(body)
+                except ValueError as e:
+                    raise HTTPException(status_code=400, detail=f"Invalid tensor payload: {str(e)}")
+
+                if samples.ndim != 5:
+                    raise HTTPException(
+                        status_code=400,
+                        detail=f"Expected a batch with shape (N, 4, 128, 862, 1), got {samples.shape}"
+                    )
+                return samples
+
+            try:
+                return BatchPredictionRequest.model_validate_json(body).samples
+            except ValidationError as e:
+                raise RequestValidationError(e.errors())
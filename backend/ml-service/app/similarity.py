@@ -0,0 +1,279 @@
+"""
+Track Similarity Index
+Nearest-neighbour search over the embeddings of classified tracks, kept in
+a memory-mapped float32 matrix on disk
+"""
+
+import json
+import logging
+import os
+from pathlib import Path
+import re
+import threading
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+# Hex digests, UUIDs and similar client ids; used as file lines, so no whitespace
+TRACK_ID_PATTERN = re.compile(r"^[A-Za-z0-9._:-]{1,128}$")
+
+
+class EmbeddingIndex:
+    """
+    Exact cosine-similarity index, appended to one track at a time
+
+    Files in the index directory:
+    - vectors.f32: float32 matrix (capacity x dim), L2-normalized rows,
+      memory-mapped and grown by doubling
+    - ids.txt: one track id per row, append-only
+    - index.json: dim and the number of committed rows, rewritten
+      atomically after each add, so rows past it (an add interrupted by a
+      crash) are ignored on the next start
+
+    Search is a chunked matrix product with an argpartition top-k per
+    chunk; the page cache, not the Python heap, holds the matrix.
+    """
+
+    VECTORS_FILE = "vectors.f32"
+    IDS_FILE = "ids.txt"
+    META_FILE = "index.json"
+
+    def __init__(self, directory: str, dim: int, initial_capacity: int = 1024,
+                 search_chunk_rows: int = 65536):
+        """
+        Args:
+            directory: Where the index files live (created if missing)
+            dim: Embedding size; must match an existing index
+            initial_capacity: Rows allocated for a new index
+            search_chunk_rows: Rows scored per matrix product (bounds temporary memory)
+        """
+        self.directory = Path(directory)
+        self.dim = dim
+        self.search_chunk_rows = search_chunk_rows
+
+        self._lock = threading.Lock()
+        self._ids = []  # row -> track id
+        self._rows = {}  # track id -> row
+        self._vectors = None
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._load(max(1, initial_capacity))
+
+    @classmethod
+    def from_env(cls, dim: int):
+        """
+        Build an index from EMBEDDING_INDEX_* environment variables
+
+        Args:
+            dim: Embedding size of the loaded model
+
+        Returns:
+            EmbeddingIndex, or None if EMBEDDING_INDEX_DIR is empty
+        """
+        directory = os.getenv("EMBEDDING_INDEX_DIR")
+        if not directory:
+            return None
+
+        return cls(
+            directory,
+            dim,
+            initial_capacity=int(os.getenv("EMBEDDING_INDEX_INITIAL_CAPACITY", 1024)),
+            search_chunk_rows=int(os.getenv("EMBEDDING_INDEX_CHUNK_ROWS", 65536))
+        )
+
+    # ---------- public API ----------
+
+    def add(self, track_id: str, embedding: np.ndarray):
+        """
+        Add a track, or replace its embedding if it is already indexed
+
+        Args:
+            track_id: See TRACK_ID_PATTERN
+            embedding: Vector with shape (dim,)
+        """
+        if not TRACK_ID_PATTERN.match(track_id):
+            raise ValueError(f"Invalid track id: {track_id!r}")
+
+        vector = self._normalize(np.asarray(embedding, dtype=np.float32).reshape(1, -1))[0]
+        if vector.shape[0] != self.dim:
+            raise ValueError(f"Expected an embedding of size {self.dim}, got {vector.shape[0]}")
+
+        with self._lock:
+            row = self._rows.get(track_id)
+
+            if row is not None:
+                self._vectors[row] = vector
+                self._vectors.flush()
+                return
+
+            row = len(self._ids)
+            if row == len(self._vectors):
+                self._grow(2 * len(self._vectors))
+
+            # Vector, then id, then the count that makes both visible
+            self._vectors[row] = vector
+            self._vectors.flush()
+            with open(self.directory / self.IDS_FILE, "a") as f:
+                f.write(track_id + "\n")
+
+            self._ids.append(track_id)
+            self._rows[track_id] = row
+            self._write_meta()
+
+    def get(self, track_id: str):
+        """
+        Returns:
+            Copy of the track's normalized embedding, or None if it is not indexed
+        """
+        with self._lock:
+            row = self._rows.get(track_id)
+            return None if row is None else np.array(self._vectors[row])
+
+    def __contains__(self, track_id: str) -> bool:
+        return track_id in self._rows
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def search(self, queries: np.ndarray, k: int = 10, exclude: list = None) -> list:
+        """
+        Find the k most similar indexed tracks for each query
+
+        Args:
+            queries: Array with shape (Q, dim), or (dim,) for one query
+            k: Neighbours per query
+            exclude: Optional track id per query left out of its results
+                (e.g. the query track itself)
+
+        Returns:
+            One list per query of (track_id, cosine similarity), best first
+        """
+        queries = self._normalize(np.atleast_2d(np.asarray(queries, dtype=np.float32)))
+        if queries.shape[1] != self.dim:
+            raise ValueError(f"Expected queries of size {self.dim}, got {queries.shape[1]}")
+
+        exclude = exclude or [None] * len(queries)
+
+        with self._lock:
+            count = len(self._ids)
+            # One spare candidate per query for its excluded row
+            wanted = min(k + 1, count)
+            if wanted == 0:
+                return [[] for _ in queries]
+
+            best_scores = np.full((len(queries), 0), -np.inf, dtype=np.float32)
+            best_rows = np.zeros((len(queries), 0), dtype=np.int64)
+
+            for start in range(0, count, self.search_chunk_rows):
+                chunk = self._vectors[start:min(start + self.search_chunk_rows, count)]
+                # (Q, dim) x (dim, rows) -> (Q, rows)
+                scores = queries @ chunk.T
+
+                if scores.shape[1] > wanted:
+                    top = np.argpartition(scores, -wanted, axis=1)[:, -wanted:]
+                else:
+                    top = np.broadcast_to(np.arange(scores.shape[1]), scores.shape)
+
+                # Merge with the best rows of the previous chunks
+                best_scores = np.concatenate([best_scores, np.take_along_axis(scores, top, axis=1)], axis=1)
+                best_rows = np.concatenate([best_rows, top + start], axis=1)
+                if best_scores.shape[1] > wanted:
+                    keep = np.argpartition(best_scores, -wanted, axis=1)[:, -wanted:]
+                    best_scores = np.take_along_axis(best_scores, keep, axis=1)
+                    best_rows = np.take_along_axis(best_rows, keep, axis=1)
+
+            ids = self._ids
+
+        results = []
+        for scores, rows, excluded in zip(best_scores, best_rows, exclude):
+            order = np.argsort(-scores)
+            # Rounding can put a track's similarity with itself just above 1
+            neighbours = [(ids[rows[i]], float(np.clip(scores[i], -1.0, 1.0)))
+                          for i in order if ids[rows[i]] != excluded]
+            results.append(neighbours[:k])
+
+        return results
+
+    def stats(self) -> dict:
+        """Size of the index for /health"""
+        with self._lock:
+            return {
+                "directory": str(self.directory),
+                "dim": self.dim,
+                "tracks": len(self._ids),
+                "capacity": len(self._vectors),
+                "bytes": len(self._vectors) * self.dim * 4,
+            }
+
+    def close(self):
+        """Flush and unmap the matrix"""
+        with self._lock:
+            if self._vectors is not None:
+                self._vectors.flush()
+                self._vectors = None
+
+    # ---------- storage ----------
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        """L2-normalize rows, so a dot product is the cosine similarity"""
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+    def _load(self, initial_capacity: int):
+        """Open an existing index or create an empty one"""
+        meta_path = self.directory / self.META_FILE
+        vectors_path = self.directory / self.VECTORS_FILE
+        ids_path = self.directory / self.IDS_FILE
+
+        count = 0
+        if meta_path.exists():
+            meta = json.loads(meta_path.read_text())
+            if meta["dim"] != self.dim:
+                raise ValueError(
+                    f"Index in {self.directory} has dim {meta['dim']}, the model produces {self.dim}; "
+                    "use another EMBEDDING_INDEX_DIR"
+                )
+            count = meta["count"]
+
+        ids = ids_path.read_text().splitlines()[:count] if ids_path.exists() else []
+        if len(ids) < count:
+            raise ValueError(f"Index in {self.directory} is damaged: {count} rows but {len(ids)} ids")
+
+        # Drop ids an interrupted add wrote past the committed count
+        ids_path.write_text("".join(track_id + "\n" for track_id in ids))
+
+        capacity = vectors_path.stat().st_size // (self.dim * 4) if vectors_path.exists() else 0
+        if capacity < max(count, 1):
+            self._resize_file(vectors_path, max(initial_capacity, count))
+            capacity = max(initial_capacity, count)
+
+        self._vectors = np.memmap(vectors_path, dtype=np.float32, mode="r+", shape=(capacity, self.dim))
+        self._ids = ids
+        self._rows = {track_id: row for row, track_id in enumerate(ids)}
+        self._write_meta()
+
+        logger.info("Embedding index %s: %d tracks (dim %d, capacity %d)",
+                    self.directory, count, self.dim, capacity)
+
+    def _resize_file(self, path: Path, rows: int):
+        """Extend the vectors file to rows rows (sparse until written)"""
+        with open(path, "ab") as f:
+            f.truncate(rows * self.dim * 4)
+
+    def _grow(self, rows: int):
+        """Double the matrix (lock held)"""
+        self._vectors.flush()
+        path = self.directory / self.VECTORS_FILE
+        self._resize_file(path, rows)
+        self._vectors = np.memmap(path, dtype=np.float32, mode="r+", shape=(rows, self.dim))
+        logger.info("Embedding index grown to %d rows", rows)
+
+    def _write_meta(self):
+        """Commit the row count (write-then-rename, lock held)"""
+        meta_path = self.directory / self.META_FILE
+        temp_path = meta_path.with_suffix(f".{os.getpid()}.tmp")
+        temp_path.write_text(json.dumps({"dim": self.dim, "count": len(self._ids)}))
+        os.replace(temp_path, meta_path)
@@ -8,15 +8,31 @@ Loads Keras model and generates predictions
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+import logging
 import uvicorn
 import os
 from dotenv import load_dotenv
 
+# Load environment variables (before app modules read them)
+load_dotenv()
+
+# Log level switch: DEBUG adds per-request details (e.g. probabilities)
+logging.basicConfig(
+    level=os.getenv("LOG_LEVEL", "INFO").upper(),
+    format="%(asctime)s %(levelname)s [%(name)s] %(message)s"
+)
+logger = logging.getLogger("ml-service")
+
 from app.predictor import GenrePredictor
+from app.batching import MicroBatcher
+from app.similarity import EmbeddingIndex
+from app import metrics
 from app.routes import PredictionRouter
-
-# Load environment variables
-load_dotenv()
+# service_common is importable once the app package is (see app/__init__.py)
+from service_common.executor import WorkerPool
+from service_common.cache import ResultCache
+from service_common.lifecycle import ModelLoader, LifecycleRouter, NotReadyMiddleware
+from service_common.profiling import RequestProfiler, RequestIdMiddleware, ProfilesRouter
 
 app = FastAPI(
     title="ML Prediction Service",
@@ -24,31 +40,137 @@ app = FastAPI(
     version="1.0.0"
 )
 
-# CORS middleware
+# The model loads in the background; until then other routes answer 503
+model_loader = ModelLoader()
+app.add_middleware(NotReadyMiddleware, loader=model_loader)
+
+# Request ids (X-Request-ID, set by the gateway) and opt-in profiling
+# (None unless PROFILE_DIR is set)
+app.add_middleware(RequestIdMiddleware)
+request_profiler = RequestProfiler.from_env("ml-service")
+if request_profiler is not None:
+    app.include_router(ProfilesRouter(request_profiler).router)
+
+# CORS middleware, added last so it is the outermost one: the 503 answers
+# of the not-ready middleware reach browsers with CORS headers too
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # In production, specify exact origins
     allow_credentials=True,
     allow_methods=["GET", "POST"],  # Only methods used by this service
-    allow_headers=["Content-Type", "Accept", "Authorization"],  # Only necessary headers
+    allow_headers=["Content-Type", "Accept", "Authorization", "X-Request-ID", "X-Profile-Token"],
+    expose_headers=["X-Request-ID"],
 )
 
-# Initialize predictor
 model_path = os.getenv("MODEL_PATH", "./models/genre_classifier_v4.keras")
-predictor = GenrePredictor(model_path)
 
-# Initialize router with predictor (Dependency Injection via constructor)
-prediction_router = PredictionRouter(predictor)
+predictor = None
+batcher = None
+prediction_pool = None
+similarity_index = None
+prediction_router = None
+
+
+def health_details() -> dict:
+    """Model and executor state for /health"""
+    return {
+        "model_loaded": predictor is not None and predictor.is_loaded(),
+        "executor": prediction_pool.stats() if prediction_pool is not None else None,
+        "similarity_index": similarity_index.stats() if similarity_index is not None else None,
+        "profiling": request_profiler.stats() if request_profiler is not None else None
+    }
+
+
+# /health, /ready and /metrics answer from the first second
+app.include_router(LifecycleRouter(
+    "ml-service", model_loader, details=health_details, metrics=metrics.metrics_response
+).router)
+
+
+def load_models(progress):
+    """
+    Load the Keras model and the similarity index, create the worker pool
+    (background thread)
+
+    Args:
+        progress: ModelLoader.progress callback
+    """
+    global predictor, prediction_pool, similarity_index
+
+    progress("loading", model_path)
+    predictor = GenrePredictor(model_path)
+    if not predictor.is_loaded():
+        # GenrePredictor logs the cause; keep /ready at 503
+        raise RuntimeError(f"Model could not be loaded from {model_path}")
+
+    # Worker pool for unbatched predictions, started by include_routes()
+    prediction_pool = WorkerPool.from_env(predictor, warmup_method="warmup", metrics=metrics)
+
+    # Optional similarity index (in this process only; workers just compute embeddings)
+    if predictor.embedding_dim:
+        similarity_index = EmbeddingIndex.from_env(predictor.embedding_dim)
+    elif os.getenv("EMBEDDING_INDEX_DIR"):
+        logger.warning("EMBEDDING_INDEX_DIR is set but EMBEDDINGS_ENABLED is not; similarity index disabled")
+
+
+async def include_routes(_):
+    """
+    Start the worker pool and the batcher, add the prediction endpoints (event loop)
+
+    In process mode the workers fork here, on the event loop thread, after
+    the model is loaded; warm-up runs in each worker process
+    """
+    global batcher, prediction_router
+
+    model_loader.progress("warming_up", os.getenv("WARMUP_BATCH_SIZES", "1"))
+    await prediction_pool.start_async()
+
+    # Optional micro-batching of concurrent /predict requests
+    # (its thread starts after the pool has forked)
+    if os.getenv("BATCHING_ENABLED", "false").lower() == "true":
+        batcher = MicroBatcher(
+            predictor,
+            max_batch_size=int(os.getenv("MAX_BATCH_SIZE", 8)),
+            max_wait_ms=float(os.getenv("MAX_BATCH_WAIT_MS", 10)),
+            method="forward_batch"
+        )
+        batcher.start()
+
+    # Initialize router with predictor (Dependency Injection via constructor)
+    prediction_router = PredictionRouter(
+        predictor, batcher, prediction_pool, ResultCache.from_env(),
+        max_batch_samples=int(os.getenv("MAX_BATCH_SAMPLES", 32)),
+        index=similarity_index,
+        profiler=request_profiler
+    )
+    app.include_router(prediction_router.router)
+
+
+@app.on_event("startup")
+async def startup_event():
+    """Start loading the model without blocking the server"""
+    logger.info("🤖 Loading model in the background (GET /ready turns 200 when done)...")
+    model_loader.start(load_models, on_loaded=include_routes)
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Serve queued requests and stop the workers"""
+    if batcher is not None:
+        batcher.stop()
+
+    if prediction_pool is not None:
+        prediction_pool.shutdown()
 
-# Include routes
-app.include_router(prediction_router.router)
+    if similarity_index is not None:
+        similarity_index.close()
 
 
 if __name__ == "__main__":
     port = int(os.getenv("PORT", 5002))
     host = os.getenv("HOST", "0.0.0.0")
 
-    print(f"🤖 ML Service starting on {host}:{port}")
+    logger.info(f"🤖 ML Service starting on {host}:{port}")
 
     uvicorn.run(
         "main:app",
@@ -0,0 +1,140 @@
+"""
+MicroBatcher: batch boundaries, failures and shutdown
+"""
+
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from app.batching import MicroBatcher, BatcherStoppedError
+
+# Longest a test waits for a future; far above any batch deadline used here
+RESULT_TIMEOUT = 5.0
+
+
+class FakePredictor:
+    """Stands in for GenrePredictor: each output row is the sum of its sample"""
+
+    def __init__(self, fail: bool = False, gate: threading.Event = None):
+        self.fail = fail
+        self.gate = gate
+        self.batch_sizes = []
+
+    def prepare_sample(self, data):
+        return np.asarray(data, dtype=np.float32)
+
+    def predict_batch(self, batch: np.ndarray) -> np.ndarray:
+        self.batch_sizes.append(len(batch))
+        if self.gate is not None:
+            self.gate.wait(RESULT_TIMEOUT)
+        if self.fail:
+            raise RuntimeError("forward pass failed")
+        return batch.sum(axis=1, keepdims=True)
+
+
+def sample(value: float) -> np.ndarray:
+    return np.full(3, value, dtype=np.float32)
+
+
+@pytest.fixture
+def make_batcher():
+    batchers = []
+
+    def make(predictor, **kwargs):
+        batcher = MicroBatcher(predictor, **kwargs)
+        batcher.start()
+        batchers.append(batcher)
+        return batcher
+
+    yield make
+
+    for batcher in batchers:
+        batcher.stop()
+
+
+def test_batch_closes_at_max_batch_size(make_batcher):
+    predictor = FakePredictor(gate=threading.Event())
+    # The deadline is never reached: only the size can close a batch
+    batcher = make_batcher(predictor, max_batch_size=2, max_wait_ms=60_000)
+
+    futures = [batcher.submit(sample(i)) for i in range(4)]
+    predictor.gate.set()
+
+    results = [future.result(RESULT_TIMEOUT) for future in futures]
+
+    assert predictor.batch_sizes == [2, 2]
+    assert [row[0] for row in results] == [0.0, 3.0, 6.0, 9.0]
+
+
+def test_batch_closes_at_max_wait(make_batcher):
+    predictor = FakePredictor()
+    batcher = make_batcher(predictor, max_batch_size=8, max_wait_ms=50)
+
+    started = time.perf_counter()
+    futures = [batcher.submit(sample(i)) for i in range(3)]
+    results = [future.result(RESULT_TIMEOUT) for future in futures]
+    elapsed = time.perf_counter() - started
+
+    assert predictor.batch_sizes == [3]
+    assert [row[0] for row in results] == [0.0, 3.0, 6.0]
+    # Waited for more samples until the first one's deadline
+    assert elapsed >= 0.04
+
+
+def test_submit_after_stop_is_rejected(make_batcher):
+    batcher = make_batcher(FakePredictor())
+    batcher.stop()
+
+    with pytest.raises(BatcherStoppedError):
+        batcher.submit(sample(1))
+
+
+def test_submit_before_start_is_rejected():
+    batcher = MicroBatcher(FakePredictor())
+
+    with pytest.raises(BatcherStoppedError):
+        batcher.submit(sample(1))
+
+
+def test_requests_queued_at_stop_are_served(make_batcher):
+    predictor = FakePredictor(gate=threading.Event())
+    batcher = make_batcher(predictor, max_batch_size=2, max_wait_ms=1)
+
+    # The first batch blocks in the forward pass, the rest queue behind it
+    futures = [batcher.submit(sample(i)) for i in range(7)]
+
+    stopper = threading.Thread(target=batcher.stop)
+    stopper.start()
+    while not batcher._stopping:
+        time.sleep(0.001)
+
+    with pytest.raises(BatcherStoppedError):
+        batcher.submit(sample(99))
+
+    predictor.gate.set()
+    stopper.join(RESULT_TIMEOUT)
+
+    assert not stopper.is_alive()
+    assert all(future.done() for future in futures)
+    assert [future.result()[0] for future in futures] == [3.0 * i for i in range(7)]
+    assert sum(predictor.batch_sizes) == 7
+
+
+def test_failing_batch_fails_every_request_in_it(make_batcher):
+    predictor = FakePredictor(fail=True, gate=threading.Event())
+    batcher = make_batcher(predictor, max_batch_size=3, max_wait_ms=60_000)
+
+    futures = [batcher.submit(sample(i)) for i in range(3)]
+    predictor.gate.set()
+
+    for future in futures:
+        with pytest.raises(RuntimeError, match="forward pass failed"):
+            future.result(RESULT_TIMEOUT)
+    assert predictor.batch_sizes == [3]
+
+    # The batching thread survives the failure
+    predictor.fail = False
+    futures = [batcher.submit(sample(i)) for i in range(3)]
+    assert [future.result(RESULT_TIMEOUT)[0] for future in futures] == [0.0, 3.0, 6.0]
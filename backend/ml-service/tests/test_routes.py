@@ -0,0 +1,61 @@
+"""
+POST /predict input validation
+"""
+
+import numpy as np
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.predictor import GenrePredictor
+from app.routes import PredictionRouter
+from service_common.tensor_codec import NPY_MEDIA_TYPE, encode_tensor
+
+
+@pytest.fixture
+def client():
+    predictor = GenrePredictor("unused.keras")
+    # Uniform probabilities for any batch, in place of a loaded model
+    predictor.engine = lambda inputs: np.full((len(inputs[0]), 9), 1 / 9, dtype=np.float32)
+
+    app = FastAPI()
+    app.include_router(PredictionRouter(predictor).router)
+    return TestClient(app)
+
+
+def spectrograms(stems: int) -> list:
+    return np.zeros((stems, 2, 3, 1)).tolist()
+
+
+def test_predict_accepts_four_stems(client):
+    response = client.post("/predict", json={"data": spectrograms(4)})
+
+    assert response.status_code == 200
+    assert len(response.json()["probabilities"]) == 9
+
+
+@pytest.mark.parametrize("stems", [3, 5])
+def test_predict_rejects_wrong_stem_count(client, stems):
+    response = client.post("/predict", json={"data": spectrograms(stems)})
+
+    assert response.status_code == 400
+    assert f"got {stems}" in response.json()["detail"]
+
+
+def test_predict_rejects_ragged_spectrograms(client):
+    data = spectrograms(4)
+    data[2] = np.zeros((2, 5, 1)).tolist()
+
+    response = client.post("/predict", json={"data": data})
+
+    assert response.status_code == 400
+
+
+def test_predict_rejects_binary_tensor_with_wrong_stem_count(client):
+    response = client.post(
+        "/predict",
+        content=encode_tensor(np.zeros((3, 2, 3, 1), dtype=np.float32), "float32"),
+        headers={"Content-Type": NPY_MEDIA_TYPE}
+    )
+
+    assert response.status_code == 400
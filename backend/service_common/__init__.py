@@ -0,0 +1 @@
+# Modules shared by the audio, ML and combined services
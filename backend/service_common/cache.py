@@ -0,0 +1,336 @@
+"""
+Content-Addressed Result Cache
+Two-tier (memory LRU + on-disk .npz) cache with single-flight deduplication
+"""
+
+import asyncio
+from collections import OrderedDict
+import hashlib
+import os
+from pathlib import Path
+import threading
+
+import numpy as np
+
+
+def content_key(*parts) -> str:
+    """
+    Build a cache key from request content and processing parameters
+
+    Args:
+        parts: bytes (hashed as-is) or any other value (hashed via str())
+
+    Returns:
+        Hex SHA-256 digest
+    """
+    digest = hashlib.sha256()
+
+    for part in parts:
+        if isinstance(part, (bytes, bytearray, memoryview)):
+            digest.update(part)
+        else:
+            digest.update(str(part).encode("utf-8"))
+        # Separator so ("ab", "c") and ("a", "bc") differ
+        digest.update(b"\x00")
+
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """
+    Caches numpy results by content key
+
+    - Memory tier: LRU bounded by total array bytes
+    - Disk tier (optional): one .npz per key, evicted oldest-first by total file size
+    - Single-flight: concurrent get_or_compute() calls for the same key share
+      one computation
+    """
+
+    def __init__(self, memory_max_bytes: int, disk_dir: str = None,
+                 disk_max_bytes: int = 0, store_dtype: str = None):
+        """
+        Args:
+            memory_max_bytes: Budget for the in-memory tier (0 disables it)
+            disk_dir: Directory of the on-disk tier (None disables it)
+            disk_max_bytes: Budget for the on-disk tier
+            store_dtype: Optional dtype arrays are stored as, e.g. "float16"
+        """
+        self.memory_max_bytes = memory_max_bytes
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        self.disk_max_bytes = disk_max_bytes
+        self.store_dtype = np.dtype(store_dtype) if store_dtype else None
+
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()  # key -> array
+        self._memory_bytes = 0
+        self._disk = OrderedDict()  # key -> file size, oldest access first
+        self._disk_bytes = 0
+        self._inflight = {}  # key -> asyncio.Future
+
+        self._counters = {
+            "hits_memory": 0,
+            "hits_disk": 0,
+            "misses": 0,
+            "coalesced": 0,
+            "evictions_memory": 0,
+            "evictions_disk": 0,
+        }
+
+        if self.disk_dir is not None:
+            self._scan_disk()
+
+    @classmethod
+    def from_env(cls, reduced_precision: bool = False):
+        """
+        Build a cache from CACHE_* environment variables
+
+        Args:
+            reduced_precision: Apply CACHE_DTYPE (spectrograms only; model
+                outputs, embeddings and window tables are always stored as is)
+
+        Returns:
+            ResultCache, or None if CACHE_ENABLED is not "true"
+        """
+        if os.getenv("CACHE_ENABLED", "false").lower() != "true":
+            return None
+
+        return cls(
+            memory_max_bytes=int(float(os.getenv("CACHE_MEMORY_MB", 256)) * 1024 * 1024),
+            disk_dir=os.getenv("CACHE_DIR") or None,
+            disk_max_bytes=int(float(os.getenv("CACHE_DISK_MB", 2048)) * 1024 * 1024),
+            store_dtype=(os.getenv("CACHE_DTYPE") or None) if reduced_precision else None
+        )
+
+    # ---------- public API ----------
+
+    def get(self, key: str):
+        """
+        Look a key up in memory, then on disk (blocking; see get_async())
+
+        Returns:
+            Cached array, or None on a miss
+        """
+        array = self._get_memory(key)
+        return array if array is not None else self._get_disk(key)
+
+    async def get_async(self, key: str):
+        """get() with the disk tier read on a thread, off the event loop"""
+        array = self._get_memory(key)
+        if array is not None:
+            return array
+        if self.disk_dir is None:
+            # Only counts the miss
+            return self._get_disk(key)
+
+        return await asyncio.get_running_loop().run_in_executor(None, self._get_disk, key)
+
+    def put(self, key: str, array: np.ndarray) -> np.ndarray:
+        """
+        Store an array in both tiers (blocking; see put_async())
+
+        Returns:
+            The array as stored (converted to store_dtype if configured)
+        """
+        array = self._put_memory_tier(key, array)
+        self._write_disk(key, array)
+        return array
+
+    async def put_async(self, key: str, array: np.ndarray) -> np.ndarray:
+        """put() with the disk tier written on a thread, off the event loop"""
+        array = self._put_memory_tier(key, array)
+        if self.disk_dir is not None:
+            await asyncio.get_running_loop().run_in_executor(None, self._write_disk, key, array)
+        return array
+
+    async def get_or_compute(self, key: str, compute, resource=None) -> tuple:
+        """
+        Return the cached result or compute it once for all concurrent callers
+
+        The computation runs as its own task: if the caller that started it
+        is cancelled (e.g. its client disconnected), it still completes for
+        the other callers and is cached. What it reads must outlive that
+        caller too: pass it as `resource`.
+
+        Args:
+            key: Content key (see content_key())
+            compute: Zero-argument coroutine function producing the array
+            resource: Optional object compute() reads, with retain() and
+                cleanup() (e.g. a StoredUpload); a computation started by
+                this call retains it and cleans it up when it ends
+
+        Returns:
+            Tuple (array, cache_hit)
+        """
+        cached = await self.get_async(key)
+        if cached is not None:
+            return cached, True
+
+        if key in self._inflight:
+            self._counters["coalesced"] += 1
+            return await asyncio.shield(self._inflight[key]), True
+
+        if resource is not None:
+            resource.retain()
+        task = asyncio.get_running_loop().create_task(self._compute_and_store(key, compute, resource))
+        self._inflight[key] = task
+        task.add_done_callback(self._computed)
+
+        return await asyncio.shield(task), False
+
+    async def _compute_and_store(self, key: str, compute, resource) -> np.ndarray:
+        try:
+            return await self.put_async(key, await compute())
+        finally:
+            del self._inflight[key]
+            if resource is not None:
+                resource.cleanup()
+
+    @staticmethod
+    def _computed(task: asyncio.Task):
+        # Retrieved here too, in case every caller was cancelled meanwhile
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> dict:
+        """Hit/miss/eviction counters and tier sizes"""
+        with self._lock:
+            return {
+                **self._counters,
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_bytes,
+                "memory_max_bytes": self.memory_max_bytes,
+                "disk_entries": len(self._disk),
+                "disk_bytes": self._disk_bytes,
+                "disk_max_bytes": self.disk_max_bytes if self.disk_dir else 0,
+                "inflight": len(self._inflight),
+            }
+
+    # ---------- memory tier ----------
+
+    def _get_memory(self, key: str):
+        """Cached array from the memory tier, or None"""
+        with self._lock:
+            if key not in self._memory:
+                return None
+            self._memory.move_to_end(key)
+            self._counters["hits_memory"] += 1
+            return self._memory[key]
+
+    def _put_memory_tier(self, key: str, array: np.ndarray) -> np.ndarray:
+        """Convert and freeze an array and insert it into the memory tier"""
+        if self.store_dtype is not None and array.dtype != self.store_dtype:
+            array = array.astype(self.store_dtype)
+
+        # Never hand out a buffer someone else can still write to
+        array = np.array(array, copy=True)
+        array.setflags(write=False)
+
+        with self._lock:
+            self._put_memory(key, array)
+        return array
+
+    def _put_memory(self, key: str, array: np.ndarray):
+        """Insert into the LRU and evict until under budget (lock held)"""
+        if array.nbytes > self.memory_max_bytes:
+            return
+
+        if key in self._memory:
+            self._memory_bytes -= self._memory.pop(key).nbytes
+
+        self._memory[key] = array
+        self._memory_bytes += array.nbytes
+
+        while self._memory_bytes > self.memory_max_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= evicted.nbytes
+            self._counters["evictions_memory"] += 1
+
+    # ---------- disk tier ----------
+
+    def _disk_path(self, key: str) -> Path:
+        """Shard files by key prefix to keep directories small"""
+        return self.disk_dir / key[:2] / f"{key}.npz"
+
+    def _scan_disk(self):
+        """Rebuild the disk index from existing files, oldest first"""
+        self.disk_dir.mkdir(parents=True, exist_ok=True)
+
+        entries = []
+        for path in self.disk_dir.glob("*/*.npz"):
+            stat = path.stat()
+            entries.append((stat.st_mtime, path.stem, stat.st_size))
+
+        for _, key, size in sorted(entries):
+            self._disk[key] = size
+            self._disk_bytes += size
+
+        self._evict_disk()
+
+    def _get_disk(self, key: str):
+        """Look a key up on disk, counting the hit or miss"""
+        array = self._read_disk(key)
+
+        with self._lock:
+            if array is None:
+                self._counters["misses"] += 1
+                return None
+
+            self._counters["hits_disk"] += 1
+            self._put_memory(key, array)
+            return array
+
+    def _read_disk(self, key: str):
+        """Load a key from disk, or None"""
+        if self.disk_dir is None:
+            return None
+
+        with self._lock:
+            if key not in self._disk:
+                return None
+            self._disk.move_to_end(key)
+
+        path = self._disk_path(key)
+        try:
+            with np.load(path, allow_pickle=False) as npz:
+                array = npz["result"]
+            os.utime(path)
+        except (OSError, KeyError, ValueError):
+            # Removed behind our back or truncated: forget it
+            with self._lock:
+                self._disk_bytes -= self._disk.pop(key, 0)
+            return None
+
+        array.setflags(write=False)
+        return array
+
+    def _write_disk(self, key: str, array: np.ndarray):
+        """Persist a key atomically and evict until under budget"""
+        if self.disk_dir is None:
+            return
+
+        path = self._disk_path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        # Write to a temp name then rename, so readers never see partial files
+        temp_path = path.with_name(f".{key}.{threading.get_ident()}.tmp")
+        with open(temp_path, "wb") as f:
+            np.savez(f, result=array)
+        os.replace(temp_path, path)
+
+        size = path.stat().st_size
+        with self._lock:
+            self._disk_bytes += size - self._disk.pop(key, 0)
+            self._disk[key] = size
+            self._evict_disk()
+
+    def _evict_disk(self):
+        """Delete least recently used files until under budget (lock held)"""
+        while self._disk and self._disk_bytes > self.disk_max_bytes:
+            key, size = self._disk.popitem(last=False)
+            self._disk_bytes -= size
+            self._counters["evictions_disk"] += 1
+
+            try:
+                self._disk_path(key).unlink()
+            except FileNotFoundError:
+                pass
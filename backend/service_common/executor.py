@@ -0,0 +1,372 @@
+"""
+Worker Pool
+Runs blocking model work off the event loop with bounded concurrency
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import functools
+import logging
+import multiprocessing
+import os
+
+from .memory import RecyclePolicy, array_bytes, memory_sample, rss_bytes
+from .metrics import mark_workers_dead
+from .profiling import profile_call
+
+logger = logging.getLogger(__name__)
+
+
+# Object whose methods run in pool processes. Set before the pool forks,
+# so children inherit the already-loaded models instead of reloading them.
+_worker_target = None
+
+
+def _invoke(method_name: str, *args, **kwargs):
+    """Entry point executed inside a forked worker process"""
+    return getattr(_worker_target, method_name)(*args, **kwargs)
+
+
+def _call_accounted(function, profiled: bool, args: tuple, kwargs: dict):
+    """
+    Run function (under cProfile if profiled) in the worker and measure it
+
+    Returns:
+        Tuple (output, sample): output is the result, or (result, profile)
+        if profiled; sample is memory.memory_sample() of the worker
+    """
+    if profiled:
+        output = profile_call(function, *args, **kwargs)
+        result = output[0]
+    else:
+        output = result = function(*args, **kwargs)
+
+    return output, memory_sample(array_bytes(args) + array_bytes(result))
+
+
+def _invoke_accounted(method_name: str, profiled: bool, args: tuple, kwargs: dict):
+    """_call_accounted() for a target method, inside a forked worker process"""
+    return _call_accounted(getattr(_worker_target, method_name), profiled, args, kwargs)
+
+
+class PoolSaturatedError(Exception):
+    """Raised when both the in-flight and the queued limits are reached"""
+
+
+class WorkerPool:
+    """
+    Executes methods of a preloaded target (AudioProcessor, GenrePredictor)
+    in one of three modes:
+      - "inline":  on the event loop thread (original behavior)
+      - "thread":  on a thread pool inside this process
+      - "process": on processes forked after the models were loaded; what
+                   the target holds by then (e.g. Keras weights) is shared
+                   copy-on-write, what it loads lazily (Spleeter's graph and
+                   weights, on the first separation) is loaded per worker
+
+    At most `workers` calls run at once and at most `max_queued` wait for a
+    slot; anything beyond that is rejected with PoolSaturatedError.
+
+    Every call reports the RSS and peak RSS of the worker that ran it and
+    the bytes of the arrays it received and returned. In process mode, a
+    RecyclePolicy replaces the worker processes once one of them served
+    too many calls or grew past the RSS watermark: a new set is forked
+    (from this process, which still holds the loaded models) and takes new
+    calls, while the old set finishes the calls it already has and exits.
+    ProcessPoolExecutor cannot retire a single process, so all workers are
+    replaced together.
+
+    The memory gauges are the service's own (audio_worker_rss_bytes,
+    ml_worker_rss_bytes, ...), passed in as `metrics`.
+    """
+
+    MODES = ("inline", "thread", "process")
+
+    def __init__(self, target, mode: str = "thread", workers: int = 1, max_queued: int = 8,
+                 warmup_method: str = None, recycle: RecyclePolicy = None, metrics=None):
+        """
+        Args:
+            target: Object with the blocking methods to run (models already loaded)
+            mode: "inline", "thread" or "process"
+            workers: Maximum number of calls in flight
+            max_queued: Maximum number of calls waiting for a worker
+            warmup_method: Optional target method run once at start(), in every
+                worker process in process mode
+            recycle: Optional RecyclePolicy for the worker processes (process mode only)
+            metrics: Optional module (e.g. app.metrics) with the WORKER_RSS_BYTES,
+                WORKER_PEAK_RSS_BYTES, WORKER_RECYCLES and REQUEST_ARRAY_BYTES metrics
+        """
+        if mode not in self.MODES:
+            raise ValueError(f"Invalid executor mode: {mode} (expected one of {self.MODES})")
+
+        self.target = target
+        self.mode = mode
+        self.workers = max(1, workers)
+        self.max_queued = max(0, max_queued)
+        self.warmup_method = warmup_method
+        self.recycle = recycle
+        self.metrics = metrics
+
+        self._executor = None
+        self._pending = 0
+        self._rejected_total = 0
+
+        self._generation = 0
+        self._worker_pids = None  # current worker processes (process mode)
+        self._fresh_rss = 0  # largest RSS of the current workers right after forking
+        self._worker_memory = {}  # pid -> last sample + calls served
+        self._recycle_task = None
+        self._recycles = {}  # reason -> count
+
+    @classmethod
+    def from_env(cls, target, warmup_method: str = None, metrics=None):
+        """Build a pool from EXECUTOR_MODE / EXECUTOR_WORKERS / EXECUTOR_MAX_QUEUE and WORKER_MAX_*"""
+        return cls(
+            target,
+            mode=os.getenv("EXECUTOR_MODE", "thread").lower(),
+            workers=int(os.getenv("EXECUTOR_WORKERS", 1)),
+            max_queued=int(os.getenv("EXECUTOR_MAX_QUEUE", 8)),
+            warmup_method=warmup_method,
+            recycle=RecyclePolicy.from_env(),
+            metrics=metrics
+        )
+
+    def start(self):
+        """
+        Create the executor; in process mode, fork and warm up all workers now
+
+        Blocking. With a running event loop (the services), use start_async().
+        """
+        global _worker_target
+
+        # Process workers warm up in their initializer; the parent must not
+        # run the model before forking
+        if self.warmup_method and self.mode != "process":
+            getattr(self.target, self.warmup_method)()
+
+        if self.mode == "process":
+            _worker_target = self.target
+            executor, started = self._launch_workers()
+            for future in started:
+                future.result()
+            self._adopt_workers(executor)
+
+        self._finish_start()
+
+    async def start_async(self):
+        """
+        start() on the event loop thread, without blocking it during warm-up
+
+        In process mode the workers fork right here, on the event loop
+        thread between two requests, not on a helper thread that could be
+        forking while the loop is in the middle of something. The other
+        threads alive at that point (the idle threads that loaded the
+        models) are waiting for work and hold no locks a worker needs.
+        """
+        global _worker_target
+
+        loop = asyncio.get_running_loop()
+
+        if self.warmup_method and self.mode != "process":
+            await loop.run_in_executor(None, getattr(self.target, self.warmup_method))
+
+        if self.mode == "process":
+            _worker_target = self.target
+            executor, started = self._launch_workers()
+            await asyncio.gather(*(asyncio.wrap_future(future) for future in started))
+            self._adopt_workers(executor)
+
+        self._finish_start()
+
+    def _finish_start(self):
+        if self.mode == "thread":
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="model-worker")
+
+        if self.recycle is not None and self.mode != "process":
+            logger.warning("WORKER_MAX_REQUESTS / WORKER_MAX_RSS_MB only apply with EXECUTOR_MODE=process")
+
+        logger.info("Mode: %s, workers: %d, max queued: %d", self.mode, self.workers, self.max_queued)
+
+    def _launch_workers(self) -> tuple:
+        """
+        Fork all workers of a new process executor on the calling thread
+
+        Returns:
+            Tuple (executor, futures that complete once each worker is warmed up)
+        """
+        executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("fork"),
+            initializer=_invoke if self.warmup_method else None,
+            initargs=(self.warmup_method,) if self.warmup_method else ()
+        )
+        # Back-to-back submissions find no idle worker, so every worker
+        # forks now, inside submit(), while only the loaded models are in memory
+        started = [executor.submit(os.getpid) for _ in range(self.workers)]
+        logger.info("Forked %d worker process(es)", self.workers)
+        return executor, started
+
+    def _adopt_workers(self, executor):
+        """Make a launched, warmed-up executor the current one"""
+        self._executor = executor
+        # Every forked process, including any that did not run a submission
+        self._worker_pids = set(executor._processes)
+        self._check_watermark()
+
+    def shutdown(self):
+        """Wait for in-flight calls and release the workers"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+            mark_workers_dead(self._worker_pids)
+
+    def is_saturated(self) -> bool:
+        """True when a new call would be rejected"""
+        return self._pending >= self.workers + self.max_queued
+
+    async def run(self, method_name: str, *args, **kwargs):
+        """
+        Run target.<method_name>(*args, **kwargs) without blocking the event loop
+
+        Raises:
+            PoolSaturatedError: If the pool and its queue are full
+        """
+        return await self._run(method_name, args, kwargs, profiled=False)
+
+    async def run_profiled(self, method_name: str, *args, **kwargs):
+        """
+        Like run(), with the call profiled in the thread or process running it
+
+        Returns:
+            Tuple (result, profile), see profiling.profile_call()
+
+        Raises:
+            PoolSaturatedError: If the pool and its queue are full
+        """
+        return await self._run(method_name, args, kwargs, profiled=True)
+
+    async def _run(self, method_name: str, args: tuple, kwargs: dict, profiled: bool):
+        if self.is_saturated():
+            self._rejected_total += 1
+            raise PoolSaturatedError(
+                f"Worker pool saturated ({self.workers} in flight, {self.max_queued} queued)"
+            )
+
+        self._pending += 1
+        try:
+            if self.mode == "process":
+                call = functools.partial(_invoke_accounted, method_name, profiled, args, kwargs)
+            else:
+                call = functools.partial(_call_accounted, getattr(self.target, method_name), profiled, args, kwargs)
+
+            if self.mode == "inline":
+                output, sample = call()
+            else:
+                loop = asyncio.get_running_loop()
+                output, sample = await loop.run_in_executor(self._executor, call)
+
+            self._account(sample)
+            return output
+        finally:
+            self._pending -= 1
+
+    # ---------- memory accounting and recycling ----------
+
+    def _account(self, sample: dict):
+        """Record a worker's memory after a call; start recycling if the policy says so"""
+        if self.metrics is not None:
+            self.metrics.REQUEST_ARRAY_BYTES.observe(sample["array_bytes"])
+
+        if self._worker_pids is not None and sample["pid"] not in self._worker_pids:
+            # A retired worker finishing its last calls
+            return
+
+        worker = self._worker_memory.setdefault(sample["pid"], {"calls": 0})
+        worker.update(sample)
+        worker["calls"] += 1
+
+        if sample["rss"] is not None and self.metrics is not None:
+            self.metrics.WORKER_RSS_BYTES.set(max(w["rss"] or 0 for w in self._worker_memory.values()))
+            self.metrics.WORKER_PEAK_RSS_BYTES.set(max(w["peak_rss"] or 0 for w in self._worker_memory.values()))
+
+        if self.mode != "process" or self.recycle is None or self._recycle_task is not None:
+            return
+
+        reason = self.recycle.reason(worker["calls"], sample["rss"])
+        if reason == "rss" and self._fresh_rss >= self.recycle.max_rss_bytes:
+            # New workers would be over the watermark too
+            return
+        if reason is not None and self._executor is not None:
+            logger.info("Recycling workers: pid %d at %d calls, RSS %.0f MB (%s limit)",
+                        sample["pid"], worker["calls"], (sample["rss"] or 0) / 2**20, reason)
+            self._recycle_task = asyncio.get_running_loop().create_task(self._recycle(reason))
+
+    def _check_watermark(self):
+        """Measure the new workers; warn if they start above the RSS watermark"""
+        self._fresh_rss = max((rss_bytes(pid) or 0 for pid in self._worker_pids), default=0)
+        if self.recycle is not None and self.recycle.max_rss_bytes and self._fresh_rss >= self.recycle.max_rss_bytes:
+            logger.warning("Workers start at %.0f MB RSS, above WORKER_MAX_RSS_MB; RSS recycling is off",
+                           self._fresh_rss / 2**20)
+
+    async def _recycle(self, reason: str):
+        """Swap in freshly forked workers, then let the old ones drain and exit"""
+        loop = asyncio.get_running_loop()
+        try:
+            # Forked on the event loop thread (see start_async()); warming up
+            # takes a while, the old workers keep serving meanwhile
+            replacement, started = self._launch_workers()
+            await asyncio.gather(*(asyncio.wrap_future(future) for future in started))
+
+            if self._executor is None:
+                # The pool was shut down while warming up
+                await loop.run_in_executor(None, functools.partial(replacement.shutdown, wait=True))
+                return
+
+            retired, retired_pids = self._executor, self._worker_pids
+            self._adopt_workers(replacement)
+            self._generation += 1
+            self._worker_memory = {}
+            self._recycles[reason] = self._recycles.get(reason, 0) + 1
+            if self.metrics is not None:
+                self.metrics.WORKER_RECYCLES.labels(reason).inc()
+
+            # Calls already submitted to the old workers (running or queued) complete
+            await loop.run_in_executor(None, functools.partial(retired.shutdown, wait=True))
+            mark_workers_dead(retired_pids)
+            logger.info("Workers recycled (generation %d)", self._generation)
+        except Exception as e:
+            logger.error("Worker recycling failed, keeping the current workers: %s", e)
+        finally:
+            self._recycle_task = None
+
+    def memory_stats(self) -> dict:
+        """Per-worker memory, in MB, for /health"""
+        def mb(value):
+            return None if value is None else round(value / 2**20, 1)
+
+        return {
+            # New workers are forked from this process and start with its memory
+            "server_rss_mb": mb(rss_bytes()),
+            "generation": self._generation,
+            "recycling": self._recycle_task is not None,
+            "recycles": dict(self._recycles),
+            "policy": self.recycle.describe() if self.recycle is not None else None,
+            "workers": [
+                {"pid": pid, "calls": worker["calls"], "rss_mb": mb(worker["rss"]),
+                 "peak_rss_mb": mb(worker["peak_rss"]), "private_mb": mb(worker["private"]),
+                 "last_array_mb": mb(worker["array_bytes"])}
+                for pid, worker in sorted(self._worker_memory.items())
+            ],
+        }
+
+    def stats(self) -> dict:
+        """Current load of the pool"""
+        return {
+            "mode": self.mode,
+            "workers": self.workers,
+            "max_queued": self.max_queued,
+            "in_flight": min(self._pending, self.workers),
+            "queued": max(0, self._pending - self.workers),
+            "rejected_total": self._rejected_total,
+            "memory": self.memory_stats(),
+        }
@@ -0,0 +1,169 @@
+"""
+Service Lifecycle
+Background model loading with progress state, liveness and readiness endpoints
+"""
+
+import asyncio
+import inspect
+import logging
+import time
+
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+
+logger = logging.getLogger(__name__)
+
+
+class ModelLoader:
+    """
+    Loads models in the background so the HTTP server answers immediately
+
+    States: "starting" -> "loading" -> "warming_up" -> "ready", or "failed"
+    The load function reports its progress through progress(state, detail).
+    """
+
+    def __init__(self):
+        self.state = "starting"
+        self.detail = None
+        self.error = None
+        self.started_at = time.time()
+        self.ready_at = None
+        self._task = None
+
+    def progress(self, state: str, detail: str = None):
+        """Record the current loading step"""
+        self.state = state
+        self.detail = detail
+        logger.info("%s%s", state, f": {detail}" if detail else "")
+
+    def is_ready(self) -> bool:
+        return self.state == "ready"
+
+    def start(self, load, on_loaded=None):
+        """
+        Run load(progress) on a background thread
+
+        Args:
+            load: Blocking callable doing all loading and warm-up; receives
+                the progress callback and returns whatever on_loaded needs
+            on_loaded: Optional callable run on the event loop with load's
+                result before the service turns ready (e.g. to add routes);
+                may be a coroutine function, e.g. to fork the worker pool
+                on the event loop thread rather than on load's thread
+        """
+        self._task = asyncio.get_running_loop().create_task(self._run(load, on_loaded))
+
+    async def _run(self, load, on_loaded):
+        try:
+            result = await asyncio.get_running_loop().run_in_executor(None, load, self.progress)
+
+            if on_loaded is not None:
+                loaded = on_loaded(result)
+                if inspect.isawaitable(loaded):
+                    await loaded
+
+            self.ready_at = time.time()
+            self.progress("ready", f"loaded in {self.ready_at - self.started_at:.1f} s")
+
+        except Exception as e:
+            logger.exception("Model loading failed")
+            self.error = str(e)
+            self.state = "failed"
+
+    def status(self) -> dict:
+        """Loading progress for /health and /ready"""
+        end = self.ready_at or time.time()
+        return {
+            "state": self.state,
+            "detail": self.detail,
+            "error": self.error,
+            "elapsed_seconds": round(end - self.started_at, 1),
+        }
+
+
+class LifecycleRouter:
+    """
+    Liveness and readiness endpoints, served from the first second
+
+    - GET /health: 200 while the process is alive (also during loading)
+    - GET /ready:  200 once models are loaded and warm, 503 before
+    - GET /metrics: optional, so metrics are available during loading too
+    """
+
+    # Paths answered while models are still loading
+    PATHS = ("/health", "/ready", "/metrics", "/docs", "/openapi.json")
+
+    def __init__(self, service: str, loader: ModelLoader, details=None, metrics=None):
+        """
+        Args:
+            service: Service name reported by /health
+            loader: ModelLoader tracking the background loading
+            details: Optional callable returning extra /health fields
+            metrics: Optional callable returning the /metrics response
+        """
+        self.service = service
+        self.loader = loader
+        self.details = details
+        self.metrics = metrics
+        self.router = APIRouter()
+        self._setup_routes()
+
+    def _setup_routes(self):
+        """Define the lifecycle routes"""
+
+        @self.router.get("/health")
+        async def health_check():
+            """Liveness: the process is up and serving HTTP"""
+            return {
+                "status": "healthy",
+                "service": self.service,
+                "version": "1.0.0",
+                "ready": self.loader.is_ready(),
+                "loading": self.loader.status(),
+                **(self.details() if self.details else {}),
+            }
+
+        @self.router.get("/ready")
+        async def readiness_check():
+            """Readiness: models loaded and warmed up"""
+            ready = self.loader.is_ready()
+            return JSONResponse(
+                status_code=200 if ready else 503,
+                content={"ready": ready, "service": self.service, "loading": self.loader.status()},
+            )
+
+        if self.metrics is not None:
+            @self.router.get("/metrics")
+            async def metrics():
+                """Prometheus metrics"""
+                return self.metrics()
+
+
+class NotReadyMiddleware:
+    """
+    ASGI middleware answering 503 (with Retry-After) for everything but the
+    lifecycle paths until the models are loaded, instead of 404s for routes
+    that are only added once loading finishes
+    """
+
+    def __init__(self, app, loader: ModelLoader, allowed_paths=LifecycleRouter.PATHS):
+        self.app = app
+        self.loader = loader
+        self.allowed_paths = allowed_paths
+
+    async def __call__(self, scope, receive, send):
+        if (scope["type"] != "http" or self.loader.is_ready()
+                or scope["path"] in self.allowed_paths):
+            await self.app(scope, receive, send)
+            return
+
+        failed = self.loader.state == "failed"
+        response = JSONResponse(
+            status_code=503,
+            content={
+                "detail": "Model loading failed" if failed else "Service is starting, models are loading",
+                "loading": self.loader.status(),
+            },
+            headers={} if failed else {"Retry-After": "5"},
+        )
+        await response(scope, receive, send)
@@ -0,0 +1,134 @@
+"""
+Worker Memory
+RSS readings, per-request array accounting and the policy deciding when
+worker processes are recycled
+"""
+
+import os
+
+import numpy as np
+
+
+def _status_bytes(pid: int, field: str):
+    """A "<field>: <n> kB" line of /proc/<pid>/status in bytes (None off Linux or for a gone process)"""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1]) * 1024
+    except (FileNotFoundError, ProcessLookupError, PermissionError):
+        pass
+    return None
+
+
+def rss_bytes(pid: int = None):
+    """Current resident set size of a process (default: this one), or None if unknown"""
+    return _status_bytes(pid or os.getpid(), "VmRSS")
+
+
+def peak_rss_bytes(pid: int = None):
+    """Highest resident set size the process reached, or None if unknown"""
+    return _status_bytes(pid or os.getpid(), "VmHWM")
+
+
+def private_bytes(pid: int = None):
+    """
+    Memory only this process holds (Private_Clean + Private_Dirty), or None if unknown
+
+    A forked worker's RSS also counts the pages it still shares with the
+    server process (the models); this is what the worker itself added.
+    """
+    try:
+        with open(f"/proc/{pid or os.getpid()}/smaps_rollup") as f:
+            return sum(int(line.split()[1]) * 1024 for line in f if line.startswith("Private_"))
+    except (FileNotFoundError, ProcessLookupError, PermissionError):
+        return None
+
+
+def array_bytes(value) -> int:
+    """
+    Bytes of the arrays in a call's arguments or result
+
+    Counts numpy arrays inside tuples, lists and dicts. Nested lists of
+    numbers (JSON payloads) are estimated from their first elements, as
+    float64 once converted, without walking every element.
+    """
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, dict):
+        return sum(array_bytes(item) for item in value.values())
+    if isinstance(value, list) and value:
+        first = value[0]
+        if isinstance(first, (int, float)):
+            return len(value) * 8
+        if isinstance(first, list):
+            return len(value) * array_bytes(first)
+    if isinstance(value, (list, tuple)):
+        return sum(array_bytes(item) for item in value)
+    return 0
+
+
+def memory_sample(held_bytes: int) -> dict:
+    """
+    Memory of the calling process after a call
+
+    Args:
+        held_bytes: array_bytes() of the call's arguments and result
+    """
+    return {
+        "pid": os.getpid(),
+        "rss": rss_bytes(),
+        "peak_rss": peak_rss_bytes(),
+        "private": private_bytes(),
+        "array_bytes": held_bytes,
+    }
+
+
+class RecyclePolicy:
+    """
+    When to replace worker processes: after max_requests calls on one
+    worker, or once a worker's RSS is above max_rss_bytes after a call
+    """
+
+    def __init__(self, max_requests: int = 0, max_rss_bytes: int = 0):
+        """
+        Args:
+            max_requests: Calls per worker before recycling (0 = no limit)
+            max_rss_bytes: RSS watermark (0 = no limit)
+        """
+        self.max_requests = max(0, max_requests)
+        self.max_rss_bytes = max(0, max_rss_bytes)
+
+    @classmethod
+    def from_env(cls):
+        """
+        Build a policy from WORKER_MAX_REQUESTS / WORKER_MAX_RSS_MB
+
+        Returns:
+            RecyclePolicy, or None if both are 0 (workers live as long as the pool)
+        """
+        max_requests = int(os.getenv("WORKER_MAX_REQUESTS", 0))
+        max_rss_mb = float(os.getenv("WORKER_MAX_RSS_MB", 0))
+        if max_requests <= 0 and max_rss_mb <= 0:
+            return None
+
+        return cls(max_requests, int(max_rss_mb * 1024 * 1024))
+
+    def reason(self, requests: int, rss):
+        """
+        Args:
+            requests: Calls served by the worker so far
+            rss: Its RSS in bytes after the last call (None if unknown)
+
+        Returns:
+            "requests", "rss" or None if the worker can keep going
+        """
+        if self.max_requests and requests >= self.max_requests:
+            return "requests"
+        if self.max_rss_bytes and rss is not None and rss > self.max_rss_bytes:
+            return "rss"
+        return None
+
+    def describe(self) -> dict:
+        return {"max_requests": self.max_requests or None,
+                "max_rss_mb": round(self.max_rss_bytes / 2**20, 1) or None}
@@ -0,0 +1,70 @@
+"""
+Shared Metrics Helpers
+Multiprocess directory handling and the /metrics response for every service
+"""
+
+import glob
+import os
+import re
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _remove_stale_samples(directory: str):
+    """
+    Delete sample files (<type>_<pid>.db) of processes that no longer run,
+    i.e. those left by an earlier start. Files of live processes stay, so
+    several server processes (or both service packages in the combined
+    service) can share the directory
+    """
+    for path in glob.glob(os.path.join(directory, "*.db")):
+        match = re.search(r"_(\d+)\.db$", path)
+        if match and not _pid_alive(int(match.group(1))):
+            os.remove(path)
+
+
+# Process-mode workers write their samples to files in this directory.
+# prometheus_client switches modes on the variable's presence, so an empty
+# value (e.g. from .env) would make it write into the working directory
+if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+    os.makedirs(os.environ["PROMETHEUS_MULTIPROC_DIR"], exist_ok=True)
+    _remove_stale_samples(os.environ["PROMETHEUS_MULTIPROC_DIR"])
+else:
+    os.environ.pop("PROMETHEUS_MULTIPROC_DIR", None)
+
+from fastapi.responses import Response
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, REGISTRY, generate_latest
+from prometheus_client import multiprocess
+
+
+def mark_workers_dead(pids):
+    """
+    Drop the live gauges (e.g. the worker RSS) of worker processes that
+    exited; their counters and histograms keep counting in the merged totals
+    """
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        for pid in pids:
+            multiprocess.mark_process_dead(pid)
+
+
+def metrics_response() -> Response:
+    """
+    Render all metrics in the Prometheus text format
+    With PROMETHEUS_MULTIPROC_DIR set (process-mode workers), samples from
+    all processes are merged
+    """
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+
+    return Response(content=generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
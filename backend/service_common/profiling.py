@@ -0,0 +1,373 @@
+"""
+Request Profiling
+Opt-in cProfile capture of single requests, kept in a bounded on-disk ring
+buffer and correlated across services by X-Request-ID
+"""
+
+import cProfile
+import hashlib
+import hmac
+import io
+import json
+import logging
+import marshal
+import os
+from pathlib import Path
+import pstats
+import re
+import threading
+import time
+import uuid
+
+from fastapi import APIRouter, Header, HTTPException, Query
+from fastapi.responses import FileResponse, PlainTextResponse
+
+logger = logging.getLogger(__name__)
+
+
+REQUEST_ID_HEADER = "X-Request-ID"
+PROFILE_TOKEN_HEADER = "X-Profile-Token"
+
+# Client-supplied ids end up in file names
+REQUEST_ID_PATTERN = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+PROFILE_ID_PATTERN = re.compile(r"^\d{13}-[A-Za-z0-9._-]{1,64}$")
+
+# One profiler per process at a time: concurrent requests run unprofiled
+_profile_lock = threading.Lock()
+
+
+def profile_call(function, *args, **kwargs) -> tuple:
+    """
+    Run function(*args, **kwargs) under cProfile
+
+    Only the calling thread is profiled (not e.g. the stem threads).
+
+    Returns:
+        Tuple (result, profile): profile is the marshalled pstats data
+        (the .prof file format), or None if another call in this process
+        was being profiled
+    """
+    if not _profile_lock.acquire(blocking=False):
+        return function(*args, **kwargs), None
+
+    try:
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            result = function(*args, **kwargs)
+        finally:
+            profiler.disable()
+
+        profiler.create_stats()
+        return result, marshal.dumps(profiler.stats)
+    finally:
+        _profile_lock.release()
+
+
+class RequestIdMiddleware:
+    """
+    ASGI middleware giving every request an id: the caller's X-Request-ID
+    (e.g. set by the API gateway for one upload) or a new one
+    Available as request.state.request_id and echoed in the response header
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        header = REQUEST_ID_HEADER.lower().encode("latin-1")
+        request_id = dict(scope["headers"]).get(header, b"").decode("latin-1")
+        if not REQUEST_ID_PATTERN.match(request_id):
+            request_id = uuid.uuid4().hex
+
+        scope.setdefault("state", {})["request_id"] = request_id
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", []), (header, request_id.encode("latin-1"))]
+            await send(message)
+
+        await self.app(scope, receive, send_with_id)
+
+
+class ProfileStore:
+    """
+    Ring buffer of profiles in one directory
+    Each profile is <id>.prof (pstats format, e.g. for snakeviz) plus
+    <id>.json metadata; ids start with a millisecond timestamp, so the
+    oldest ones are removed first once max_profiles is exceeded
+    """
+
+    def __init__(self, directory: str, max_profiles: int = 50):
+        """
+        Args:
+            directory: Where profiles are written (created if missing)
+            max_profiles: Profiles kept
+        """
+        self.directory = Path(directory)
+        self.max_profiles = max(1, max_profiles)
+        self._lock = threading.Lock()
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def save(self, meta: dict, profile: bytes) -> str:
+        """
+        Store one profile and drop the oldest beyond max_profiles
+
+        Args:
+            meta: JSON-serializable metadata; must contain request_id
+            profile: Marshalled pstats data (see profile_call())
+
+        Returns:
+            Profile id
+        """
+        profile_id = f"{int(time.time() * 1000):013d}-{meta['request_id']}"
+        meta = {"id": profile_id, **meta}
+
+        with self._lock:
+            self._write(self.directory / f"{profile_id}.prof", profile)
+            self._write(self.directory / f"{profile_id}.json", json.dumps(meta).encode("utf-8"))
+
+            for old_id in self._ids()[:-self.max_profiles]:
+                for suffix in (".json", ".prof"):
+                    (self.directory / f"{old_id}{suffix}").unlink(missing_ok=True)
+
+        return profile_id
+
+    def list(self, request_id: str = None) -> list:
+        """
+        Metadata of the stored profiles, newest first
+
+        Args:
+            request_id: Only profiles of this request
+        """
+        entries = []
+        for profile_id in reversed(self._ids()):
+            meta = self.get(profile_id)
+            if meta is not None and (request_id is None or meta["request_id"] == request_id):
+                entries.append(meta)
+        return entries
+
+    def get(self, profile_id: str):
+        """
+        Returns:
+            Metadata dictionary, or None if the profile does not exist (any more)
+        """
+        if not PROFILE_ID_PATTERN.match(profile_id):
+            return None
+        try:
+            return json.loads((self.directory / f"{profile_id}.json").read_text())
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def profile_path(self, profile_id: str):
+        """Path of the .prof file, or None if it does not exist"""
+        if not PROFILE_ID_PATTERN.match(profile_id):
+            return None
+        path = self.directory / f"{profile_id}.prof"
+        return path if path.exists() else None
+
+    def report(self, profile_id: str, sort: str = "cumulative", limit: int = 40):
+        """
+        Human-readable pstats report
+
+        Args:
+            sort: pstats sort key, e.g. cumulative, tottime, calls
+            limit: Functions listed
+
+        Returns:
+            Report text, or None if the profile does not exist
+        """
+        path = self.profile_path(profile_id)
+        if path is None:
+            return None
+
+        output = io.StringIO()
+        stats = pstats.Stats(str(path), stream=output)
+        stats.sort_stats(sort).print_stats(limit)
+        return output.getvalue()
+
+    def _ids(self) -> list:
+        """Stored profile ids, oldest first"""
+        return sorted(path.stem for path in self.directory.glob("*.json"))
+
+    @staticmethod
+    def _write(path: Path, data: bytes):
+        temp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        temp_path.write_bytes(data)
+        os.replace(temp_path, path)
+
+
+class RequestProfiler:
+    """
+    Decides which requests are profiled and stores their profiles
+
+    A request is profiled when it carries X-Profile-Token matching
+    PROFILE_ADMIN_TOKEN, or when it falls into the PROFILE_SAMPLE_RATE
+    sample. Sampling is decided from the request id, so services sharing
+    an id (and the rate) profile the same requests.
+    """
+
+    def __init__(self, service: str, store: ProfileStore, sample_rate: float = 0.0,
+                 admin_token: str = None):
+        """
+        Args:
+            service: Name stored with each profile (e.g. "audio-service")
+            store: Where profiles go
+            sample_rate: Share of requests profiled without a token [0-1]
+            admin_token: Token that forces profiling and guards GET /profiles
+                (None = on-demand profiling off, /profiles open)
+        """
+        self.service = service
+        self.store = store
+        self.sample_rate = sample_rate
+        self.admin_token = admin_token
+
+    @classmethod
+    def from_env(cls, service: str):
+        """
+        Build a profiler from PROFILE_* environment variables
+
+        Returns:
+            RequestProfiler, or None if PROFILE_DIR is empty
+        """
+        directory = os.getenv("PROFILE_DIR")
+        if not directory:
+            return None
+
+        return cls(
+            service,
+            ProfileStore(directory, max_profiles=int(os.getenv("PROFILE_MAX_PROFILES", 50))),
+            sample_rate=float(os.getenv("PROFILE_SAMPLE_RATE", 0.0)),
+            admin_token=os.getenv("PROFILE_ADMIN_TOKEN") or None
+        )
+
+    def is_admin(self, token: str) -> bool:
+        """True if token matches the admin token (always False without one)"""
+        return bool(self.admin_token and token and hmac.compare_digest(token, self.admin_token))
+
+    def should_profile(self, request_id: str, token: str = None) -> bool:
+        """
+        Args:
+            request_id: Id of the request (see RequestIdMiddleware)
+            token: X-Profile-Token header, if any
+        """
+        if self.is_admin(token):
+            return True
+        if self.sample_rate <= 0:
+            return False
+
+        bucket = int(hashlib.sha256(request_id.encode("utf-8")).hexdigest()[:8], 16) / 0x100000000
+        return bucket < self.sample_rate
+
+    def stats(self) -> dict:
+        """Settings and stored profiles for /health"""
+        return {
+            "directory": str(self.store.directory),
+            "profiles": len(self.store.list()),
+            "max_profiles": self.store.max_profiles,
+            "sample_rate": self.sample_rate,
+            "on_demand": self.admin_token is not None,
+        }
+
+    def can_read(self, token: str) -> bool:
+        """Access check for GET /profiles"""
+        return self.admin_token is None or self.is_admin(token)
+
+    async def run(self, pool, request_id: str, endpoint: str, method_name: str, *args):
+        """
+        pool.run() with the worker call profiled; the profile is stored
+
+        Returns:
+            The method's result
+        """
+        started = time.perf_counter()
+        result, profile = await pool.run_profiled(method_name, *args)
+        seconds = time.perf_counter() - started
+
+        if profile is None:
+            logger.info("Request %s not profiled: another profile was running", request_id)
+            return result
+
+        profile_id = self.store.save({
+            "request_id": request_id,
+            "service": self.service,
+            "endpoint": endpoint,
+            "method": method_name,
+            "created_at": time.time(),
+            "seconds": round(seconds, 4),
+        }, profile)
+        logger.info("Profiled request %s (%s, %.3f s) as %s", request_id, endpoint, seconds, profile_id)
+
+        return result
+
+
+class ProfilesRouter:
+    """
+    Endpoints to list and fetch stored profiles
+
+    - GET /profiles: metadata, newest first (?request_id= for one request)
+    - GET /profiles/{profile_id}: pstats report as text, or the raw .prof
+      file with ?format=prof
+
+    Both need X-Profile-Token when PROFILE_ADMIN_TOKEN is set.
+    """
+
+    def __init__(self, profiler: RequestProfiler):
+        """
+        Args:
+            profiler: RequestProfiler whose store is served
+        """
+        self.profiler = profiler
+        self.router = APIRouter()
+        self._setup_routes()
+
+    def _setup_routes(self):
+        """Define the profile routes"""
+
+        @self.router.get("/profiles")
+        async def list_profiles(
+            request_id: str = Query(None),
+            x_profile_token: str = Header(None)
+        ):
+            """Stored profiles, newest first"""
+            self._authorize(x_profile_token)
+            return {"profiles": self.profiler.store.list(request_id)}
+
+        @self.router.get("/profiles/{profile_id}")
+        async def get_profile(
+            profile_id: str,
+            format: str = Query("text", pattern="^(text|prof)$"),
+            sort: str = Query("cumulative", pattern="^(cumulative|tottime|calls|ncalls)$"),
+            limit: int = Query(40, ge=1, le=1000),
+            x_profile_token: str = Header(None)
+        ):
+            """
+            One profile
+
+            Args:
+                format: "text" (pstats report) or "prof" (file for snakeviz & co.)
+                sort: pstats sort key of the report
+                limit: Functions listed in the report
+            """
+            self._authorize(x_profile_token)
+
+            meta = self.profiler.store.get(profile_id)
+            path = self.profiler.store.profile_path(profile_id)
+            if meta is None or path is None:
+                raise HTTPException(status_code=404, detail=f"Unknown profile: {profile_id}")
+
+            if format == "prof":
+                return FileResponse(path, media_type="application/octet-stream", filename=path.name)
+
+            header = (f"{meta['service']} {meta['endpoint']} request {meta['request_id']}: "
+                      f"{meta['seconds']:.3f} s\n\n")
+            return PlainTextResponse(header + self.profiler.store.report(profile_id, sort, limit))
+
+    def _authorize(self, token: str):
+        if not self.profiler.can_read(token):
+            raise HTTPException(status_code=403, detail="Missing or wrong X-Profile-Token")
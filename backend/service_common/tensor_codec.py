@@ -0,0 +1,154 @@
+"""
+Binary Tensor Wire Format
+Encodes spectrogram tensors as .npy payloads instead of nested JSON lists
+"""
+
+import io
+import os
+
+import numpy as np
+
+
+# Media types used for content negotiation
+NPY_MEDIA_TYPE = "application/x-npy"
+JSON_MEDIA_TYPE = "application/json"
+
+# Dtypes allowed on the wire (always little-endian)
+WIRE_DTYPES = {
+    "float32": np.dtype("<f4"),
+    "float16": np.dtype("<f2"),
+}
+
+
+def _parse_media_range(media_range: str) -> tuple:
+    """
+    Split a single media range into its type and parameters
+
+    Args:
+        media_range: e.g. "application/x-npy; dtype=float16"
+
+    Returns:
+        Tuple (media_type, params dict)
+    """
+    parts = [part.strip() for part in media_range.split(";")]
+    params = {}
+
+    for param in parts[1:]:
+        if "=" in param:
+            key, value = param.split("=", 1)
+            params[key.strip().lower()] = value.strip().strip('"')
+
+    return parts[0].lower(), params
+
+
+def _quality(params: dict) -> float:
+    """q parameter of a media range (1 if absent)"""
+    if "q" not in params:
+        return 1.0
+    try:
+        return float(params["q"])
+    except ValueError:
+        raise ValueError(f"Invalid quality value: q={params['q']}")
+
+
+def negotiate_wire_dtype(accept_header: str):
+    """
+    Decide whether the client prefers the binary format
+
+    Binary is chosen only when application/x-npy is listed explicitly with
+    q > 0 and ranks above JSON. JSON's quality comes from its most specific
+    range (application/json, else application/*, else */*); on a tie,
+    binary wins only against a wildcard, so "application/x-npy, */*" is
+    binary while "application/json, application/x-npy" stays JSON.
+
+    Args:
+        accept_header: Value of the Accept request header
+
+    Returns:
+        Wire dtype name ("float32"/"float16") if binary was requested, None for JSON
+    """
+    if not accept_header:
+        return None
+
+    npy = None  # (quality, params)
+    json_qualities = {}  # matching range -> quality
+
+    for media_range in accept_header.split(","):
+        media_type, params = _parse_media_range(media_range)
+
+        if media_type == NPY_MEDIA_TYPE:
+            npy = (_quality(params), params)
+        elif media_type in (JSON_MEDIA_TYPE, "application/*", "*/*"):
+            json_qualities[media_type] = _quality(params)
+
+    # q=0, 0.0, 0.000, ... means "not acceptable"
+    if npy is None or npy[0] <= 0:
+        return None
+
+    npy_quality, params = npy
+    for media_type in (JSON_MEDIA_TYPE, "application/*", "*/*"):
+        if media_type in json_qualities:
+            json_quality = json_qualities[media_type]
+            if json_quality > npy_quality or (json_quality == npy_quality and media_type == JSON_MEDIA_TYPE):
+                return None
+            break
+
+    dtype_name = params.get("dtype", os.getenv("TENSOR_WIRE_DTYPE", "float32"))
+    if dtype_name not in WIRE_DTYPES:
+        raise ValueError(f"Unsupported wire dtype: {dtype_name}")
+    return dtype_name
+
+
+def is_npy_content(content_type: str) -> bool:
+    """Check whether a Content-Type header denotes the binary format"""
+    if not content_type:
+        return False
+    media_type, _ = _parse_media_range(content_type)
+    return media_type == NPY_MEDIA_TYPE
+
+
+def encode_tensor(array: np.ndarray, dtype_name: str = "float32") -> bytes:
+    """
+    Serialize an array to .npy bytes (little-endian, no pickling)
+
+    Args:
+        array: Tensor to encode, e.g. spectrograms with shape (4, 128, 862, 1)
+        dtype_name: Wire dtype ("float32" or "float16")
+
+    Returns:
+        .npy file contents
+    """
+    wire_array = np.ascontiguousarray(array, dtype=WIRE_DTYPES[dtype_name])
+
+    buffer = io.BytesIO()
+    np.lib.format.write_array(buffer, wire_array, allow_pickle=False)
+    return buffer.getvalue()
+
+
+def decode_tensor(payload: bytes) -> np.ndarray:
+    """
+    Deserialize .npy bytes without copying the data section
+
+    Args:
+        payload: .npy file contents
+
+    Returns:
+        Read-only array viewing the payload buffer
+    """
+    buffer = io.BytesIO(payload)
+    version = np.lib.format.read_magic(buffer)
+
+    if version == (1, 0):
+        shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(buffer)
+    elif version == (2, 0):
+        shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(buffer)
+    else:
+        raise ValueError(f"Unsupported .npy format version: {version}")
+
+    if dtype.hasobject:
+        raise ValueError("Object arrays are not accepted on the wire")
+    if dtype not in WIRE_DTYPES.values():
+        raise ValueError(f"Unsupported wire dtype: {dtype}")
+
+    array = np.frombuffer(payload, dtype=dtype, count=int(np.prod(shape)), offset=buffer.tell())
+    return array.reshape(shape, order="F" if fortran_order else "C")
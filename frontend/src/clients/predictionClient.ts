@@ -11,9 +11,17 @@ import { GENRES } from '../constants/genres';
 // Backend base URL (configure according to environment)
 const API_BASE_URL = import.meta.env.VITE_API_URL || 'http://localhost:5000';
 
+// Polling of asynchronous jobs (see predictGenre)
+const JOB_POLL_INTERVAL_MS = 1000;
+const JOB_MAX_WAIT_MS = 10 * 60 * 1000; // 10 minutes
+
 /**
  * Sends an audio segment to the backend for genre prediction
  *
+ * Starts a background job (POST /api/jobs) and polls it, so a slow
+ * separation is not cut off by an HTTP timeout. When the gateway has no
+ * job backend (501), falls back to the synchronous /api/predict.
+ *
  * @param audioSegment - Blob of audio segment (10 seconds)
  * @param fileName - Original file name
  * @param segmentStart - Segment start second
@@ -37,21 +45,11 @@ export const predictGenre = async (
     formData.append('segmentStart', segmentStart.toString());
     formData.append('segmentEnd', segmentEnd.toString());
 
-    // Make POST request to backend
-    const response = await axios.post<PredictionAPIResponse>(
-      `${API_BASE_URL}/api/predict`,
-      formData,
-      {
-        headers: {
-          'Content-Type': 'multipart/form-data',
-        },
-        timeout: 60000, // 60 second timeout
-      }
-    );
+    const probabilities = await predictWithJob(formData) ?? await predictDirectly(formData);
 
     // Transform backend response to internal format
     return {
-      probabilities: response.data.probabilities,
+      probabilities,
       genres: GENRES,
       timestamp: new Date(),
       audioFileName: fileName,
@@ -66,17 +64,99 @@ export const predictGenre = async (
     if (axios.isAxiosError(error)) {
       if (error.response) {
         // Server responded with error code
-        throw new Error(`Server error: ${error.response.status} - ${error.response.data?.message || 'Unknown error'}`);
+        throw new Error(`Server error: ${error.response.status} - ${error.response.data?.error || error.response.data?.message || 'Unknown error'}`);
       } else if (error.request) {
         // Request was made but no response received
         throw new Error('Could not connect to server. Verify that the backend is running.');
       }
     }
 
+    if (error instanceof JobFailedError) {
+      throw error;
+    }
+
     throw new Error('Unexpected error processing prediction');
   }
 };
 
+/**
+ * Raised when a background job ends in "failed" or takes too long
+ */
+class JobFailedError extends Error {}
+
+/**
+ * Runs the prediction as a background job and waits for its result
+ *
+ * @returns Probabilities, or null if the backend has no job support
+ */
+const predictWithJob = async (formData: FormData): Promise<number[] | null> => {
+  let job: JobAPIResponse;
+  try {
+    const response = await axios.post<JobAPIResponse>(`${API_BASE_URL}/api/jobs`, formData, {
+      headers: {
+        'Content-Type': 'multipart/form-data',
+      },
+      timeout: 60000, // Upload only; the job runs on after this request
+    });
+    job = response.data;
+  } catch (error) {
+    if (axios.isAxiosError(error) && error.response?.status === 501) {
+      return null;
+    }
+    throw error;
+  }
+
+  const deadline = Date.now() + JOB_MAX_WAIT_MS;
+  while (job.status !== 'succeeded') {
+    if (job.status === 'failed') {
+      throw new JobFailedError(`Prediction failed: ${job.error || 'Unknown error'}`);
+    }
+    if (Date.now() > deadline) {
+      throw new JobFailedError('Prediction is taking too long, please try again later');
+    }
+
+    await new Promise((resolve) => setTimeout(resolve, JOB_POLL_INTERVAL_MS));
+    const response = await axios.get<JobAPIResponse>(`${API_BASE_URL}/api/jobs/${job.id}`, {
+      timeout: 10000,
+    });
+    job = response.data;
+  }
+
+  if (!Array.isArray(job.probabilities) || job.probabilities.length !== GENRES.length) {
+    throw new JobFailedError(`Invalid prediction result: expected ${GENRES.length} probabilities`);
+  }
+  return job.probabilities;
+};
+
+/**
+ * Synchronous prediction: one request for the whole separation and prediction
+ */
+const predictDirectly = async (formData: FormData): Promise<number[]> => {
+  const response = await axios.post<PredictionAPIResponse>(
+    `${API_BASE_URL}/api/predict`,
+    formData,
+    {
+      headers: {
+        'Content-Type': 'multipart/form-data',
+      },
+      timeout: 60000, // 60 second timeout
+    }
+  );
+
+  return response.data.probabilities;
+};
+
+/**
+ * Background job as returned by the backend (POST /api/jobs, GET /api/jobs/:id)
+ */
+interface JobAPIResponse {
+  id: string;
+  status: 'queued' | 'running' | 'succeeded' | 'failed';
+  stages: Record<string, { status: string; seconds?: number | null }>;
+  probabilities: number[] | null;  // Set once succeeded
+  error: string | null;
+}
+
 /**
  * Interface defining the backend response structure
  * Adjust according to the actual contract with the backend